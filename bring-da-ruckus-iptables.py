@@ -3,18 +3,25 @@
 Bring Da Ruckus - iptables Edition
 Network Chaos Engineering Tool for systems without netem kernel module
 Uses iptables for packet loss simulation (works on Jetson, embedded devices, etc.)
+or, where nft is available, a native nftables table (bring_da_ruckus)
 
 Note: This version only supports packet loss chaos, not latency/jitter/bandwidth
 """
 
+import argparse
+import calendar
+import functools
+import hashlib
+import re
+import shutil
 import subprocess
 import time
 import sys
 import os
 import signal
-from datetime import datetime
+from datetime import datetime, timedelta
 from typing import Optional
-from threading import Thread
+from threading import RLock, Thread
 
 class ChaosChamber:
     """Wu-Tang inspired chaos levels - iptables edition (packet loss only)"""
@@ -69,9 +76,10 @@ class ChaosChamber:
 class DeadmanSwitch:
     """Safety mechanism that auto-clears chaos after timeout"""
 
-    def __init__(self, timeout_minutes: int, emergency_callback):
+    def __init__(self, timeout_minutes: int, emergency_callback, tick_callback=None):
         self.timeout_minutes = timeout_minutes
         self.emergency_callback = emergency_callback
+        self.tick_callback = tick_callback  # called with the seconds left on every check
         self.last_activity = datetime.now()
         self.running = False
         self.thread = None
@@ -110,21 +118,99 @@ class DeadmanSwitch:
                 self.emergency_callback()
                 break
 
+            if self.tick_callback:
+                self.tick_callback(remaining)
+
             time.sleep(1)
 
 
 class NetworkRuckus:
     """iptables-based network chaos for systems without netem"""
 
-    def __init__(self, interface: Optional[str] = None, deadman_timeout: int = 5):
+    # nftables backend: one table for the whole feature - teardown is "delete table".
+    # Our base chains, by hook; camera-chaos.py keeps its own camera_* chains in it
+    NFT_TABLE = "inet bring_da_ruckus"
+    NFT_CHAINS = (('ruckus_input', 'input'), ('ruckus_output', 'output'), ('ruckus_forward', 'forward'))
+    NFT_SETS = (('ruckus_ssh', 'inet_service'), ('ruckus_mgmt4', 'ipv4_addr'), ('ruckus_mgmt6', 'ipv6_addr'))
+    # tc backend: clsact filters at our own prefs with gact actions - loss at qdisc-layer
+    # cost, no netfilter walk. Exemptions sit below the drops so they classify first.
+    # The kernel numbers pref-less filters down from 0xC000, so ours start above that,
+    # and every action carries our cookie - a filter is only ours with both
+    TC_MODULES = ('sch_ingress', 'cls_matchall', 'cls_u32', 'act_gact')  # sch_ingress provides clsact
+    TC_PREF_EXEMPT = 0xC100
+    TC_PREF_DROP = 0xC180
+    TC_PREF_END = 0xC182
+    TC_COOKIE = b'bring-da-ruckus'.hex()
+    TC_FAILSAFE_UNIT = 'bring-da-ruckus-iptables-failsafe'
+    # What each backend commits with, and its kernel-side time match
+    COMMIT_TOOL = {'tc': 'tc -batch', 'iptables': 'iptables-restore', 'nft': 'nft -f'}
+    TIME_MATCH = {'tc': 'systemd timer', 'iptables': 'xt_time', 'nft': 'meta time'}
+
+    def __init__(self, interface: Optional[str] = None, deadman_timeout: int = 5,
+                 backend: Optional[str] = None):
         self.interface = interface
+        self.backend = backend or self._detect_backend()
         self.current_chamber = ChaosChamber.PEACE
         self.is_active = False
-        self.deadman = DeadmanSwitch(deadman_timeout, self._emergency_stop)
+        self.deadman = DeadmanSwitch(deadman_timeout, self._emergency_stop, self._rearm_expiry)
+        # The deadman thread re-commits to extend the expiry - one commit (and its expiry) at a time
+        self._lock = RLock()
         self.ssh_client_ip = self._detect_ssh_client_ip()
         self.management_whitelist = [self.ssh_client_ip] if self.ssh_client_ip else []
         self.ssh_protection_enabled = True
         self.iptables_chain = "BRING_DA_RUCKUS"
+        # Kernel-side failsafe: DROP rules carry an xt_time --datestop (meta time on nft) this long
+        # past the deadman deadline, so they go inert even if we are SIGKILLed. tc has no time
+        # match - a transient systemd timer deletes its filters instead
+        self.expiry_grace_s = 60
+        self.expiry = None          # UTC datetime the installed DROP rules stop matching
+        self.time_match = True      # cleared if the kernel lacks xt_time / meta time (tc: systemd)
+        # Every rule we create carries an ownership comment, so apply and clear
+        # reconcile against what the kernel holds rather than against our history
+        self.rule_tag = "bring-da-ruckus"
+        # Our rules in the kernel, [(owner id, rule spec)] - None until read back from
+        # iptables-save (at startup, or after a failed transaction), then kept current
+        self._owned = None
+        self._chain_exists = False
+        # nftables: the last ruleset committed (None = never, so the first commit
+        # also sweeps whatever a crashed run left in our chains)
+        self._nft_lines = None
+        # tc: {(direction, pref): filter spec} we installed (None = not read back yet),
+        # whether dev has a clsact qdisc and whether we added it, and the armed failsafe
+        self._tc_installed = None
+        self._tc_clsact = False
+        self._tc_own_clsact = False
+        self._tc_failsafe_expiry = None
+
+    @classmethod
+    def _detect_backend(cls, skip=()) -> str:
+        """Cheapest mechanism the kernel supports: 'tc' (gact at the qdisc layer), then 'nft'
+        (no iptables-nft translation per call), else 'iptables'"""
+        if 'tc' not in skip and shutil.which('tc') and all(map(cls._kernel_has, cls.TC_MODULES)):
+            return 'tc'
+        if shutil.which('nft'):
+            try:
+                if subprocess.run(["nft", "list", "tables"], capture_output=True).returncode == 0:
+                    return 'nft'
+            except OSError:
+                pass
+        return 'iptables'
+
+    @staticmethod
+    def _kernel_has(module: str) -> bool:
+        """Whether module is loaded, loadable, or built into the running kernel"""
+        if os.path.isdir(f"/sys/module/{module}"):
+            return True
+        try:
+            if subprocess.run(["modprobe", "-q", module], capture_output=True).returncode == 0:
+                return True
+        except OSError:
+            pass
+        try:
+            with open(f"/lib/modules/{os.uname().release}/modules.builtin") as f:
+                return any(line.strip().endswith(f"/{module}.ko") for line in f)
+        except OSError:
+            return False
 
     def _detect_ssh_client_ip(self):
         """Detect the IP address of the SSH client for protection"""
@@ -157,188 +243,464 @@ class NetworkRuckus:
         except:
             return "eth0"
 
-    def _setup_iptables_chain(self):
-        """Create custom iptables chain for chaos rules"""
-        # Create chain if it doesn't exist
-        subprocess.run(
-            f"iptables -N {self.iptables_chain}",
-            shell=True, stderr=subprocess.DEVNULL
-        )
+    def _time_match(self) -> str:
+        """Time match bounding a DROP rule to the current expiry ('' without one)"""
+        if not (self.time_match and self.expiry) or self.backend == 'tc':
+            return ''
+        if self.backend == 'nft':
+            # meta time takes a UNIX timestamp - no timezone to get wrong
+            return f"meta time < {calendar.timegm(self.expiry.timetuple())} "
+        return f"-m time --datestop {self.expiry:%Y-%m-%dT%H:%M:%S} "
+
+    def _tagged(self, verb: str, rule: str):
+        """(owner id, (verb, rule with its ownership comment)) - the id is a digest of the rule itself"""
+        owner = hashlib.sha1(f"{verb} {rule}".encode()).hexdigest()[:12]
+        chain, spec = rule.split(' ', 1)
+        return owner, (verb, f"{chain} -m comment --comment {self.rule_tag}:{owner} {spec}")
+
+    def _desired_rules(self, level: dict):
+        """(whether our chain is needed, {owner id: (verb, tagged rule)}) for level"""
+        chain_rules, rules = self._level_rules(level)
+        rules = [('-A', rule) for rule in chain_rules or []] + rules
+        return chain_rules is not None, dict(self._tagged(verb, rule) for verb, rule in rules)
+
+    def _level_rules(self, level: dict):
+        """(rules in our chain or None, [(verb, rule), ...] in the built-in chains) for level"""
+        loss = level['packet_loss_pct']
+        if loss == 0:
+            return None, []
+        drop = f"{self._time_match()}-j DROP"
+        if loss == 100:
+            rules = []
+            if self.ssh_protection_enabled:
+                rules += [('-I', "INPUT -p tcp --dport 22 -j ACCEPT"), ('-I', "OUTPUT -p tcp --sport 22 -j ACCEPT")]
+                for mgmt_ip in self.management_whitelist:
+                    rules += [('-I', f"INPUT -s {mgmt_ip} -j ACCEPT"), ('-I', f"OUTPUT -d {mgmt_ip} -j ACCEPT")]
+            # Drop all other packets - until the expiry, whatever happens to this process
+            rules += [('-A', f"INPUT -i {self.interface} {drop}"), ('-A', f"OUTPUT -o {self.interface} {drop}")]
+            return None, rules
+        # Convert percentage to probability for iptables (--probability expects 0.0-1.0, e.g. 0.01 = 1% drop rate)
+        probability = loss / 100.0
+        chain = [f"{self.iptables_chain} -m statistic --mode random --probability {probability} {drop}"]
+        # Jump to our chain for ALL traffic - FORWARD catches traffic passing through (like from cameras)
+        rules = [('-I', f"INPUT -i {self.interface} -j {self.iptables_chain}"),
+                 ('-I', f"OUTPUT -o {self.interface} -j {self.iptables_chain}"),
+                 ('-I', f"FORWARD -i {self.interface} -j {self.iptables_chain}"),
+                 ('-I', f"FORWARD -o {self.interface} -j {self.iptables_chain}")]
+        return chain, rules
+
+    def _read_owned(self):
+        """Read our rules back from iptables-save: ([(owner id, rule spec)], whether our chain exists)
+
+        Tagged rules are keyed by their owner id. Untagged jumps to our chain and
+        untagged rules inside it - left by versions before tagging - are ours too,
+        keyed by their text so the reconcile deletes them, every copy.
+        """
+        try:
+            result = subprocess.run(["iptables-save", "-t", "filter"], capture_output=True, text=True)
+        except OSError:
+            result = None
+        if result is None or result.returncode != 0:
+            print("   ⚠️  iptables-save failed - reconciling against an empty ruleset", file=sys.stderr)
+            return [], False
+        # Owner ids are exactly 12 hex digits - other bring-da-ruckus:<name> tags are not ours
+        tag = re.compile(rf'--comment "?{re.escape(self.rule_tag)}:([0-9a-f]{{12}})(?:"|\s|$)')
+        chain = self.iptables_chain
+        owned, chain_exists = [], False
+        for line in result.stdout.splitlines():
+            if line.startswith(f":{chain} "):
+                chain_exists = True
+            elif line.startswith('-A '):
+                match = tag.search(line)
+                if match:
+                    owned.append((match.group(1), line[3:]))
+                elif line.startswith(f"-A {chain} ") or line.endswith(f" -j {chain}"):
+                    owned.append((line, line[3:]))
+        return owned, chain_exists
+
+    def _reconcile(self, chain_needed: bool, rules: dict):
+        """iptables-restore lines taking the rules we own in the kernel to exactly the desired ones"""
+        if self._owned is None:
+            self._owned, self._chain_exists = self._read_owned()
+        lines = []
+        if chain_needed and not self._chain_exists:
+            lines.append(f":{self.iptables_chain} - [0:0]")
+        kept = set()
+        for owner, spec in self._owned:
+            if owner in rules and owner not in kept:
+                kept.add(owner)
+            else:
+                # Not wanted any more, a leftover, or a duplicate copy
+                lines.append(f"-D {spec}")
+        lines += [f"{verb} {rule}" for owner, (verb, rule) in rules.items() if owner not in kept]
+        if self._chain_exists and not chain_needed:
+            lines += [f"-F {self.iptables_chain}", f"-X {self.iptables_chain}"]
+        return lines
+
+    def _nft_ruleset(self, level: dict):
+        """nft -f lines replacing our chains and sets with level's, in one transaction
+
+        Every chain and set is declared then flushed, so the script is idempotent and
+        also sweeps leftovers. Those the level does not need are deleted - at peace no
+        hook of ours is left on the packet path.
+        """
+        loss = level['packet_loss_pct']
+        chains, elements = {}, {}
+        iif, oif = f'iifname "{self.interface}"', f'oifname "{self.interface}"'
+        if loss == 100:
+            drop = f"{self._time_match()}drop"
+            accept_in, accept_out = [], []
+            if self.ssh_protection_enabled:
+                elements['ruckus_ssh'] = ['22']
+                elements['ruckus_mgmt4'] = [ip for ip in self.management_whitelist if ':' not in ip]
+                elements['ruckus_mgmt6'] = [ip for ip in self.management_whitelist if ':' in ip]
+                accept_in = ["tcp dport @ruckus_ssh accept", "ip saddr @ruckus_mgmt4 accept",
+                             "ip6 saddr @ruckus_mgmt6 accept"]
+                accept_out = ["tcp sport @ruckus_ssh accept", "ip daddr @ruckus_mgmt4 accept",
+                              "ip6 daddr @ruckus_mgmt6 accept"]
+            chains['ruckus_input'] = accept_in + [f"{iif} {drop}"]
+            chains['ruckus_output'] = accept_out + [f"{oif} {drop}"]
+        elif loss > 0:
+            # numgen draws per packet - basis points keep fractional percentages exact
+            drop = f"{self._time_match()}numgen random mod 10000 < {round(loss * 100)} drop"
+            chains['ruckus_input'] = [f"{iif} {drop}"]
+            chains['ruckus_output'] = [f"{oif} {drop}"]
+            chains['ruckus_forward'] = [f"{iif} {drop}", f"{oif} {drop}"]
+
+        table = self.NFT_TABLE
+        lines = [f"add table {table}"]
+        # Sets first - rules reference them by name
+        for name, kind in self.NFT_SETS:
+            if name in elements:
+                lines += [f"add set {table} {name} {{ type {kind} ; }}", f"flush set {table} {name}"]
+                if elements[name]:
+                    lines.append(f"add element {table} {name} {{ {', '.join(elements[name])} }}")
+        for name, hook in self.NFT_CHAINS:
+            lines += [f"add chain {table} {name} {{ type filter hook {hook} priority 0 ; policy accept ; }}",
+                      f"flush chain {table} {name}"]
+            if name in chains:
+                lines += [f"add rule {table} {name} {rule}" for rule in chains[name]]
+            else:
+                lines.append(f"delete chain {table} {name}")
+        # Unused sets go last, once no rule references them
+        for name, kind in self.NFT_SETS:
+            if name not in elements:
+                lines += [f"add set {table} {name} {{ type {kind} ; }}", f"delete set {table} {name}"]
+        return lines
+
+    @staticmethod
+    @functools.lru_cache(maxsize=None)
+    def _netrand(loss: float):
+        """(n1, n2 or None): gact netrand drops 1 in N, so chain two draws to land near loss%"""
+        p = loss / 100.0
+        n = min(10000, max(2, round(1 / p)))
+        best = (abs(1 / n - p), n, None)
+        for n1 in range(n, min(10000, n * 4) + 1):
+            # What the second draw must still drop of the packets the first let through
+            p2 = 1 - (1 - p) / (1 - 1 / n1)
+            if p2 <= 0:
+                continue
+            n2 = min(10000, max(2, round(1 / p2)))
+            error = abs(1 - (1 - 1 / n1) * (1 - 1 / n2) - p)
+            if error < best[0]:
+                best = (error, n1, n2)
+        return best[1], best[2]
+
+    def _gact(self, loss: float) -> str:
+        """gact action(s) dropping loss% of packets"""
+        cookie = self.TC_COOKIE
+        if loss >= 100:
+            return f"action gact drop cookie {cookie}"
+        n1, n2 = self._netrand(loss)
+        if n2 is None:
+            return f"action gact ok random netrand drop {n1} cookie {cookie}"
+        # The first draw pipes survivors on to the second
+        return (f"action gact pipe random netrand drop {n1} cookie {cookie} "
+                f"action gact ok random netrand drop {n2} cookie {cookie}")
+
+    def _tc_filters(self, level: dict):
+        """{(direction, pref): filter spec} on our clsact for level"""
+        loss = level['packet_loss_pct']
+        filters = {}
+        if loss == 0:
+            return filters
+        if loss == 100 and self.ssh_protection_enabled:
+            exempt = [('ingress', 'ip', "match ip protocol 6 0xff match ip dport 22 0xffff"),
+                      ('egress', 'ip', "match ip protocol 6 0xff match ip sport 22 0xffff"),
+                      ('ingress', 'ipv6', "match ip6 protocol 6 0xff match ip6 dport 22 0xffff"),
+                      ('egress', 'ipv6', "match ip6 protocol 6 0xff match ip6 sport 22 0xffff")]
+            for mgmt_ip in self.management_whitelist:
+                family, key, bits = ('ipv6', 'ip6', 128) if ':' in mgmt_ip else ('ip', 'ip', 32)
+                exempt += [('ingress', family, f"match {key} src {mgmt_ip}/{bits}"),
+                           ('egress', family, f"match {key} dst {mgmt_ip}/{bits}")]
+            # gact ok ends classification - the drop filters never see these packets
+            if len(exempt) > self.TC_PREF_DROP - self.TC_PREF_EXEMPT:
+                raise ValueError("too many management IPs for the tc exemption prefs")
+            for pref, (direction, family, match) in enumerate(exempt, self.TC_PREF_EXEMPT):
+                filters[(direction, pref)] = f"protocol {family} u32 {match} action gact ok cookie {self.TC_COOKIE}"
+        # IP and IPv6 only - ARP and friends pass, as they do with iptables
+        action = self._gact(loss)
+        for pref, family in enumerate(('ip', 'ipv6'), self.TC_PREF_DROP):
+            for direction in ('ingress', 'egress'):
+                filters[(direction, pref)] = f"protocol {family} handle 1 matchall {action}"
+        return filters
+
+    def _tc_read_back(self):
+        """Find our filters (our prefs and cookie) and whether dev has a clsact - a crashed run's leftovers get replaced"""
+        dev = self.interface
+        installed = {}
+        foreign = False
+        try:
+            qdiscs = subprocess.run(["tc", "qdisc", "show", "dev", dev], capture_output=True, text=True)
+            self._tc_clsact = 'clsact' in qdiscs.stdout
+            for direction in ('ingress', 'egress') if self._tc_clsact else ():
+                shown = subprocess.run(["tc", "filter", "show", "dev", dev, direction],
+                                       capture_output=True, text=True)
+                # One pref shows as several 'filter' lines; the cookie sits under its actions
+                cookies, pref = {}, None
+                for line in shown.stdout.splitlines():
+                    match = re.match(r'filter .*\bpref (\d+)', line)
+                    if match:
+                        pref = int(match.group(1))
+                        cookies.setdefault(pref, False)
+                    elif pref is not None and line.split()[:2] == ['cookie', self.TC_COOKIE]:
+                        cookies[pref] = True
+                for pref, tagged in cookies.items():
+                    if tagged and self.TC_PREF_EXEMPT <= pref < self.TC_PREF_END:
+                        installed[(direction, pref)] = None
+                    else:
+                        foreign = True
+        except OSError:
+            self._tc_clsact = False
+        # A clsact holding nothing but our tagged leftovers is ours to remove with them
+        self._tc_own_clsact = self._tc_clsact and bool(installed) and not foreign
+        self._tc_installed = installed
+
+    def _tc_delta(self, filters) -> list:
+        """tc -batch lines taking our filters from what is installed to filters
+
+        Exemptions go in before the drops and come out after them, and a drop
+        that changes is replaced in place - so no packet is ever unprotected.
+        """
+        if self._tc_installed is None:
+            self._tc_read_back()
+        dev, installed = self.interface, self._tc_installed
+        lines = []
+        if filters and not self._tc_clsact:
+            lines.append(f"qdisc add dev {dev} clsact")
+        stale = sorted((key for key in installed if filters.get(key) != installed[key]),
+                       key=lambda key: -key[1])
+        for (direction, pref), spec in sorted(filters.items(), key=lambda item: item[0][1]):
+            if installed.get((direction, pref)) == spec:
+                continue
+            if pref >= self.TC_PREF_DROP and (direction, pref) in installed:
+                lines.append(f"filter replace dev {dev} {direction} pref {pref} {spec}")
+                continue
+            if (direction, pref) in installed:
+                lines.append(f"filter del dev {dev} {direction} pref {pref}")
+            lines.append(f"filter add dev {dev} {direction} pref {pref} {spec}")
+        # Drops first, exemptions last
+        lines += [f"filter del dev {dev} {direction} pref {pref}"
+                  for direction, pref in stale if (direction, pref) not in filters]
+        if not filters and self._tc_own_clsact:
+            lines.append(f"qdisc del dev {dev} clsact")
+        return lines
+
+    def _tc(self, lines) -> Optional[str]:
+        """Run lines through one tc -batch; the error, or None"""
+        try:
+            result = subprocess.run(["tc", "-batch", "-"], input='\n'.join(lines) + '\n',
+                                    capture_output=True, text=True)
+        except OSError as e:
+            return str(e)
+        if result.returncode != 0:
+            return result.stderr.strip() or f"exit status {result.returncode}"
+        return None
+
+    def _sync_tc_failsafe(self):
+        """Keep a transient systemd timer deleting our filters armed for the current expiry"""
+        unit = self.TC_FAILSAFE_UNIT
+        if self._tc_failsafe_expiry and (not self._tc_installed or self.expiry != self._tc_failsafe_expiry):
+            subprocess.run(["systemctl", "stop", f"{unit}.timer", f"{unit}.service"], capture_output=True)
+            self._tc_failsafe_expiry = None
+        if not (self._tc_installed and self.expiry and self.time_match) or self._tc_failsafe_expiry:
+            return
+        dev = self.interface
+        teardown = '; '.join(f"tc filter del dev {dev} {direction} pref {pref}"
+                             for direction, pref in sorted(self._tc_installed, key=lambda key: -key[1]))
+        seconds = max(1, int((self.expiry - datetime.utcnow()).total_seconds()))
+        result = None
+        if shutil.which('systemd-run') and os.path.isdir('/run/systemd/system'):
+            result = subprocess.run(['systemd-run', '--quiet', '--collect', f'--unit={unit}',
+                                     f'--on-active={seconds}s', '--timer-property=AccuracySec=1s',
+                                     '--description=Bring Da Ruckus iptables edition failsafe',
+                                     '/bin/sh', '-c', teardown], capture_output=True, text=True)
+        if result is None or result.returncode != 0:
+            print("   ⚠️  No systemd timer - tc filters will not expire on their own")
+            self.time_match = False
+            return
+        self._tc_failsafe_expiry = self.expiry
+
+    def _nft(self, lines) -> Optional[str]:
+        """Commit lines in one nft -f transaction; the error, or None"""
+        try:
+            result = subprocess.run(["nft", "-f", "-"], input='\n'.join(lines) + '\n',
+                                    capture_output=True, text=True)
+        except OSError as e:
+            return str(e)
+        if result.returncode != 0:
+            return result.stderr.strip() or f"exit status {result.returncode}"
+        return None
+
+    def _render(self, level: dict):
+        """(lines moving the kernel to level - empty if already there, state to keep once committed)"""
+        if self.backend == 'tc':
+            filters = self._tc_filters(level)
+            return self._tc_delta(filters), filters
+        if self.backend == 'nft':
+            lines = self._nft_ruleset(level)
+            return ([] if lines == self._nft_lines else lines), lines
+        chain_needed, rules = self._desired_rules(level)
+        return self._reconcile(chain_needed, rules), (chain_needed, rules)
+
+    def _restore(self, lines) -> Optional[str]:
+        """Commit filter-table lines in one iptables-restore --noflush transaction; the error, or None"""
+        script = '*filter\n' + '\n'.join(lines) + '\nCOMMIT\n'
+        try:
+            result = subprocess.run(["iptables-restore", "--noflush"], input=script,
+                                    capture_output=True, text=True)
+        except OSError as e:
+            return str(e)
+        if result.returncode != 0:
+            return result.stderr.strip() or f"exit status {result.returncode}"
+        return None
 
-        # Clear any existing rules in the chain
-        subprocess.run(
-            f"iptables -F {self.iptables_chain}",
-            shell=True, stderr=subprocess.DEVNULL
-        )
+    def _commit(self, level: dict) -> Optional[int]:
+        """Move the ruleset to level in one atomic transaction; the number of changes, or None"""
+        push = {'tc': self._tc, 'nft': self._nft}.get(self.backend, self._restore)
+        lines, state = self._render(level)
+        if not lines:
+            if self.backend == 'tc':
+                self._sync_tc_failsafe()
+            return 0
+        error = push(lines)
+        if error and self._time_match():
+            # Most likely no time match - the rules go in without their kernel-side expiry
+            print(f"   ⚠️  {self.TIME_MATCH[self.backend]} unavailable - DROP rules will not expire on their own")
+            self.time_match = False
+            lines, state = self._render(level)
+            error = push(lines)
+        if error and self.backend == 'tc' and not self._tc_installed:
+            # Nothing of ours on the qdisc layer yet - fall back to the next cheapest mechanism
+            print(f"   ⚠️  tc clsact/gact unusable ({error.splitlines()[0]}) - falling back")
+            if lines[0].startswith('qdisc add'):
+                self._tc([f"qdisc del dev {self.interface} clsact"])
+            self._tc_installed = None
+            self.backend = self._detect_backend(skip=('tc',))
+            return self._commit(level)
+        if error:
+            print(f"   ❌ {self.COMMIT_TOOL[self.backend]} failed: {error}", file=sys.stderr)
+            self._owned = None      # re-read the kernel before the next attempt
+            self._tc_installed = None
+            return None
+        if self.backend == 'tc':
+            if lines[0].startswith('qdisc add'):
+                self._tc_clsact = self._tc_own_clsact = True
+            elif lines[-1].startswith('qdisc del'):
+                self._tc_clsact = self._tc_own_clsact = False
+            self._tc_installed = state
+            self._sync_tc_failsafe()
+        elif self.backend == 'nft':
+            self._nft_lines = state
+        else:
+            chain_needed, rules = state
+            self._owned = [(owner, rule) for owner, (verb, rule) in rules.items()]
+            self._chain_exists = chain_needed
+        return len(lines)
+
+    def _rearm_expiry(self, remaining: float):
+        """Deadman tick: push the DROP rules' expiry out, but only when it is about to pass"""
+        with self._lock:
+            if not (self.is_active and self.expiry and self.time_match):
+                return
+            if (self.expiry - datetime.utcnow()).total_seconds() > self.expiry_grace_s / 2:
+                return
+            previous = self.expiry
+            self.expiry = datetime.utcnow() + timedelta(seconds=remaining + self.expiry_grace_s)
+            # Old and new bound swap in one transaction - never a moment without the DROP
+            if self._commit(self.current_chamber) is None:
+                self.expiry = previous
+                print("\n⚠️  Could not extend the kernel expiry")
 
     def apply_ruckus(self, level: dict):
-        """Apply packet loss using iptables probability matching"""
+        """Apply packet loss by random-probability matching - one transaction per switch"""
         print(f"\n🔧 Applying: {level['name']}")
 
         if not self.interface:
             self.interface = self.detect_interface()
 
-        # Clear existing chaos
-        self.clear_ruckus()
-
-        if level['packet_loss_pct'] == 0:
-            print(f"   ✅ All chaos cleared on {self.interface}")
-            print(f"   ☯️  Network has returned to peace")
-            self.current_chamber = level
-            self.is_active = False
-            return True
-
-        # Setup iptables chain
-        self._setup_iptables_chain()
-
         if level['packet_loss_pct'] == 100:
             # Complete outage - CRITICAL: Protect SSH access!
             print(f"\n{'='*70}")
             print(f"⚠️  ☠️  CRITICAL: APPLYING SHAOLIN SHADOW ☠️  ⚠️")
             print(f"{'='*70}")
 
-            if self.ssh_protection_enabled:
-                # Whitelist SSH port 22
-                subprocess.run(
-                    f"iptables -I INPUT -p tcp --dport 22 -j ACCEPT",
-                    shell=True, stderr=subprocess.DEVNULL
-                )
-                subprocess.run(
-                    f"iptables -I OUTPUT -p tcp --sport 22 -j ACCEPT",
-                    shell=True, stderr=subprocess.DEVNULL
-                )
-
-                # Whitelist management IPs
-                for mgmt_ip in self.management_whitelist:
-                    subprocess.run(
-                        f"iptables -I INPUT -s {mgmt_ip} -j ACCEPT",
-                        shell=True, stderr=subprocess.DEVNULL
-                    )
-                    subprocess.run(
-                        f"iptables -I OUTPUT -d {mgmt_ip} -j ACCEPT",
-                        shell=True, stderr=subprocess.DEVNULL
-                    )
+        # The chamber is recorded under the same lock, so an expiry tick never re-commits the old one
+        with self._lock:
+            self.expiry = None
+            if level['packet_loss_pct'] > 0:
+                self.expiry = datetime.utcnow() + timedelta(minutes=self.deadman.timeout_minutes,
+                                                            seconds=self.expiry_grace_s)
+            start = time.monotonic()
+            changes = self._commit(level)
+            if changes is not None:
+                self.current_chamber = level
+                self.is_active = (level != ChaosChamber.PEACE)
+        if changes is None:
+            print(f"   ❌ Failed to apply {level['name']} - previous rules left in place")
+            return False
+        elapsed_ms = (time.monotonic() - start) * 1000
+
+        if level['packet_loss_pct'] == 0:
+            print(f"   ✅ All chaos cleared on {self.interface}")
+            print(f"   ☯️  Network has returned to peace")
 
+        elif level['packet_loss_pct'] == 100:
+            if self.ssh_protection_enabled:
                 print(f"   🛡️  SSH (port 22) protected from chaos")
                 if self.ssh_client_ip:
                     print(f"   🛡️  Management IP {self.ssh_client_ip} whitelisted")
-
-            # Drop all other packets
-            subprocess.run(
-                f"iptables -A INPUT -i {self.interface} -j DROP",
-                shell=True, check=True
-            )
-            subprocess.run(
-                f"iptables -A OUTPUT -o {self.interface} -j DROP",
-                shell=True, check=True
-            )
-
             print(f"   ☠️  Complete network outage on {self.interface}")
-            print(f"   ⚠️  SSH access maintained via iptables exemption")
+            exemption = {'tc': 'tc u32', 'nft': 'nftables set'}.get(self.backend, 'iptables')
+            print(f"   ⚠️  SSH access maintained via {exemption} exemption")
             print(f"{'='*70}\n")
 
         else:
-            # Partial packet loss using statistic module
-            # Convert percentage to probability for iptables (--probability expects 0.0-1.0, e.g. 0.01 = 1% drop rate)
-            probability = level['packet_loss_pct'] / 100.0
-
-            # Drop packets randomly - NO IP FILTERING to affect ALL traffic including local network
-            subprocess.run(
-                f"iptables -A {self.iptables_chain} -m statistic --mode random --probability {probability} -j DROP",
-                shell=True, check=True
-            )
-
-            # Jump to our chain for ALL traffic (INPUT, OUTPUT, FORWARD)
-            subprocess.run(
-                f"iptables -I INPUT -i {self.interface} -j {self.iptables_chain}",
-                shell=True, check=True
-            )
-            subprocess.run(
-                f"iptables -I OUTPUT -o {self.interface} -j {self.iptables_chain}",
-                shell=True, check=True
-            )
-            # FORWARD chain catches traffic passing through (like from cameras)
-            subprocess.run(
-                f"iptables -I FORWARD -i {self.interface} -j {self.iptables_chain}",
-                shell=True, stderr=subprocess.DEVNULL
-            )
-            subprocess.run(
-                f"iptables -I FORWARD -o {self.interface} -j {self.iptables_chain}",
-                shell=True, stderr=subprocess.DEVNULL
-            )
-
-
             print(f"   ✅ Applied on interface: {self.interface}")
             print(f"   📉 Packet Loss: {level['packet_loss_pct']}% (ALL TRAFFIC including local network)")
+        if changes:
+            print(f"   ⚡ {changes} statement(s) in one {self.COMMIT_TOOL[self.backend]} transaction ({elapsed_ms:.1f}ms)")
 
-        self.current_chamber = level
-        self.is_active = (level != ChaosChamber.PEACE)
         self.deadman.reset()
         return True
 
     def clear_ruckus(self):
-        """Clear all iptables chaos rules"""
+        """Clear all chaos rules - exactly the ones we committed, in one transaction"""
         print("\n🧹 Clearing all network disruptions...")
 
         if not self.interface:
             self.interface = self.detect_interface()
 
-        # Remove jumps to our chain
-        subprocess.run(
-            f"iptables -D INPUT -i {self.interface} -j {self.iptables_chain}",
-            shell=True, stderr=subprocess.DEVNULL
-        )
-        subprocess.run(
-            f"iptables -D OUTPUT -o {self.interface} -j {self.iptables_chain}",
-            shell=True, stderr=subprocess.DEVNULL
-        )
-
-        # Flush and delete our chain
-        subprocess.run(
-            f"iptables -F {self.iptables_chain}",
-            shell=True, stderr=subprocess.DEVNULL
-        )
-        subprocess.run(
-            f"iptables -X {self.iptables_chain}",
-            shell=True, stderr=subprocess.DEVNULL
-        )
-
-        # Clear any DROP rules on interface
-        subprocess.run(
-            f"iptables -D INPUT -i {self.interface} -j DROP",
-            shell=True, stderr=subprocess.DEVNULL
-        )
-        subprocess.run(
-            f"iptables -D OUTPUT -o {self.interface} -j DROP",
-            shell=True, stderr=subprocess.DEVNULL
-        )
-
-        # Clear SSH protection rules
-        if self.ssh_protection_enabled:
-            subprocess.run(
-                "iptables -D INPUT -p tcp --dport 22 -j ACCEPT",
-                shell=True, stderr=subprocess.DEVNULL
-            )
-            subprocess.run(
-                "iptables -D OUTPUT -p tcp --sport 22 -j ACCEPT",
-                shell=True, stderr=subprocess.DEVNULL
-            )
-
-            for mgmt_ip in self.management_whitelist:
-                subprocess.run(
-                    f"iptables -D INPUT -s {mgmt_ip} -j ACCEPT",
-                    shell=True, stderr=subprocess.DEVNULL
-                )
-                subprocess.run(
-                    f"iptables -D OUTPUT -d {mgmt_ip} -j ACCEPT",
-                    shell=True, stderr=subprocess.DEVNULL
-                )
-
-        print(f"   ✅ Network restored to normal on {self.interface}")
-        print(f"   ☯️  Peace has been restored to the chambers")
-
-        self.is_active = False
-        self.current_chamber = ChaosChamber.PEACE
+        with self._lock:
+            self.expiry = None
+            changes = self._commit(ChaosChamber.PEACE)
+            self.is_active = False
+            self.current_chamber = ChaosChamber.PEACE
+        if changes is None:
+            print(f"   ⚠️  Some rules could not be removed - check with 'd'")
+        else:
+            print(f"   ✅ Network restored to normal on {self.interface}")
+            print(f"   ☯️  Peace has been restored to the chambers")
 
     def _emergency_stop(self):
         """Emergency stop triggered by deadman's switch"""
@@ -347,10 +709,25 @@ class NetworkRuckus:
         self.is_active = False
 
     def show_iptables_status(self):
-        """Show current iptables rules"""
+        """Show current iptables rules (our nftables table / clsact filters on those backends)"""
+        if self.backend == 'tc':
+            print(f"\n📊 Current tc Filters (clsact on {self.interface}):\n")
+            for direction in ('ingress', 'egress'):
+                subprocess.run(["tc", "-s", "filter", "show", "dev", self.interface, direction])
+            return
+        if self.backend == 'nft':
+            print(f"\n📊 Current nftables Rules (table {self.NFT_TABLE}):\n")
+            subprocess.run(f"nft list table {self.NFT_TABLE} 2>/dev/null || echo 'No chaos active'", shell=True)
+            return
         print("\n📊 Current iptables Rules:\n")
         subprocess.run("iptables -L -n -v | head -50", shell=True)
 
+    def _method(self) -> str:
+        """Human-readable name of the active backend"""
+        if self.backend == 'tc':
+            return "tc clsact + gact (qdisc layer)"
+        return f"nftables (table {self.NFT_TABLE})" if self.backend == 'nft' else "iptables"
+
     def get_status(self):
         """Get current status"""
         status = f"\n{'='*60}\n"
@@ -359,7 +736,7 @@ class NetworkRuckus:
         status += f"Current Chamber: {self.current_chamber['name']}\n"
         status += f"Active: {'🟢 YES' if self.is_active else '🔴 NO'}\n"
         status += f"Interface: {self.interface or 'Auto-detect'}\n"
-        status += f"Method: iptables (no netem required)\n"
+        status += f"Method: {self._method()} (no netem required)\n"
         status += f"SSH Protection: {'🛡️  ENABLED' if self.ssh_protection_enabled else '❌ DISABLED'}\n"
         if self.ssh_client_ip:
             status += f"Your IP: {self.ssh_client_ip} (whitelisted)\n"
@@ -370,6 +747,9 @@ class NetworkRuckus:
             remaining = self.deadman.timeout_minutes - elapsed
             status += f"Time Since Activity: {elapsed:.1f} min\n"
             status += f"Time Until Auto-Clear: {remaining:.1f} min\n"
+            if self.expiry and self.time_match:
+                status += (f"Kernel Expiry: {self.expiry:%H:%M:%S} UTC "
+                           f"({self.TIME_MATCH[self.backend]}, survives a crash)\n")
 
         status += f"{'='*60}\n"
         return status
@@ -400,6 +780,7 @@ def show_banner():
 
     Supports: Packet Loss only (SSH protected)
     Does NOT support: Latency, Jitter, Bandwidth limiting
+    (for those, run delay-the-ruckus.py alongside - NFQUEUE, no netem needed)
 
 """
     print(banner)
@@ -420,7 +801,7 @@ def show_menu():
         menu += f"║                                                                            ║\n"
 
     menu += """╠════════════════════════════════════════════════════════════════════════════╣
-║  [s] Show Status      [c] Clear All      [d] Show iptables                ║
+║  [s] Show Status      [c] Clear All      [d] Show Rules                   ║
 ║  [i] Set Interface    [q] Quit                                            ║
 ╚════════════════════════════════════════════════════════════════════════════╝
 """
@@ -432,7 +813,7 @@ def interactive_mode(ruckus: NetworkRuckus):
     print("\n🎬 Starting interactive mode...")
     print(f"⏰ Deadman's switch active: {ruckus.deadman.timeout_minutes} minutes")
     print(f"🔧 Interface: {ruckus.interface or 'Auto-detect'}")
-    print(f"⚙️  Method: iptables (no netem required)")
+    print(f"⚙️  Method: {ruckus._method()} (no netem required)")
 
     ruckus.deadman.start()
 
@@ -515,6 +896,12 @@ def interactive_mode(ruckus: NetworkRuckus):
 
 def main():
     """Main entry point"""
+    parser = argparse.ArgumentParser(description='Bring Da Ruckus - iptables Edition (packet loss only)')
+    parser.add_argument('--backend', choices=['auto', 'tc', 'nft', 'iptables'], default='auto',
+                        help='Loss mechanism (default: the cheapest the kernel supports - '
+                             'tc clsact/gact, then nft, then iptables)')
+    args = parser.parse_args()
+
     show_banner()
 
     # Check for root
@@ -525,13 +912,14 @@ def main():
         sys.exit(1)
 
     # Create ruckus instance
-    ruckus = NetworkRuckus(deadman_timeout=5)
+    ruckus = NetworkRuckus(deadman_timeout=5, backend=None if args.backend == 'auto' else args.backend)
 
     # Auto-detect interface
     if not ruckus.interface:
         ruckus.interface = ruckus.detect_interface()
 
     print(f"\n🔍 Detected interface: {ruckus.interface}")
+    print(f"⚙️  Backend: {ruckus._method()}")
     if ruckus.ssh_client_ip:
         print(f"🛡️  SSH client IP detected: {ruckus.ssh_client_ip}")
     else:
@@ -60,164 +60,1373 @@ import sys
 import time
 import threading
 import argparse
-import select
 from datetime import datetime, timedelta
 from typing import Optional, Dict
+from concurrent.futures import ThreadPoolExecutor, wait
+from collections import OrderedDict
+from collections.abc import Mapping
 import os
+import re
+import json
+import math
+import random
+import ipaddress
+import fnmatch
+import shutil
+import socket
+import struct
+import hashlib
+import functools
+import asyncio
+import contextlib
+import io
+import signal
+import shlex
+from http import HTTPStatus
+
+
+class ChamberProfile(Mapping):
+    """One chaos chamber: an immutable, hashable set of impairment fields.
+
+    Reads like the dicts chambers used to be (level['latency_ms'],
+    dict(level), ==), but can't be changed in place - replace() makes a
+    variant - so compiled plans can be cached under it.
+    """
+
+    __slots__ = ('name', 'latency_ms', 'packet_loss_pct', 'bandwidth_kbps', 'jitter_ms',
+                 'delay_dist', 'dist_dir', '_hash')
+    FIELDS = __slots__[:-1]
+    OPTIONAL = ('delay_dist', 'dist_dir')   # only present as keys when set
+
+    def __init__(self, name: str, latency_ms: float = 0, packet_loss_pct: float = 0,
+                 bandwidth_kbps: Optional[int] = None, jitter_ms: float = 0,
+                 delay_dist: Optional[str] = None, dist_dir: Optional[str] = None):
+        if not isinstance(name, str) or not name:
+            raise ValueError("a chamber needs a name")
+        for field, value in (('latency_ms', latency_ms), ('jitter_ms', jitter_ms),
+                             ('packet_loss_pct', packet_loss_pct)):
+            if isinstance(value, bool) or not isinstance(value, (int, float)) or value < 0:
+                raise ValueError(f"{field} must be a number >= 0, got {value!r}")
+        if packet_loss_pct > 100:
+            raise ValueError(f"packet_loss_pct must be at most 100, got {packet_loss_pct!r}")
+        if bandwidth_kbps is not None and (isinstance(bandwidth_kbps, bool) or not isinstance(bandwidth_kbps, int)
+                                           or bandwidth_kbps < 0):
+            raise ValueError(f"bandwidth_kbps must be a whole number >= 0 or null, got {bandwidth_kbps!r}")
+        values = (name, latency_ms, packet_loss_pct, bandwidth_kbps, jitter_ms, delay_dist, dist_dir)
+        for field, value in zip(self.FIELDS, values):
+            object.__setattr__(self, field, value)
+        object.__setattr__(self, '_hash', hash(values))
+
+    @classmethod
+    def of(cls, level: Dict):
+        """level as a profile (chamber dicts from older callers are converted)"""
+        if isinstance(level, cls):
+            return level
+        return cls(**{field: level[field] for field in cls.FIELDS if field in level})
+
+    def replace(self, **fields):
+        """Copy with some fields changed"""
+        return ChamberProfile(**dict(self, **fields))
+
+    @property
+    def impairment(self):
+        """What the chamber does to packets - every field but its label"""
+        return tuple(getattr(self, field) for field in self.FIELDS[1:])
+
+    def __setattr__(self, name, value):
+        raise AttributeError("chamber profiles are immutable - use replace()")
+
+    def __getitem__(self, field: str):
+        if field not in self.FIELDS:
+            raise KeyError(field)
+        value = getattr(self, field)
+        if value is None and field in self.OPTIONAL:
+            raise KeyError(field)
+        return value
+
+    def __iter__(self):
+        return (field for field in self.FIELDS if field not in self.OPTIONAL or getattr(self, field) is not None)
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    def __eq__(self, other):
+        if isinstance(other, ChamberProfile):
+            return self._hash == other._hash and all(getattr(self, f) == getattr(other, f) for f in self.FIELDS)
+        return Mapping.__eq__(self, other)
+
+    def __hash__(self):
+        return self._hash
+
+    def __repr__(self):
+        return f"ChamberProfile({dict(self)!r})"
 
 
 class ChaosChamber:
     """The 36 Chambers of Chaos - Wu-Tang inspired network disruption levels"""
-    PEACE = {
-        "name": "☯️  Chamber 0: Peace (Normal Network)",
-        "latency_ms": 0,
-        "packet_loss_pct": 0,
-        "bandwidth_kbps": None,
-        "jitter_ms": 0
-    }
+    PEACE = ChamberProfile("☯️  Chamber 0: Peace (Normal Network)")
 
-    FIRST = {
-        "name": "🥋 Chamber 1: The Swarm (Light Disruption)",
-        "latency_ms": 50,
-        "packet_loss_pct": 1,
-        "bandwidth_kbps": 50000,  # 50 Mbps
-        "jitter_ms": 10
-    }
+    FIRST = ChamberProfile(
+        "🥋 Chamber 1: The Swarm (Light Disruption)",
+        latency_ms=50,
+        packet_loss_pct=1,
+        bandwidth_kbps=50000,  # 50 Mbps
+        jitter_ms=10
+    )
 
-    NINTH = {
-        "name": "⚔️  Chamber 9: The Mystery (Moderate Chaos)",
-        "latency_ms": 150,
-        "packet_loss_pct": 3,
-        "bandwidth_kbps": 10000,  # 10 Mbps
-        "jitter_ms": 25
-    }
+    NINTH = ChamberProfile(
+        "⚔️  Chamber 9: The Mystery (Moderate Chaos)",
+        latency_ms=150,
+        packet_loss_pct=3,
+        bandwidth_kbps=10000,  # 10 Mbps
+        jitter_ms=25
+    )
 
-    EIGHTEENTH = {
-        "name": "🔥 Chamber 18: The Deadly Venoms (Heavy Ruckus)",
-        "latency_ms": 300,
-        "packet_loss_pct": 8,
-        "bandwidth_kbps": 2000,  # 2 Mbps
-        "jitter_ms": 50
-    }
+    EIGHTEENTH = ChamberProfile(
+        "🔥 Chamber 18: The Deadly Venoms (Heavy Ruckus)",
+        latency_ms=300,
+        packet_loss_pct=8,
+        bandwidth_kbps=2000,  # 2 Mbps
+        jitter_ms=50
+    )
 
-    THIRTYSIXTH = {
-        "name": "💀 Chamber 36: Liquid Swords (Extreme Chaos)",
-        "latency_ms": 500,
-        "packet_loss_pct": 15,
-        "bandwidth_kbps": 512,  # 512 Kbps
-        "jitter_ms": 100
-    }
+    THIRTYSIXTH = ChamberProfile(
+        "💀 Chamber 36: Liquid Swords (Extreme Chaos)",
+        latency_ms=500,
+        packet_loss_pct=15,
+        bandwidth_kbps=512,  # 512 Kbps
+        jitter_ms=100
+    )
 
-    SHAOLIN = {
-        "name": "☠️  Shaolin Shadow: Total Darkness (Complete Outage)",
-        "latency_ms": 0,
-        "packet_loss_pct": 100,
-        "bandwidth_kbps": 0,
-        "jitter_ms": 0
+    SHAOLIN = ChamberProfile(
+        "☠️  Shaolin Shadow: Total Darkness (Complete Outage)",
+        packet_loss_pct=100,
+        bandwidth_kbps=0
+    )
+
+    # CLI name -> profile, in menu order; --chambers files add to it
+    REGISTRY = {
+        'peace': PEACE,
+        'first': FIRST,
+        'ninth': NINTH,
+        'eighteenth': EIGHTEENTH,
+        'thirtysixth': THIRTYSIXTH,
+        'shaolin': SHAOLIN
     }
 
     @staticmethod
     def all_chambers():
         """Return all chambers in order"""
-        return [
-            ChaosChamber.PEACE,
-            ChaosChamber.FIRST,
-            ChaosChamber.NINTH,
-            ChaosChamber.EIGHTEENTH,
-            ChaosChamber.THIRTYSIXTH,
-            ChaosChamber.SHAOLIN
-        ]
+        return list(ChaosChamber.REGISTRY.values())
+
+    @staticmethod
+    def by_name(name: str):
+        """Look a chamber up by its CLI name (peace, first, ninth, ...); None if unknown"""
+        return ChaosChamber.REGISTRY.get(name.strip().lower())
+
+    @staticmethod
+    def load(path: str):
+        """Add chambers from a JSON file ({"chambers": {"cli-name": {fields}}}); returns their names.
+
+        A built-in name only needs the fields it changes. A new chamber
+        starts from Peace's zeros and is named after its key unless given a
+        name. Peace itself can't be redefined - it is what clearing means.
+        """
+        with open(path) as f:
+            config = json.load(f)
+        entries = config.get('chambers', config) if isinstance(config, dict) else None
+        if not isinstance(entries, dict):
+            raise ValueError('expected {"chambers": {"name": {"latency_ms": ..., ...}}}')
+        loaded = []
+        for key, fields in entries.items():
+            key = key.strip().lower()
+            if key == 'peace':
+                raise ValueError("the peace chamber can't be redefined")
+            if not isinstance(fields, dict):
+                raise ValueError(f"chamber '{key}': expected an object of fields")
+            unknown = set(fields) - set(ChamberProfile.FIELDS)
+            if unknown:
+                raise ValueError(f"chamber '{key}': unknown field(s) {', '.join(sorted(unknown))}")
+            base = ChaosChamber.REGISTRY.get(key) or ChaosChamber.PEACE.replace(name=f"🧪 {key}")
+            try:
+                profile = base.replace(**fields)
+            except ValueError as e:
+                raise ValueError(f"chamber '{key}': {e}")
+            if key in ChaosChamber.REGISTRY and getattr(ChaosChamber, key.upper(), None) is base:
+                setattr(ChaosChamber, key.upper(), profile)
+            ChaosChamber.REGISTRY[key] = profile
+            loaded.append(key)
+        return loaded
+
+    @staticmethod
+    def with_delay_dist(base: Dict, dist: Dict):
+        """base chamber with its delay model swapped for a compiled distribution table"""
+        return ChamberProfile.of(base).replace(
+            latency_ms=dist['mean_ms'],
+            jitter_ms=dist['sigma_ms'],
+            delay_dist=dist['name'],
+            dist_dir=dist['dir'],
+            name=(f"📐 Learned delay {dist['name']} (p50 {dist['p50_ms']}ms, p99 {dist['p99_ms']}ms)"
+                  + (f" + {base['packet_loss_pct']}% loss" if base['packet_loss_pct'] else ''))
+        )
+
+
+def _sd_notify(message: str) -> bool:
+    """Send a state line (READY=1, WATCHDOG=1, ...) to systemd; False when not run by systemd"""
+    path = os.environ.get('NOTIFY_SOCKET')
+    if not path:
+        return False
+    if path.startswith('@'):
+        path = '\0' + path[1:]  # abstract namespace socket
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM) as sock:
+            sock.setblocking(False)  # never stall the loop on a backed-up notify socket
+            sock.connect(path)
+            sock.sendall(message.encode())
+        return True
+    except OSError:
+        return False
+
+
+def _watchdog_interval() -> Optional[float]:
+    """Seconds between WATCHDOG=1 keepalives (half of WatchdogSec=), None if systemd isn't watching us"""
+    usec = os.environ.get('WATCHDOG_USEC')
+    pid = os.environ.get('WATCHDOG_PID')
+    if not usec or (pid and pid != str(os.getpid())):
+        return None
+    try:
+        return int(usec) / 2 / 1_000_000
+    except ValueError:
+        return None
+
+
+class FailsafeTimer:
+    """Process-independent expiry that runs --restore even if we are SIGKILLed or OOM-killed.
+
+    A transient systemd timer (systemd-run --on-active), or an at job where
+    systemd isn't running. Arming costs a fork or two, so the deadman only
+    re-arms when the armed expiry is about to pass - never per reset().
+    """
+
+    UNIT = 'bring-da-ruckus-failsafe'
+
+    def __init__(self):
+        if shutil.which('systemd-run') and os.path.isdir('/run/systemd/system'):
+            self.kind = 'systemd'
+        elif shutil.which('at'):
+            self.kind = 'at'
+        else:
+            self.kind = None
+        self.command = None
+        self.expires = None     # monotonic time the armed expiry runs --restore
+        self._at_job = None
+        self._lock = threading.Lock()
+
+    def arm(self, seconds: float, command) -> bool:
+        """(Re-)arm the expiry seconds from now; replaces any earlier one"""
+        if not self.kind:
+            return False
+        seconds = max(1, math.ceil(seconds))
+        with self._lock:
+            self._cancel()
+            if self.kind == 'systemd':
+                # Also stops a timer a SIGKILLed predecessor left behind - this one supersedes it
+                subprocess.run(['systemctl', 'stop', f'{self.UNIT}.timer'], capture_output=True)
+                result = subprocess.run(
+                    ['systemd-run', '--quiet', '--collect', f'--unit={self.UNIT}', f'--on-active={seconds}s',
+                     '--timer-property=AccuracySec=1s', '--description=Bring Da Ruckus failsafe restore',
+                     *command],
+                    capture_output=True, text=True
+                )
+                ok = result.returncode == 0
+            else:
+                result = subprocess.run(['at', 'now', '+', str(math.ceil(seconds / 60)), 'minutes'],
+                                        input=shlex.join(command) + '\n', capture_output=True, text=True)
+                match = re.search(r'job (\d+)', result.stderr)
+                self._at_job = match.group(1) if match else None
+                ok = result.returncode == 0 and bool(match)
+            if not ok:
+                print(f"   ⚠️  Could not arm the failsafe expiry: {result.stderr.strip()}", file=sys.stderr)
+                return False
+            self.command = list(command)
+            self.expires = time.monotonic() + seconds
+            return True
+
+    def disarm(self):
+        """Cancel the pending expiry (chaos was cleared the normal way)"""
+        with self._lock:
+            self._cancel()
+
+    def _cancel(self):
+        if self.expires is None:
+            return
+        if self.kind == 'systemd':
+            subprocess.run(['systemctl', 'stop', f'{self.UNIT}.timer'], capture_output=True)
+        elif self._at_job:
+            subprocess.run(['atrm', self._at_job], capture_output=True)
+        self.expires = None
+        self._at_job = None
 
 
 class DeadmanSwitch:
-    """Safety mechanism to automatically stop ruckus after inactivity"""
+    """Safety mechanism to automatically stop ruckus after inactivity.
+
+    One timer on an asyncio loop - the daemon's own loop, or a private one
+    on a background thread for the interactive modes. reset() only moves
+    the deadline; the timer notices when it fires and sleeps on, so nothing
+    polls and nothing reads stdin. Under systemd the same loop sends the
+    WATCHDOG=1 keepalives, so a hung loop gets the process killed and
+    cleaned up by --restore.
+
+    With a failsafe attached, every active chamber also has a kernel-side
+    expiry (a transient timer running --restore) set FAILSAFE_GRACE_S past
+    the deadline. It only moves when the old deadline comes round with the
+    session still active, so keeping a session alive costs one re-arm per
+    timeout period.
+    """
+
+    WARNING_S = 30
+    FAILSAFE_GRACE_S = 60
 
     def __init__(self, timeout_minutes: int, callback):
         self.timeout_minutes = timeout_minutes
         self.callback = callback
         self.last_activity = datetime.now()
+        self.deadline = time.monotonic() + timeout_minutes * 60
         self.running = False
-        self.thread = None
         self.warned = False
+        self.loop = None
+        self._owns_loop = False
+        self._timer = None
+        self._watchdog = None
+        self.failsafe = None    # FailsafeTimer outliving this process, if any
 
     def reset(self):
         """Reset the timer - call this on any user activity"""
         self.last_activity = datetime.now()
+        self.deadline = time.monotonic() + self.timeout_minutes * 60
+        self.warned = False
 
-    def start(self):
-        """Start monitoring"""
+    def start(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        """Start the timer on loop (run by the caller), or on a private loop thread"""
+        if self.running:
+            return
+        self.reset()
         self.running = True
-        self.thread = threading.Thread(target=self._monitor, daemon=True)
-        self.thread.start()
+        if loop is None:
+            loop = asyncio.new_event_loop()
+            self._owns_loop = True
+            threading.Thread(target=loop.run_forever, name='deadman', daemon=True).start()
+        self.loop = loop
+        loop.call_soon_threadsafe(self._check)
+        interval = _watchdog_interval()
+        if interval and not self._watchdog:
+            self._watchdog = loop.call_soon_threadsafe(self._ping, interval)
 
     def stop(self):
         """Stop monitoring"""
         self.running = False
+        if not self.loop:
+            return
+        if self.loop.is_closed():
+            # The loop's owner already tore it down - nothing of ours can fire any more
+            self._timer = self._watchdog = None
+            return
+        self.loop.call_soon_threadsafe(self._disarm)
+        if self._owns_loop:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self._owns_loop = False
 
-    def _monitor(self):
-        """Background monitoring thread"""
-        while self.running:
-            time.sleep(5)  # Check every 5 seconds
-            elapsed = (datetime.now() - self.last_activity).total_seconds()
-            elapsed_minutes = elapsed / 60
-
-            # Warning at 30 seconds before timeout
-            if not self.warned and elapsed >= (self.timeout_minutes * 60 - 30):
-                self.warned = True
-                print(f"\n\n⚠️  WARNING: Deadman's switch will trigger in 30 seconds!")
-                print("Continue testing? (Y/N): ", end='', flush=True)
-
-                # Start a thread to wait for input
-                import select
-                import sys
-
-                # Non-blocking input check for 30 seconds
-                start_wait = datetime.now()
-                user_responded = False
-
-                while (datetime.now() - start_wait).total_seconds() < 30:
-                    if sys.stdin in select.select([sys.stdin], [], [], 0)[0]:
-                        response = sys.stdin.readline().strip().upper()
-                        if response == 'Y' or response == 'YES':
-                            print("✅ Timer reset! Continuing for another {0} minutes.".format(self.timeout_minutes))
-                            self.reset()
-                            self.warned = False
-                            user_responded = True
-                            break
-                        else:
-                            print("🛑 Stopping chaos...")
-                            self.callback()
-                            return
-                    time.sleep(0.5)
-
-                # If no response after 30 seconds, trigger callback
-                if not user_responded:
-                    print("\n\n⏰ No response - Deadman's switch triggered!")
-                    self.callback()
-                    break
+    def arm_failsafe(self, command):
+        """Make sure a failsafe expiry running command is pending past the current deadline"""
+        failsafe = self.failsafe
+        if failsafe and (failsafe.expires is None or failsafe.command != list(command)):
+            failsafe.arm(self.deadline + self.FAILSAFE_GRACE_S - time.monotonic(), command)
 
-            # Final timeout check
-            elif elapsed_minutes >= self.timeout_minutes:
-                if not self.warned:  # Direct timeout without warning
-                    print(f"\n⏰ Deadman's switch triggered after {self.timeout_minutes} minutes of inactivity!")
-                    self.callback()
-                    break
+    def disarm_failsafe(self):
+        if self.failsafe:
+            self.failsafe.disarm()
+
+    def _disarm(self):
+        for handle in (self._timer, self._watchdog):
+            if handle:
+                handle.cancel()
+        self._timer = self._watchdog = None
+
+    def _check(self):
+        """The one timer: warn, fire, or sleep until the (possibly moved) deadline"""
+        if not self.running:
+            return
+        remaining = self.deadline - time.monotonic()
+        if remaining <= 0:
+            # Only the deadman stops here - the watchdog keepalives carry on
+            self.running = False
+            self._timer = None
+            print(f"\n⏰ Deadman's switch triggered after {self.timeout_minutes} minutes of inactivity!")
+            self.callback()
+            return
+        if not self.warned and remaining <= self.WARNING_S + 0.01:
+            self.warned = True
+            print(f"\n\n⚠️  WARNING: Deadman's switch will trigger in {remaining:.0f} seconds!")
+            print("   Any command (or just Enter) resets the timer")
+        wake = self.deadline if self.warned else self.deadline - self.WARNING_S
+
+        failsafe = self.failsafe
+        if failsafe and failsafe.expires is not None:
+            armed_deadline = failsafe.expires - self.FAILSAFE_GRACE_S
+            if time.monotonic() >= armed_deadline - 0.01:
+                # Still active at the deadline the expiry was armed for - push it past the new one
+                failsafe.arm(self.deadline + self.FAILSAFE_GRACE_S - time.monotonic(), failsafe.command)
+            elif self.deadline > armed_deadline:
+                wake = min(wake, armed_deadline)
+        self._timer = self.loop.call_at(wake, self._check)
+
+    def _ping(self, interval: float):
+        """WATCHDOG=1 keepalive - only sent while this loop is actually running"""
+        _sd_notify('WATCHDOG=1')
+        self._watchdog = self.loop.call_later(interval, self._ping, interval)
+
+
+class TcOp:
+    """A single qdisc/class/filter operation in a ruckus plan (one line of a `tc -batch` script)"""
+
+    __slots__ = ('verb', 'obj', 'dev', 'parent', 'handle', 'kind', 'params')
+
+    def __init__(self, verb: str, obj: str, dev: str, parent: str = 'root',
+                 handle: Optional[str] = None, kind: Optional[str] = None,
+                 params: Optional[Dict] = None):
+        self.verb = verb        # add / del / change / replace
+        self.obj = obj          # qdisc / class / filter
+        self.dev = dev
+        self.parent = parent    # 'root' or a handle like '1:1'
+        self.handle = handle
+        self.kind = kind        # netem / tbf / prio / htb / u32 / flower ...
+        self.params = params or {}
+
+    def to_tc(self) -> str:
+        """Render this operation as a `tc -batch` line (without the leading 'tc')"""
+        words = [self.obj, self.verb, 'dev', self.dev]
+        if self.parent == 'clsact':
+            return ' '.join(words + ['clsact'])  # tc takes no handle or kind for clsact
+        if self.obj == 'filter':
+            words += ['protocol', self.params.get('protocol', 'ip')]
+        words += ['root'] if self.parent == 'root' else ['parent', self.parent]
+        if self.obj == 'filter' and 'prio' in self.params:
+            words += ['prio', str(self.params['prio'])]
+        if self.handle:
+            words += ['classid' if self.obj == 'class' else 'handle', self.handle]
+        if self.kind and self.verb != 'del':
+            words.append(self.kind)
+            words += _tc_args(self.kind, self.params)
+        elif self.kind and self.obj == 'filter' and self.handle:
+            words.append(self.kind)  # tc needs the kind to resolve a filter handle
+        return ' '.join(words)
+
+    def shape(self):
+        """Everything that pins this op's place in the tree - params of a qdisc excluded"""
+        key = (self.obj, self.dev, self.parent, self.handle, self.kind)
+        if self.kind == 'netem':
+            # netem keeps its old delay table across a change that omits one
+            key += (self.params.get('dist'),)
+        if self.obj == 'filter':
+            key += (self.params.get('prio'),)
+            if not self.handle:
+                # Kernel-numbered filters can only be told apart by their match
+                key += (tuple(sorted(self.params.items())),)
+        return key
+
+    def as_verb(self, verb: str):
+        """Copy of this op with a different verb (e.g. 'change' for in-place updates)"""
+        return TcOp(verb, self.obj, self.dev, self.parent, self.handle, self.kind, self.params)
+
+    def __repr__(self):
+        return f"TcOp({self.to_tc()!r})"
+
+
+class CompiledPlan:
+    """A chamber compiled for one device, scope and target set - immutable, so it is cached and shared.
+
+    The ops are committed as they are; cost is what the last commit of them
+    is expected to take, for --plan and the apply report.
+    """
+
+    __slots__ = ('ops', 'queue_cost', 'compile_ms')
+
+    # Rough per-commit costs: one sendmsg batch vs a tc fork, plus a little per op
+    COMMIT_MS = {'rtnetlink': (0.1, 0.03), 'tc -batch': (3.0, 0.05)}
+
+    def __init__(self, ops, queue_cost, compile_ms: float):
+        object.__setattr__(self, 'ops', tuple(ops))
+        object.__setattr__(self, 'queue_cost', queue_cost)    # (packets, worst-case bytes, netem qdiscs)
+        object.__setattr__(self, 'compile_ms', compile_ms)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("compiled plans are immutable")
+
+    @classmethod
+    def commit_ms(cls, backend: str, n_ops: int) -> float:
+        """Estimated time to commit n_ops through backend"""
+        fixed, per_op = cls.COMMIT_MS[backend]
+        return fixed + per_op * n_ops if n_ops else 0.0
+
+
+def _tc_args(kind: str, params: Dict):
+    """Render the kind-specific tail of a tc command from structured params"""
+    args = []
+    if kind == 'netem':
+        if params.get('delay_ms'):
+            args += ['delay', f"{params['delay_ms']}ms"]
+            if params.get('jitter_ms'):
+                args.append(f"{params['jitter_ms']}ms")
+            if params.get('dist'):
+                args += ['distribution', params['dist']]
+        if params.get('loss_pct'):
+            args += ['loss', f"{params['loss_pct']}%"]
+        if params.get('limit'):
+            args += ['limit', str(params['limit'])]
+    elif kind == 'tbf':
+        args += ['rate', f"{params['rate_kbps']}kbit",
+                 'burst', str(params['burst']),
+                 'limit', str(params['limit'])]
+    elif kind == 'prio':
+        args += ['bands', str(params.get('bands', 3))]
+    elif kind == 'htb':
+        if 'rate_kbps' in params:
+            args += ['rate', f"{params['rate_kbps']}kbit", 'ceil', f"{params['ceil_kbps']}kbit",
+                     'burst', str(params['burst']), 'cburst', str(params['burst']),
+                     'quantum', str(params['quantum'])]
+        else:
+            args += ['default', f"{params['default']:x}"]
+    elif kind == 'u32':
+        if 'redirect' in params:
+            # Match everything and steal it onto the IFB device
+            args += ['match', 'u32', '0', '0', 'action', 'mirred', 'egress', 'redirect',
+                     'dev', params['redirect']]
+        elif 'divisor' in params:
+            args += ['divisor', str(params['divisor'])]
+        elif 'link' in params:
+            # Jump into the hash table keyed on the last octet of the address
+            args += ['ht', '800::', 'match', 'ip', params['field'], '0.0.0.0/0',
+                     'hashkey', 'mask', '0x000000ff', 'at', str(_U32_OFFSETS[params['field']]),
+                     'link', params['link']]
+        else:
+            field = 'src' if 'src' in params else 'dst'
+            if 'ht' in params:
+                args += ['ht', params['ht']]
+            args += ['match', 'ip', field, params[field], 'classid', params['classid']]
+    elif kind == 'flower':
+        field = 'src' if 'src' in params else 'dst'
+        args += [f"{field}_ip", params[field], 'classid', params['classid']]
+    return args
+
+
+_U32_OFFSETS = {'src': 12, 'dst': 16}
+
+# sk_buff + skb_shared_info bookkeeping the kernel charges for each queued packet
+_SKB_OVERHEAD = 768
+
+
+def _parse_targets(specs):
+    """Normalise target specs into a sorted list of IPv4 networks.
+
+    Each spec is an IP, a CIDR, a comma separated list of those, or the path
+    of a file holding one per line ('#' comments allowed).
+    """
+    if isinstance(specs, str):
+        specs = [specs]
+    networks = []
+    for spec in specs:
+        for token in spec.split(','):
+            token = token.strip()
+            if not token:
+                continue
+            if os.path.isfile(token.lstrip('@')):
+                with open(token.lstrip('@')) as f:
+                    lines = [line.split('#', 1)[0].strip() for line in f]
+                networks += _parse_targets([line for line in lines if line])
+                continue
+            network = ipaddress.ip_network(token, strict=False)
+            if network.version != 4:
+                raise ValueError(f"Only IPv4 targets are supported: {token}")
+            networks.append(network)
+    return list(ipaddress.collapse_addresses(networks))
+
+
+def _link_mtu(dev: str) -> int:
+    """MTU of dev from sysfs (1500 if it can't be read)"""
+    try:
+        with open(f'/sys/class/net/{dev}/mtu') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return 1500
+
+
+def _tx_queue_count(dev: str) -> int:
+    """Number of active TX queues on dev from sysfs (1 if it can't be read)"""
+    try:
+        return max(1, sum(1 for name in os.listdir(f'/sys/class/net/{dev}/queues') if name.startswith('tx-')))
+    except OSError:
+        return 1
+
+
+def _tx_bytes(dev: str) -> Optional[int]:
+    """Bytes transmitted by dev so far, from sysfs (None if it can't be read)"""
+    try:
+        with open(f'/sys/class/net/{dev}/statistics/tx_bytes') as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+def _link_speed_kbps(dev: str) -> int:
+    """Negotiated link speed of dev in kbit/s (10 Gbit/s for virtual or unknown links)"""
+    try:
+        with open(f'/sys/class/net/{dev}/speed') as f:
+            speed = int(f.read())
+        if speed > 0:
+            return speed * 1000
+    except (OSError, ValueError):
+        pass
+    return 10_000_000
+
+
+# netem delay tables: int16 samples of the inverse CDF in units of sigma/8192
+NETEM_DIST_SCALE = 8192
+NETEM_DIST_SIZE = 4096
+_DIST_MAX = 32767
+
+
+def _dist_cache_dir() -> str:
+    """Where compiled delay tables live (systemd's CacheDirectory= when run as the service)"""
+    base = os.environ.get('CACHE_DIRECTORY', '').split(':')[0]
+    if not base:
+        base = os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.expanduser('~/.cache'),
+                            'bring-da-ruckus')
+    return os.path.join(base, 'dist')
+
+
+def _read_delay_samples(path: str, target: Optional[str] = None):
+    """Delay samples (ms) from a plain list of numbers or a monitor --record trace.
+
+    Trace lines are JSON objects; their latency_ms is used, optionally only
+    for one target. Anything else is read as whitespace/comma separated numbers.
+    """
+    samples = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            if line.startswith('{'):
+                sample = json.loads(line)
+                if target and sample.get('target') != target:
+                    continue
+                if sample.get('latency_ms') is not None:
+                    samples.append(float(sample['latency_ms']))
+            else:
+                samples += [float(token) for token in line.replace(',', ' ').split()]
+    return samples
+
+
+def _write_atomic(path: str, text: str, durable: bool = False):
+    """Write text to path via a temp file + rename so readers never see half a file.
+
+    durable also fsyncs the file and its directory, so the new contents
+    survive a power cut or kernel panic right after we return.
+    """
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(text)
+        if durable:
+            f.flush()
+            os.fsync(f.fileno())
+    os.replace(tmp, path)
+    if durable:
+        _fsync_dir(os.path.dirname(path))
+
+
+def _fsync_dir(path: str):
+    """Make a rename/unlink in path durable"""
+    fd = os.open(path or '.', os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class StateJournal:
+    """Write-ahead record of every kernel object we create, fsync'd before the object exists.
+
+    Kinds: 'tc' (dev -> [parent, handle, kind] of the root/clsact qdiscs we
+    hang trees off), 'ifb' (IFB devices we created), 'filter' and 'nat'
+    (iptables rule specs like "INPUT -p tcp --dport 22 -j ACCEPT") and
+    'sysctl' (key -> the value it had before we changed it). Restoring
+    undoes exactly these and nothing else - no ruleset scans, no flushes.
+    """
+
+    KINDS = ('tc', 'ifb', 'filter', 'nat', 'sysctl')
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or os.path.join(_runtime_dir(), 'journal.json')
+        self.entries = {kind: {} for kind in self.KINDS}
+        self._lock = threading.Lock()
+        self._warned = False
+
+    def load(self) -> int:
+        """Adopt what an earlier session journaled; returns how many objects that was"""
+        try:
+            with open(self.path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return 0
+        with self._lock:
+            for kind in self.KINDS:
+                for key, value in saved.get(kind, {}).items():
+                    self.entries[kind].setdefault(key, value)
+        return len(self)
+
+    def __len__(self):
+        return sum(len(objects) for objects in self.entries.values())
+
+    def add(self, kind: str, key: str, value=None):
+        """Journal an object - call before creating it; a no-op (no fsync) if already journaled"""
+        self.add_all(kind, [key], value)
+
+    def add_all(self, kind: str, keys, value=None):
+        """Journal a batch of objects with a single fsync"""
+        with self._lock:
+            objects = self.entries[kind]
+            fresh = [key for key in keys if key not in objects or objects[key] != value]
+            if fresh:
+                objects.update((key, value) for key in fresh)
+                self._flush()
+
+    def discard(self, kind: str, key: str):
+        """Forget an object once it is gone from the kernel"""
+        self.discard_all(kind, [key])
+
+    def discard_all(self, kind: str, keys):
+        with self._lock:
+            objects = self.entries[kind]
+            gone = [key for key in keys if key in objects]
+            for key in gone:
+                del objects[key]
+            if gone:
+                self._flush()
+
+    def _flush(self):
+        try:
+            if len(self):
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                _write_atomic(self.path, json.dumps(self.entries, indent=1) + '\n', durable=True)
+            elif os.path.exists(self.path):
+                os.unlink(self.path)
+                _fsync_dir(os.path.dirname(self.path))
+        except OSError as e:
+            if not self._warned:
+                print(f"   ⚠️  Could not write the state journal {self.path}: {e}", file=sys.stderr)
+                self._warned = True
+
+
+def compile_delay_dist(samples, cache_dir: Optional[str] = None) -> Dict:
+    """Compile measured delays into a netem distribution table, cached by content hash.
+
+    The table is the empirical inverse CDF normalised to (x - mean) / sigma,
+    which is what netem's tabledist() expects. sigma is widened when the
+    tails reach past the +-4 sigma an int16 entry can hold, so the extreme
+    samples are reproduced instead of clipped. Returns the table metadata
+    (name, mean_ms, sigma_ms, ...); a cache hit skips the compile entirely.
+    """
+    ordered = sorted(float(x) for x in samples if x is not None and x >= 0)
+    if len(ordered) < 2:
+        raise ValueError("Need at least two delay samples to build a distribution")
+    digest = hashlib.sha256('\n'.join(f"{x:.3f}" for x in ordered).encode()).hexdigest()
+    name = f"ruckus-{digest[:16]}"
+    cache_dir = cache_dir or _dist_cache_dir()
+    meta_path = os.path.join(cache_dir, f"{name}.json")
+    try:
+        with open(meta_path) as f:
+            meta = json.load(f)
+        meta['cached'] = True
+        meta['dir'] = cache_dir
+        return meta
+    except (OSError, ValueError):
+        pass
+
+    n = len(ordered)
+    mean = sum(ordered) / n
+    sigma = math.sqrt(sum((x - mean) ** 2 for x in ordered) / n)
+    span = max(ordered[-1] - mean, mean - ordered[0])
+    sigma = max(sigma, span * NETEM_DIST_SCALE / _DIST_MAX, 0.001)
+
+    table = []
+    for i in range(NETEM_DIST_SIZE):
+        pos = (i + 0.5) / NETEM_DIST_SIZE * (n - 1)
+        lo = int(pos)
+        value = ordered[lo] + (ordered[min(lo + 1, n - 1)] - ordered[lo]) * (pos - lo)
+        table.append(max(-_DIST_MAX, min(_DIST_MAX, round((value - mean) / sigma * NETEM_DIST_SCALE))))
+
+    meta = {
+        'name': name,
+        'mean_ms': round(mean, 3),
+        'sigma_ms': round(sigma, 3),
+        'samples': n,
+        'min_ms': round(ordered[0], 3),
+        'p50_ms': round(ordered[n // 2], 3),
+        'p99_ms': round(ordered[min(n - 1, int(n * 0.99))], 3),
+        'max_ms': round(ordered[-1], 3),
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    lines = [f"# {name}: {n} samples, mean {meta['mean_ms']}ms, sigma {meta['sigma_ms']}ms"]
+    lines += [' '.join(str(v) for v in table[i:i + 8]) for i in range(0, NETEM_DIST_SIZE, 8)]
+    _write_atomic(os.path.join(cache_dir, f"{name}.dist"), '\n'.join(lines) + '\n')
+    # Metadata goes last: its presence is what marks the cache entry complete
+    _write_atomic(meta_path, json.dumps(meta, indent=2) + '\n')
+    meta['cached'] = False
+    meta['dir'] = cache_dir
+    return meta
+
+
+@functools.lru_cache(maxsize=32)
+def _load_dist_table(cache_dir: str, name: str) -> bytes:
+    """A cached .dist table packed as the s16 array TCA_NETEM_DELAY_DIST carries"""
+    with open(os.path.join(cache_dir, f"{name}.dist")) as f:
+        values = [int(token) for line in f if not line.startswith('#') for token in line.split()]
+    return struct.pack(f'{len(values)}h', *values)
+
+
+class BackendUnsupported(Exception):
+    """Raised when a backend cannot express an operation (caller falls back to the tc CLI)"""
+
+
+class TcCliBackend:
+    """Drives the kernel through the iproute2 `tc` binary, one `tc -batch` fork per commit"""
+
+    name = 'tc'
+
+    def commit(self, ops, force: bool = False):
+        """Push ops through a single `tc -batch` process.
+
+        tc stops at the first failing line unless force is set, so a failed
+        batch leaves a prefix of the plan applied. Returns (ok, stderr, n_ok)
+        where n_ok is the length of that applied prefix.
+        """
+        if not ops:
+            return True, '', 0
+        script = '\n'.join(op.to_tc() for op in ops) + '\n'
+        cmd = ["tc", "-force", "-batch", "-"] if force else ["tc", "-batch", "-"]
+        # tc looks up `distribution NAME` as $TC_LIB_DIR/NAME.dist
+        dist_dirs = {op.params['dist_dir'] for op in ops if op.params.get('dist_dir')}
+        env = dict(os.environ, TC_LIB_DIR=dist_dirs.pop()) if dist_dirs else None
+        result = subprocess.run(cmd, input=script, capture_output=True, text=True, env=env)
+        if result.returncode == 0:
+            return True, '', len(ops)
+        match = re.search(r'Command failed -:(\d+)', result.stderr)
+        n_ok = int(match.group(1)) - 1 if match else None
+        return False, result.stderr.strip(), n_ok
+
+    def root_handle(self, dev: str):
+        """Handle of dev's root qdisc ('0:' for the kernel default)"""
+        result = subprocess.run(
+            ["tc", "qdisc", "show", "dev", dev, "root"],
+            capture_output=True, text=True
+        )
+        match = re.search(r'qdisc \S+ ([0-9a-f]+:)', result.stdout)
+        return match.group(1) if match else '0:'
+
+
+# --- rtnetlink ---------------------------------------------------------------
+# Just enough of linux/rtnetlink.h and linux/pkt_sched.h to manage our own
+# qdiscs and filters without forking tc. Anything not encoded here raises
+# BackendUnsupported and goes through the tc CLI instead.
+
+NETLINK_ROUTE = 0
+SOL_NETLINK = 270
+NETLINK_EXT_ACK = 11
+
+NLMSG_ERROR = 2
+NLMSG_DONE = 3
+NLM_F_REQUEST = 0x1
+NLM_F_MULTI = 0x2
+NLM_F_ACK = 0x4
+NLM_F_DUMP = 0x300
+NLM_F_REPLACE = 0x100
+NLM_F_EXCL = 0x200
+NLM_F_CREATE = 0x400
+NLM_F_CAPPED = 0x100
+NLM_F_ACK_TLVS = 0x200
+NLMSGERR_ATTR_MSG = 1
+
+RTM_NEWLINK = 16
+RTM_DELLINK = 17
+RTM_GETLINK = 18
+RTM_NEWROUTE = 24
+RTM_GETROUTE = 26
+RTM_NEWQDISC = 36
+RTM_DELQDISC = 37
+RTM_GETQDISC = 38
+RTM_NEWTCLASS = 40
+RTM_DELTCLASS = 41
+RTM_NEWTFILTER = 44
+RTM_DELTFILTER = 45
+
+IFLA_IFNAME = 3
+IFLA_MASTER = 10
+IFLA_OPERSTATE = 16
+IFLA_LINKINFO = 18
+IFLA_INFO_KIND = 1
+IFLA_NUM_TX_QUEUES = 31
+IFF_UP = 0x1
+IFF_LOOPBACK = 0x8
+
+RTA_OIF = 4
+RTA_PRIORITY = 6
+RTA_TABLE = 15
+RT_TABLE_MAIN = 254
+RTN_UNICAST = 1
+
+TCA_KIND = 1
+TCA_OPTIONS = 2
+TCA_STATS2 = 7
+TCA_STATS_BASIC = 1
+TCA_STATS_QUEUE = 3
+TC_H_ROOT = 0xFFFFFFFF
+TC_H_CLSACT = 0xFFFFFFF1
+TC_LINKLAYER_ETHERNET = 1
+ETH_P_ALL = 0x0003
+ETH_P_IP = 0x0800
+
+TCA_NETEM_DELAY_DIST = 2
+TCA_NETEM_LATENCY64 = 10
+TCA_NETEM_JITTER64 = 11
+TCA_TBF_PARMS = 1
+TCA_TBF_BURST = 6
+TCA_HTB_PARMS = 1
+TCA_HTB_INIT = 2
+TCA_HTB_RATE64 = 6
+TCA_HTB_CEIL64 = 7
+TCA_U32_CLASSID = 1
+TCA_U32_SEL = 5
+TCA_U32_ACT = 7
+TCA_ACT_KIND = 1
+TCA_ACT_OPTIONS = 2
+TCA_MIRRED_PARMS = 2
+TCA_EGRESS_REDIR = 1
+TC_ACT_STOLEN = 4
+TC_U32_TERMINAL = 1
+TCA_FLOWER_CLASSID = 1
+TCA_FLOWER_KEY_ETH_TYPE = 8
+TCA_FLOWER_KEY_IPV4_SRC = 10
+TCA_FLOWER_KEY_IPV4_DST = 12
+
+_TCMSG = struct.Struct('BxxxiIII')
+_IFINFOMSG = struct.Struct('BxHiII')
+_RTMSG = struct.Struct('BBBBBBBBI')
+_NLMSGHDR = struct.Struct('IHHII')
+_PRIO_DEFAULT_MAP = (1, 2, 2, 2, 1, 2, 0, 0, 1, 1, 1, 1, 1, 1, 1, 1)
+
+
+def _nla(attr_type: int, payload: bytes) -> bytes:
+    """Encode one netlink attribute, padded to 4 bytes"""
+    length = 4 + len(payload)
+    return struct.pack('HH', length, attr_type) + payload + b'\0' * (-length % 4)
+
+
+def _parse_nla(data: bytes):
+    """Decode a run of netlink attributes into {type: payload}"""
+    attrs = {}
+    offset = 0
+    while offset + 4 <= len(data):
+        length, attr_type = struct.unpack_from('HH', data, offset)
+        if length < 4:
+            break
+        attrs[attr_type & 0x3fff] = data[offset + 4:offset + length]
+        offset += (length + 3) & ~3
+    return attrs
+
+
+def _tc_handle(handle: Optional[str]) -> int:
+    """Parse a tc handle ('root', '1:', '1:1', hex like tc does) into its u32 form"""
+    if not handle:
+        return 0
+    if handle == 'root':
+        return TC_H_ROOT
+    if handle == 'clsact':
+        return TC_H_CLSACT
+    major, _, minor = handle.partition(':')
+    return (int(major or '0', 16) << 16) | int(minor or '0', 16)
+
+
+def _tc_handle_str(value: int) -> str:
+    """Inverse of _tc_handle: u32 back to 'root', 'clsact', '1:' or '1:2'"""
+    if value == TC_H_ROOT:
+        return 'root'
+    if value == TC_H_CLSACT:
+        return 'clsact'
+    minor = value & 0xFFFF
+    return f"{value >> 16:x}:{minor:x}" if minor else f"{value >> 16:x}:"
+
+
+def _ratespec(rate_bytes: int) -> bytes:
+    """struct tc_ratespec with a link-layer set, so the kernel needs no rate table"""
+    return struct.pack('BBHhHI', 0, TC_LINKLAYER_ETHERNET, 0, 0, 0, min(rate_bytes, 0xFFFFFFFF))
+
+
+def _qdisc_options(kind: str, params: Dict) -> bytes:
+    """TCA_OPTIONS payload for a qdisc kind"""
+    if kind == 'netem':
+        delay_ns = int(params.get('delay_ms', 0) * 1_000_000)
+        jitter_ns = int(params.get('jitter_ms', 0) * 1_000_000) if delay_ns else 0
+        loss = min(int(params.get('loss_pct', 0) / 100 * 0xFFFFFFFF), 0xFFFFFFFF)
+        # Old kernels read the tick fields (64ns psched ticks), new ones the 64-bit attrs
+        qopt = struct.pack('IIIIII', min(delay_ns >> 6, 0xFFFFFFFF), params.get('limit', 1000),
+                           loss, 0, 0, min(jitter_ns >> 6, 0xFFFFFFFF))
+        options = (qopt + _nla(TCA_NETEM_LATENCY64, struct.pack('q', delay_ns))
+                   + _nla(TCA_NETEM_JITTER64, struct.pack('q', jitter_ns)))
+        if params.get('dist'):
+            options += _nla(TCA_NETEM_DELAY_DIST, _load_dist_table(params['dist_dir'], params['dist']))
+        return options
+    if kind == 'tbf':
+        rate = params['rate_kbps'] * 1000 // 8
+        burst = params['burst']
+        buffer_ticks = min(int(burst * 1e9 / rate) >> 6, 0xFFFFFFFF)
+        parms = _ratespec(rate) + _ratespec(0) + struct.pack('III', params['limit'], buffer_ticks, 0)
+        return _nla(TCA_TBF_PARMS, parms) + _nla(TCA_TBF_BURST, struct.pack('I', burst))
+    if kind == 'prio':
+        return struct.pack('i16B', params.get('bands', 3), *_PRIO_DEFAULT_MAP)
+    if kind in ('mq', 'clsact'):
+        return b''
+    if kind == 'htb':
+        # struct tc_htb_glob: version 3, r2q 10, default class, no debug, no direct_pkts
+        return _nla(TCA_HTB_INIT, struct.pack('IIIII', 3, 10, params['default'], 0, 0))
+    raise BackendUnsupported(f"qdisc kind '{kind}'")
+
+
+def _class_options(kind: str, params: Dict) -> bytes:
+    """TCA_OPTIONS payload for a class kind"""
+    if kind == 'htb':
+        rate = params['rate_kbps'] * 1000 // 8
+        ceil = params['ceil_kbps'] * 1000 // 8
+        buffer_ticks = min(int(params['burst'] * 1e9 / rate) >> 6, 0xFFFFFFFF)
+        cbuffer_ticks = min(int(params['burst'] * 1e9 / ceil) >> 6, 0xFFFFFFFF)
+        parms = (_ratespec(rate) + _ratespec(ceil)
+                 + struct.pack('IIIII', buffer_ticks, cbuffer_ticks, params['quantum'], 0, 0))
+        attrs = _nla(TCA_HTB_PARMS, parms)
+        if rate > 0xFFFFFFFF:
+            attrs += _nla(TCA_HTB_RATE64, struct.pack('Q', rate))
+        if ceil > 0xFFFFFFFF:
+            attrs += _nla(TCA_HTB_CEIL64, struct.pack('Q', ceil))
+        return attrs
+    raise BackendUnsupported(f"class kind '{kind}'")
+
+
+def _filter_options(kind: str, params: Dict) -> bytes:
+    """TCA_OPTIONS payload for a classifier kind"""
+    field = 'src' if 'src' in params else 'dst'
+    if kind == 'u32' and 'redirect' in params:
+        try:
+            ifindex = socket.if_nametoindex(params['redirect'])
+        except OSError:
+            raise BackendUnsupported(f"unknown device {params['redirect']}")
+        # struct tc_mirred: tc_gen (index, capab, action, refcnt, bindcnt), eaction, ifindex
+        mirred = _nla(TCA_MIRRED_PARMS, struct.pack('IIiiiiI', 0, 0, TC_ACT_STOLEN, 0, 0,
+                                                    TCA_EGRESS_REDIR, ifindex))
+        action = _nla(TCA_ACT_KIND, b'mirred\0') + _nla(TCA_ACT_OPTIONS, mirred)
+        sel = struct.pack('BBBxHHhhI', TC_U32_TERMINAL, 0, 1, 0, 0, 0, 0, 0) + struct.pack('IIii', 0, 0, 0, 0)
+        return _nla(TCA_U32_SEL, sel) + _nla(TCA_U32_ACT, _nla(1, action))
+    if kind == 'u32' and field in params and 'ht' not in params:
+        network = ipaddress.ip_network(params[field])
+        key = (struct.pack('!II', int(network.netmask), int(network.network_address))
+               + struct.pack('ii', _U32_OFFSETS[field], 0))
+        sel = struct.pack('BBBxHHhhI', TC_U32_TERMINAL, 0, 1, 0, 0, 0, 0, 0) + key
+        return (_nla(TCA_U32_CLASSID, struct.pack('I', _tc_handle(params['classid'])))
+                + _nla(TCA_U32_SEL, sel))
+    if kind == 'flower':
+        network = ipaddress.ip_network(params[field])
+        key_attr = TCA_FLOWER_KEY_IPV4_SRC if field == 'src' else TCA_FLOWER_KEY_IPV4_DST
+        return (_nla(TCA_FLOWER_CLASSID, struct.pack('I', _tc_handle(params['classid'])))
+                + _nla(TCA_FLOWER_KEY_ETH_TYPE, struct.pack('!H', ETH_P_IP))
+                + _nla(key_attr, network.network_address.packed)
+                + _nla(key_attr + 1, network.netmask.packed))
+    raise BackendUnsupported(f"filter kind '{kind}'")
+
+
+class NetlinkBackend:
+    """Talks rtnetlink directly over an AF_NETLINK socket - no fork, no iproute2 needed"""
+
+    name = 'netlink'
+
+    _VERB_FLAGS = {
+        'add': NLM_F_CREATE | NLM_F_EXCL,
+        'replace': NLM_F_CREATE | NLM_F_REPLACE,
+        'change': 0,
+    }
+
+    def __init__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_ROUTE)
+        self.sock.bind((0, 0))
+        try:
+            self.sock.setsockopt(SOL_NETLINK, NETLINK_EXT_ACK, 1)
+        except OSError:
+            pass  # Pre-4.12 kernels: errors come back without the text message
+        self.seq = int(time.time())
+        self.lock = threading.Lock()
+
+    def _encode(self, op):
+        """Turn a TcOp into (msg_type, flags, payload)"""
+        try:
+            ifindex = socket.if_nametoindex(op.dev)
+        except OSError:
+            raise BackendUnsupported(f"unknown device {op.dev}")
+
+        if op.obj == 'qdisc':
+            tcm = _TCMSG.pack(socket.AF_UNSPEC, ifindex, _tc_handle(op.handle), _tc_handle(op.parent), 0)
+            if op.verb == 'del':
+                return RTM_DELQDISC, 0, tcm
+            attrs = _nla(TCA_KIND, op.kind.encode() + b'\0')
+            attrs += _nla(TCA_OPTIONS, _qdisc_options(op.kind, op.params))
+            return RTM_NEWQDISC, self._VERB_FLAGS[op.verb], tcm + attrs
+
+        if op.obj == 'class':
+            tcm = _TCMSG.pack(socket.AF_UNSPEC, ifindex, _tc_handle(op.handle), _tc_handle(op.parent), 0)
+            if op.verb == 'del':
+                return RTM_DELTCLASS, 0, tcm
+            attrs = _nla(TCA_KIND, op.kind.encode() + b'\0')
+            attrs += _nla(TCA_OPTIONS, _class_options(op.kind, op.params))
+            return RTM_NEWTCLASS, self._VERB_FLAGS[op.verb], tcm + attrs
+
+        if op.obj == 'filter':
+            if op.kind == 'u32' and op.handle:
+                raise BackendUnsupported("u32 hash table handles")
+            protocol = ETH_P_ALL if op.params.get('protocol') == 'all' else ETH_P_IP
+            info = (op.params.get('prio', 0) << 16) | socket.htons(protocol)
+            handle = int(op.handle, 0) if op.handle else 0
+            tcm = _TCMSG.pack(socket.AF_UNSPEC, ifindex, handle, _tc_handle(op.parent), info)
+            attrs = _nla(TCA_KIND, op.kind.encode() + b'\0') if op.kind else b''
+            if op.verb == 'del':
+                return RTM_DELTFILTER, 0, tcm + attrs
+            attrs += _nla(TCA_OPTIONS, _filter_options(op.kind, op.params))
+            return RTM_NEWTFILTER, self._VERB_FLAGS[op.verb], tcm + attrs
+
+        raise BackendUnsupported(f"object '{op.obj}'")
+
+    def _send(self, msg_type: int, flags: int, payload: bytes) -> int:
+        self.seq += 1
+        header = _NLMSGHDR.pack(_NLMSGHDR.size + len(payload), msg_type,
+                                flags | NLM_F_REQUEST, self.seq, 0)
+        self.sock.send(header + payload)
+        return self.seq
+
+    def _messages(self):
+        """Yield (type, flags, seq, payload) for every message in the next datagram"""
+        data = self.sock.recv(65536)
+        offset = 0
+        while offset + _NLMSGHDR.size <= len(data):
+            length, msg_type, flags, seq, _ = _NLMSGHDR.unpack_from(data, offset)
+            yield msg_type, flags, seq, data[offset + _NLMSGHDR.size:offset + length]
+            offset += (length + 3) & ~3
+
+    def _ack(self, seq: int):
+        """Wait for the ACK of seq; returns '' on success or an error string"""
+        while True:
+            for msg_type, flags, msg_seq, payload in self._messages():
+                if msg_seq != seq or msg_type != NLMSG_ERROR:
+                    continue
+                error = -struct.unpack_from('i', payload)[0]
+                if not error:
+                    return ''
+                message = os.strerror(error)
+                if flags & NLM_F_ACK_TLVS:
+                    # Original header is echoed back, then the extack TLVs
+                    echoed = _NLMSGHDR.size if flags & NLM_F_CAPPED else _NLMSGHDR.unpack_from(payload, 4)[0]
+                    tlvs = _parse_nla(payload[4 + ((echoed + 3) & ~3):])
+                    if NLMSGERR_ATTR_MSG in tlvs:
+                        message = tlvs[NLMSGERR_ATTR_MSG].rstrip(b'\0').decode() or message
+                return f"RTNETLINK answers: {message}"
+
+    def commit(self, ops, force: bool = False):
+        """Same contract as TcCliBackend.commit: stop at the first error unless force"""
+        # Encode everything up front so an unsupported op costs nothing
+        messages = [self._encode(op) for op in ops]
+        errors = []
+        n_ok = 0
+        with self.lock:
+            for index, (msg_type, flags, payload) in enumerate(messages):
+                error = self._ack(self._send(msg_type, flags | NLM_F_ACK, payload))
+                if error:
+                    errors.append(f"{error} ({ops[index].to_tc()})")
+                    if not force:
+                        return False, errors[0], n_ok
+                elif not errors:
+                    n_ok += 1
+        if errors:
+            return False, '\n'.join(errors), n_ok
+        return True, '', len(ops)
+
+    def _request(self, msg_type: int, flags: int, payload: bytes) -> str:
+        """Send one request and wait for its ACK; returns '' or an error string"""
+        with self.lock:
+            return self._ack(self._send(msg_type, flags | NLM_F_ACK, payload))
+
+    def add_link(self, name: str, kind: str) -> str:
+        """Create an administratively up link of the given kind (e.g. ifb)"""
+        linkinfo = _nla(IFLA_INFO_KIND, kind.encode() + b'\0')
+        payload = (_IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, IFF_UP, IFF_UP)
+                   + _nla(IFLA_IFNAME, name.encode() + b'\0') + _nla(IFLA_LINKINFO, linkinfo))
+        return self._request(RTM_NEWLINK, NLM_F_CREATE | NLM_F_EXCL, payload)
+
+    def set_link_up(self, name: str) -> str:
+        payload = _IFINFOMSG.pack(socket.AF_UNSPEC, 0, socket.if_nametoindex(name), IFF_UP, IFF_UP)
+        return self._request(RTM_NEWLINK, 0, payload)
+
+    def del_link(self, name: str) -> str:
+        payload = _IFINFOMSG.pack(socket.AF_UNSPEC, 0, socket.if_nametoindex(name), 0, 0)
+        return self._request(RTM_DELLINK, 0, payload)
+
+    def _dump(self, msg_type: int, payload: bytes):
+        """Run an NLM_F_DUMP request and collect the payloads of every reply"""
+        replies = []
+        with self.lock:
+            seq = self._send(msg_type, NLM_F_DUMP, payload)
+            while True:
+                for reply_type, _, reply_seq, body in self._messages():
+                    if reply_seq != seq:
+                        continue
+                    if reply_type == NLMSG_DONE:
+                        return replies
+                    if reply_type == NLMSG_ERROR:
+                        error = -struct.unpack_from('i', body)[0]
+                        if error:
+                            raise OSError(error, os.strerror(error))
+                        continue
+                    replies.append(body)
+
+    def root_handle(self, dev: str):
+        """Handle of dev's root qdisc ('0:' for the kernel default)"""
+        ifindex = socket.if_nametoindex(dev)
+        for body in self._dump(RTM_GETQDISC, _TCMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            _, q_ifindex, handle, parent, _ = _TCMSG.unpack_from(body)
+            if q_ifindex == ifindex and parent == TC_H_ROOT:
+                return f"{handle >> 16:x}:"
+        return '0:'
+
+    def qdisc_stats(self, dev: str):
+        """Counters of every qdisc on dev (bytes, packets, drops, overlimits, requeues, backlog, qlen)"""
+        ifindex = socket.if_nametoindex(dev)
+        stats = []
+        for body in self._dump(RTM_GETQDISC, _TCMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            _, q_ifindex, handle, parent, _ = _TCMSG.unpack_from(body)
+            if q_ifindex != ifindex:
+                continue
+            attrs = _parse_nla(body[_TCMSG.size:])
+            stats2 = _parse_nla(attrs.get(TCA_STATS2, b''))
+            sent = struct.unpack_from('QI', stats2[TCA_STATS_BASIC]) if TCA_STATS_BASIC in stats2 else (0, 0)
+            queue = struct.unpack_from('5I', stats2[TCA_STATS_QUEUE]) if TCA_STATS_QUEUE in stats2 else (0,) * 5
+            stats.append({
+                'kind': attrs.get(TCA_KIND, b'').rstrip(b'\0').decode(),
+                'handle': _tc_handle_str(handle),
+                'parent': _tc_handle_str(parent),
+                'bytes': sent[0], 'packets': sent[1],
+                'qlen': queue[0], 'backlog': queue[1], 'drops': queue[2],
+                'requeues': queue[3], 'overlimits': queue[4],
+            })
+        return stats
+
+    def links(self):
+        """Dump every link as a dict: index, name, flags, operstate, master, kind, tx_queues"""
+        links = []
+        for body in self._dump(RTM_GETLINK, _IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)):
+            _, _, index, flags, _ = _IFINFOMSG.unpack_from(body)
+            attrs = _parse_nla(body[_IFINFOMSG.size:])
+            linkinfo = _parse_nla(attrs.get(IFLA_LINKINFO, b''))
+            links.append({
+                'index': index,
+                'name': attrs.get(IFLA_IFNAME, b'').rstrip(b'\0').decode(),
+                'flags': flags,
+                'operstate': attrs.get(IFLA_OPERSTATE, b'\0')[0],
+                'master': struct.unpack('I', attrs[IFLA_MASTER])[0] if IFLA_MASTER in attrs else None,
+                'kind': linkinfo.get(IFLA_INFO_KIND, b'').rstrip(b'\0').decode() or None,
+                'tx_queues': struct.unpack('I', attrs[IFLA_NUM_TX_QUEUES])[0] if IFLA_NUM_TX_QUEUES in attrs else 1,
+            })
+        return links
+
+    def default_route_dev(self):
+        """Name of the device carrying the IPv4 default route with the best metric"""
+        best = None
+        for body in self._dump(RTM_GETROUTE, _RTMSG.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0, 0, 0)):
+            _, dst_len, _, _, table, _, _, rt_type, _ = _RTMSG.unpack_from(body)
+            attrs = _parse_nla(body[_RTMSG.size:])
+            if RTA_TABLE in attrs:
+                table = struct.unpack('I', attrs[RTA_TABLE])[0]
+            if dst_len != 0 or table != RT_TABLE_MAIN or rt_type != RTN_UNICAST or RTA_OIF not in attrs:
+                continue
+            metric = struct.unpack('I', attrs[RTA_PRIORITY])[0] if RTA_PRIORITY in attrs else 0
+            if best is None or metric < best[0]:
+                best = (metric, struct.unpack('I', attrs[RTA_OIF])[0])
+        return socket.if_indextoname(best[1]) if best else None
 
 
 class NetworkRuckus:
     """Main class for managing network chaos on Ubuntu Server using tc (traffic control)"""
 
-    def __init__(self, interface: Optional[str] = None, deadman_timeout: int = 5):
-        self.interface = interface
+    def __init__(self, interface: Optional[str] = None, deadman_timeout: int = 5,
+                 backend: str = 'auto', journal_path: Optional[str] = None):
+        self.interface = interface  # primary interface (first of the set)
+        self.interface_specs = []   # names, globs or 'all' - empty means just self.interface
+        self.apply_deadline = 10.0  # seconds every interface in the set gets to switch chambers
+        self._managed = set()       # interfaces we have committed a chamber to
+        self._applied_devices = []  # interface set resolved by the last commit
         self.current_chamber = ChaosChamber.PEACE
         self.is_active = False
         self.deadman = DeadmanSwitch(deadman_timeout, self._emergency_stop)
-        self.target_ip = None
+        self.deadman.failsafe = FailsafeTimer()
+        # The deadman clears from its own thread while runners commit from ours - one commit
+        # at a time, and once it has fired no runner tick may put chaos back
+        self._lock = threading.RLock()
+        self.halted = False
+        self.socket_path = None     # daemon socket the failsafe's --restore should try first
+        self.targets = []  # ipaddress.IPv4Network list for targeted scope
+        self.classifier = 'auto'  # 'flower', 'u32' (hashed), or 'auto' (flower, u32 fallback)
         self.scope = 'local'  # 'local', 'network', or 'targeted'
         self.gateway_configured = False
         self.ssh_client_ip = self._detect_ssh_client_ip()
         self.management_whitelist = [self.ssh_client_ip] if self.ssh_client_ip else []
         self.ssh_protection_enabled = True
+        # Per-interface record of the tc ops we last committed.
+        # Missing key = not probed yet, None = unknown root qdisc left by someone else.
+        self._installed = {}
+        self._filter_handles = {}   # target network -> stable flower filter handle
+        self._target_drops = []     # targets we installed iptables DROP rules for
+        self.journal = StateJournal(journal_path)  # every kernel object we create, fsync'd before it exists
+        self.journal.load()
+        self.profile_map = {}       # target network -> chamber it runs in 'profiles' scope
+        self.multiqueue = False     # keep mq as root with a chain per TX queue
+        self.ingress = False        # also impair downloads through an IFB device
+        self.downlink_chamber = None  # chamber for the IFB side (None = same as uplink)
+        self._profile_slots = {}    # chamber name -> stable HTB class slot
+        self.netem_memory_budget = 256 * 1024 * 1024  # cap on worst-case bytes queued in netem per device
+        self._tx_samples = {}       # dev -> (monotonic time, tx_bytes, rate) for the observed rate
+        self._queue_costs = {}      # dev -> (packets, worst-case bytes, netem qdiscs) of the last plan
+        self._plans = OrderedDict()  # _plan_key -> CompiledPlan, least recently used first
+        self._plans_lock = threading.Lock()
+        self._link_fact_cache = {}  # dev -> (monotonic time, _link_facts)
+        self._targets_memo = (None, 0, ())
+        self.plan_hits = 0
+        self.plan_misses = 0
+        self.quiet = False          # suppress per-commit chatter (sweeps update 100x a second)
+        self.tc_cli = TcCliBackend() if shutil.which("tc") else None
+        self.netlink = None
+        if backend in ('auto', 'netlink'):
+            try:
+                self.netlink = NetlinkBackend()
+            except OSError as e:
+                if backend == 'netlink':
+                    raise
+                print(f"⚠️  rtnetlink unavailable ({e}), falling back to the tc CLI")
+        elif backend != 'tc':
+            raise ValueError(f"Unknown backend: {backend}")
+        if backend == 'tc' and not self.tc_cli:
+            raise RuntimeError("tc backend requested but the tc binary was not found")
 
     def _detect_ssh_client_ip(self):
         """Detect the IP address of the SSH client for protection"""
@@ -242,6 +1451,18 @@ class NetworkRuckus:
 
     def detect_interface(self):
         """Auto-detect the primary network interface"""
+        if self.netlink:
+            # Route and link dumps straight from the kernel - no ip(8) fork
+            try:
+                interface = self.netlink.default_route_dev()
+                if interface:
+                    return interface
+                for link in self.netlink.links():
+                    if link['flags'] & IFF_UP and not link['flags'] & IFF_LOOPBACK:
+                        return link['name']
+            except OSError:
+                pass
+
         try:
             # Try to get the default route interface
             result = subprocess.run(
@@ -272,17 +1493,136 @@ class NetworkRuckus:
 
         return "eth0"  # Final fallback
 
+    def _list_links(self):
+        """Every link as a dict with name, flags, master and kind (kind may be None)"""
+        if self.netlink:
+            try:
+                return self.netlink.links()
+            except OSError:
+                pass
+        links = []
+        for name in sorted(os.listdir('/sys/class/net')):
+            try:
+                with open(f'/sys/class/net/{name}/flags') as f:
+                    flags = int(f.read(), 16)
+            except (OSError, ValueError):
+                continue
+            master = os.path.realpath(f'/sys/class/net/{name}/master')
+            links.append({'name': name, 'flags': flags,
+                          'master': os.path.basename(master) if os.path.exists(master) else None,
+                          'kind': 'ifb' if name.startswith('ifb') else None})
+        return links
+
+    def _resolve_interfaces(self, specs):
+        """Expand interface names, globs (eth*) and 'all' into a list of device names.
+
+        'all' is every UP non-loopback link that isn't enslaved to a bond or
+        bridge (the master carries the traffic) and isn't an IFB; bond
+        members can still be named or globbed explicitly.
+        """
+        links = self._list_links()
+        names = [link['name'] for link in links]
+        devices = []
+        for spec in specs:
+            if spec == 'all':
+                matches = [link['name'] for link in links
+                           if link['flags'] & IFF_UP and not link['flags'] & IFF_LOOPBACK
+                           and link['master'] is None and link['kind'] != 'ifb']
+            elif any(c in spec for c in '*?['):
+                matches = fnmatch.filter(names, spec)
+            else:
+                matches = [spec]
+            devices += [name for name in matches if name not in devices]
+        return devices
+
+    def set_interfaces(self, specs):
+        """Apply chambers to an interface set: names, globs, or 'all' (comma/space separated)"""
+        if isinstance(specs, str):
+            specs = specs.replace(',', ' ').split()
+        devices = self._resolve_interfaces(specs)
+        if not devices:
+            print(f"❌ No interface matches {' '.join(specs)}")
+            return False
+
+        # Interfaces leaving the set must not keep the chamber
+        stale = sorted(self._managed - set(devices))
+        if stale:
+            with self._lock:
+                self._run_per_device(self._clear_device, stale)
+                self._managed -= set(stale)
+
+        self.interface_specs = list(specs)
+        self.interface = devices[0]
+        print(f"🔧 Interface set to: {', '.join(devices)}")
+        return True
+
+    def _devices(self):
+        """The interface set chambers apply to, resolved now (links come and go)"""
+        if self.interface_specs:
+            devices = self._resolve_interfaces(self.interface_specs)
+            if devices:
+                self.interface = devices[0]
+                return devices
+        if not self.interface:
+            self.interface = self.detect_interface()
+        return [self.interface]
+
+    def _run_per_device(self, fn, devices, *args):
+        """Run fn(*args, dev) for every device concurrently against one shared deadline.
+
+        Returns {dev: (result, elapsed_ms)}; result is None for a device that
+        missed the deadline (its thread still finishes in the background).
+        """
+        def timed(dev):
+            start = time.monotonic()
+            return fn(*args, dev), (time.monotonic() - start) * 1000
+
+        if len(devices) == 1:
+            return {devices[0]: timed(devices[0])}
+
+        deadline = time.monotonic() + self.apply_deadline
+        pool = ThreadPoolExecutor(max_workers=len(devices), thread_name_prefix='ruckus')
+        futures = {dev: pool.submit(timed, dev) for dev in devices}
+        wait(futures.values(), timeout=max(0.0, deadline - time.monotonic()))
+        pool.shutdown(wait=False)
+
+        results = {}
+        for dev, future in futures.items():
+            if not future.done():
+                results[dev] = (None, self.apply_deadline * 1000)
+            elif future.exception():
+                print(f"   ❌ {dev}: {future.exception()}", file=sys.stderr)
+                results[dev] = (False, 0.0)
+            else:
+                results[dev] = future.result()
+        return results
+
     def set_target(self, ip: str):
         """Set specific target IP for disruption"""
-        self.target_ip = ip
+        return self.set_targets([ip])
+
+    def set_targets(self, specs):
+        """Set the target IPs/CIDRs for disruption (files of targets are accepted too)"""
+        try:
+            targets = _parse_targets(specs)
+        except (OSError, ValueError) as e:
+            print(f"❌ Invalid target: {e}")
+            return False
+        if not targets:
+            print("❌ No targets given")
+            return False
+
+        self.targets = targets
         self.scope = 'targeted'
-        print(f"🎯 Target set to: {ip}")
-        print("   Chaos will only affect traffic to/from this IP")
+        preview = ', '.join(str(t) for t in targets[:3]) + (' ...' if len(targets) > 3 else '')
+        print(f"🎯 Targets set to {len(targets)} address block(s): {preview}")
+        print("   Chaos will only affect traffic to/from these addresses")
+        return True
 
-    def set_scope(self, scope: str):
-        """Set the scope of network disruption"""
-        if scope not in ['local', 'network', 'targeted']:
-            print("❌ Invalid scope. Use 'local', 'network', or 'targeted'")
+    def set_scope(self, scope: str, enable_forwarding: Optional[bool] = None):
+        """Set the scope of network disruption (enable_forwarding answers the gateway prompt up front)"""
+        if scope not in ['local', 'network', 'targeted', 'profiles']:
+            print("❌ Invalid scope. Use 'local', 'network', 'targeted', or 'profiles'")
             return False
 
         self.scope = scope
@@ -296,14 +1636,18 @@ class NetworkRuckus:
                 )
                 if "net.ipv4.ip_forward = 0" in result.stdout:
                     print("\n⚠️  IP forwarding is disabled. Network-wide chaos requires this server to act as a gateway.")
-                    response = input("Enable IP forwarding now? (Y/N): ").strip().upper()
-                    if response == 'Y' or response == 'YES':
+                    if enable_forwarding is None:
+                        response = input("Enable IP forwarding now? (Y/N): ").strip().upper()
+                        enable_forwarding = response == 'Y' or response == 'YES'
+                    if enable_forwarding:
+                        # Journaled first so --restore puts the host back the way it was
+                        if 'net.ipv4.ip_forward' not in self.journal.entries['sysctl']:
+                            self.journal.add('sysctl', 'net.ipv4.ip_forward', '0')
                         subprocess.run(["sysctl", "-w", "net.ipv4.ip_forward=1"], check=True)
                         # Set up NAT
-                        subprocess.run(
-                            f"iptables -t nat -A POSTROUTING -o {self.interface} -j MASQUERADE",
-                            shell=True, check=True
-                        )
+                        if not self._install_rules([f"POSTROUTING -o {self.interface} -j MASQUERADE"],
+                                                   table='nat'):
+                            raise RuntimeError("could not add the MASQUERADE rule")
                         self.gateway_configured = True
                         print("✅ IP forwarding enabled. This server is now acting as a gateway.")
                         print("   Configure devices to use this server's IP as their gateway.")
@@ -319,243 +1663,1955 @@ class NetworkRuckus:
                 self.scope = 'local'
                 return False
 
-        scope_names = {
-            'local': '🖥️  Local Device Only',
-            'network': '🌐 Entire Network (Gateway Mode)',
-            'targeted': '🎯 Targeted IP'
-        }
-        print(f"\n📍 Scope set to: {scope_names[scope]}")
-        return True
+        scope_names = {
+            'local': '🖥️  Local Device Only',
+            'network': '🌐 Entire Network (Gateway Mode)',
+            'targeted': '🎯 Targeted IP',
+            'profiles': '🧩 Per-Target Profiles'
+        }
+        print(f"\n📍 Scope set to: {scope_names[scope]}")
+        return True
+
+    def _netem_params(self, level: Dict, dev: Optional[str] = None, rate_kbps: Optional[int] = None):
+        """netem parameters for a chamber ({} when it adds no delay or loss).
+
+        With a rate the queue limit is sized to the bandwidth-delay product,
+        so netem's default 1000 packets can't tail-drop on top of the
+        configured loss once delay x throughput outgrows it.
+        """
+        netem = {}
+        if level['latency_ms'] > 0:
+            netem['delay_ms'] = level['latency_ms']
+            netem['jitter_ms'] = level['jitter_ms']
+            if level.get('delay_dist'):
+                netem['dist'] = level['delay_dist']
+                netem['dist_dir'] = level.get('dist_dir') or _dist_cache_dir()
+            if dev and rate_kbps:
+                netem['limit'] = self._bdp_limit(dev, rate_kbps, level['latency_ms'] + level['jitter_ms'])
+        if level['packet_loss_pct'] > 0:
+            netem['loss_pct'] = level['packet_loss_pct']
+        return netem
+
+    def _observed_rate_kbps(self, dev: str) -> Optional[int]:
+        """Egress rate of dev since the previous sample (None until two samples 0.5s+ apart)"""
+        now = time.monotonic()
+        previous = self._tx_samples.get(dev)
+        if previous and now - previous[0] < 0.5:
+            return previous[2]
+        tx = _tx_bytes(dev)
+        if tx is None:
+            return None
+        rate = None
+        if previous and tx >= previous[1]:
+            rate = int((tx - previous[1]) * 8 / 1000 / (now - previous[0]))
+        self._tx_samples[dev] = (now, tx, rate)
+        return rate
+
+    def _carried_rate_kbps(self, dev: str) -> int:
+        """What dev's link carries: twice the observed egress rate, capped at the link speed.
+
+        Twice leaves room for the traffic to grow mid-test. The rate is
+        rounded up to a power of two so plans stay cacheable while it drifts.
+        """
+        link_kbps = _link_speed_kbps(dev)
+        observed = self._observed_rate_kbps(dev)
+        if observed is None:
+            return link_kbps
+        return min(link_kbps, 1 << (max(2 * observed, 10_000) - 1).bit_length())
+
+    def _path_rate_kbps(self, dev: str, level: Dict) -> int:
+        """Rate the netem queue has to absorb: the chamber's shaper, else what the link carries"""
+        if level['bandwidth_kbps'] and level['bandwidth_kbps'] > 0:
+            return level['bandwidth_kbps']
+        return self._carried_rate_kbps(dev)
+
+    def _bdp_limit(self, dev: str, rate_kbps: int, delay_ms: float) -> int:
+        """netem limit in packets holding rate x delay of full-size frames"""
+        frame = _link_mtu(dev) + 14
+        bdp_packets = int(rate_kbps * 1000 / 8 * delay_ms / 1000 / frame * 1.25) + 1
+        # Never below netem's own default, never past the memory budget
+        ceiling = max(1000, self.netem_memory_budget // (frame + _SKB_OVERHEAD))
+        return min(max(bdp_packets, 1000), ceiling)
+
+    def _queue_cost(self, dev: str, ops):
+        """(packets, worst-case bytes, netem qdiscs) the netem queues in a plan can pin"""
+        limits = [op.params['limit'] for op in ops if op.kind == 'netem' and 'limit' in op.params]
+        frame = _link_mtu(dev) + 14
+        return (sum(limits), sum(limits) * (frame + _SKB_OVERHEAD), len(limits))
+
+    PLAN_CACHE_SIZE = 64
+
+    def _plan_key(self, level: ChamberProfile, dev: str, ingress: bool):
+        """Everything a compiled plan depends on - the same key always compiles to the same ops"""
+        targeted = self.scope == 'targeted' and self.targets
+        profiles = self.scope == 'profiles' and self.profile_map
+        # The chamber's label never reaches the kernel - a renamed step or sweep value reuses the plan
+        return (level.impairment, dev, ingress, self.scope,
+                self._targets_key() if targeted else (),
+                tuple((str(network), chamber) for network, chamber in self.profile_map.items()) if profiles else (),
+                self.classifier, self.multiqueue, self.netem_memory_budget,
+                self._link_facts(dev), self._carried_rate_kbps(dev))
+
+    def _targets_key(self):
+        """The target list as a tuple of strings (their hashes are cached), rebuilt only when the list changes"""
+        targets, length, key = self._targets_memo
+        if targets is not self.targets or length != len(self.targets):
+            key = tuple(str(target) for target in self.targets)
+            self._targets_memo = (self.targets, len(self.targets), key)
+        return key
+
+    def _link_facts(self, dev: str):
+        """(MTU, TX queues, link speed) of dev - plan inputs, re-read from sysfs at most once a second"""
+        now = time.monotonic()
+        cached = self._link_fact_cache.get(dev)
+        if cached and now - cached[0] < 1.0:
+            return cached[1]
+        facts = (_link_mtu(dev), _tx_queue_count(dev), _link_speed_kbps(dev))
+        self._link_fact_cache[dev] = (now, facts)
+        return facts
+
+    def plan(self, level: Dict, dev: Optional[str] = None, ingress: bool = False) -> CompiledPlan:
+        """The compiled plan for level on dev, from the LRU cache when nothing it depends on moved"""
+        dev = dev or self.interface
+        level = ChamberProfile.of(level)
+        key = self._plan_key(level, dev, ingress)
+        with self._plans_lock:
+            plan = self._plans.get(key)
+            if plan is not None:
+                self._plans.move_to_end(key)
+                self.plan_hits += 1
+                return plan
+        start = time.perf_counter()
+        ops = self._build_plan(level, dev, ingress)
+        plan = CompiledPlan(ops, self._queue_cost(dev, ops), (time.perf_counter() - start) * 1000)
+        with self._plans_lock:
+            self._plans[key] = plan
+            if len(self._plans) > self.PLAN_CACHE_SIZE:
+                self._plans.popitem(last=False)
+            self.plan_misses += 1
+        return plan
+
+    def _compile_plan(self, level: Dict, dev: Optional[str] = None, ingress: bool = False):
+        """The ops to install on dev (self.interface) for a chamber - compiled once, then cached"""
+        dev = dev or self.interface
+        plan = self.plan(level, dev, ingress)
+        self._queue_costs[dev] = plan.queue_cost
+        return list(plan.ops)
+
+    def _build_plan(self, level: ChamberProfile, dev: str, ingress: bool = False):
+        """Compile a chamber into the full list of tc ops to install on dev.
+
+        With ingress set the plan is for the IFB side: downloads come from
+        the targets, so the classifiers match on source address.
+        """
+        field = 'src' if ingress else 'dst'
+        targeted = self.scope == 'targeted' and self.targets
+
+        if self.scope == 'profiles' and self.profile_map:
+            return self._compile_profiles(dev, level, field)
+
+        if level == ChaosChamber.PEACE:
+            return []
+
+        if level['packet_loss_pct'] == 100:
+            # Targeted outages are handled by iptables, not tc
+            if targeted:
+                return []
+            return [TcOp('add', 'qdisc', dev, handle='1:', kind='netem', params={'loss_pct': 100})]
+
+        queues = self._queue_split(dev)
+        if queues > 1:
+            return self._compile_multiqueue(dev, level, queues)
+
+        netem = self._netem_params(level, dev, self._path_rate_kbps(dev, level))
+
+        # The impairment chain: netem first, the rate shaper hung underneath it
+        chain = []
+        if netem:
+            chain.append(('netem', netem))
+        if level['bandwidth_kbps'] and level['bandwidth_kbps'] > 0:
+            chain.append(('tbf', self._shaper_params(dev, level['bandwidth_kbps'], level['jitter_ms'])))
+        if not chain:
+            return []
+
+        ops = []
+        parent, major = 'root', 1
+        if targeted:
+            # Targeted traffic is steered into a 4th prio band that the default
+            # priomap never uses, so unclassified (e.g. interactive SSH) traffic
+            # can't land on the chain by TOS
+            ops.append(TcOp('add', 'qdisc', dev, handle='1:', kind='prio', params={'bands': 4}))
+            parent, major = '1:4', 0x10
+        for kind, params in chain:
+            ops.append(TcOp('add', 'qdisc', dev, parent=parent, handle=f"{major:x}:", kind=kind, params=params))
+            parent, major = f"{major:x}:1", (major + 0x10) & ~0xf
+        if targeted:
+            ops += self._classifier_ops(dev, '1:', {target: '1:4' for target in self.targets}, field)
+        return ops
+
+    def _queue_split(self, dev: str) -> int:
+        """How many TX queues the chain is replicated over (1 = single root chain)"""
+        classified = (self.scope == 'targeted' and self.targets) or (self.scope == 'profiles' and self.profile_map)
+        if not self.multiqueue or classified:
+            return 1
+        return _tx_queue_count(dev)
+
+    def _compile_multiqueue(self, dev: str, level: Dict, queues: int):
+        """Keep mq as root and hang an identical netem -> tbf chain off every TX queue.
+
+        Each queue gets its own qdisc lock, so impairment scales across cores
+        instead of funnelling every CPU through one root netem. The rate is
+        split evenly, so the aggregate matches the chamber - a single flow
+        stays on one queue and only gets its share.
+        """
+        ops = [TcOp('add', 'qdisc', dev, handle='1:', kind='mq')]
+        netem = self._netem_params(level, dev, max(self._path_rate_kbps(dev, level) // queues, 8))
+        shaper = None
+        if level['bandwidth_kbps'] and level['bandwidth_kbps'] > 0:
+            shaper = self._shaper_params(dev, max(level['bandwidth_kbps'] // queues, 8), level['jitter_ms'])
+        for queue in range(1, queues + 1):
+            parent = f"1:{queue:x}"
+            if netem:
+                ops.append(TcOp('add', 'qdisc', dev, parent=parent, handle=f"{0x1000 + queue:x}:",
+                                kind='netem', params=netem))
+                parent = f"{0x1000 + queue:x}:1"
+            if shaper:
+                ops.append(TcOp('add', 'qdisc', dev, parent=parent, handle=f"{0x2000 + queue:x}:",
+                                kind='tbf', params=shaper))
+        return ops
+
+    def _ifb_name(self, dev: str) -> str:
+        """Name of the IFB device carrying dev's downloads"""
+        name = f"ifb-{dev}"
+        if len(name) > 15:
+            # IFNAMSIZ - fall back to the ifindex so long names can't collide
+            try:
+                return f"ifb-ruckus{socket.if_nametoindex(dev)}"
+            except OSError:
+                return name[:15]
+        return name
+
+    def _ingress_ops(self, dev: str, ifb: str):
+        """clsact hook on dev redirecting every received packet to ifb's egress"""
+        return [TcOp('add', 'qdisc', dev, parent='clsact', handle='ffff:', kind='clsact'),
+                TcOp('add', 'filter', dev, parent='ffff:fff2', kind='u32',
+                     params={'protocol': 'all', 'prio': 1, 'redirect': ifb})]
+
+    def _link_batch(self, lines):
+        """Run `ip -batch` lines in one fork (link management without rtnetlink)"""
+        result = subprocess.run(["ip", "-batch", "-"], input='\n'.join(lines) + '\n',
+                                capture_output=True, text=True)
+        return '' if result.returncode == 0 else result.stderr.strip()
+
+    def _ensure_ifb(self, name: str) -> bool:
+        """Create (or bring up) the IFB device ingress traffic is redirected to"""
+        exists = os.path.isdir(f'/sys/class/net/{name}')
+        if not exists:
+            self.journal.add('ifb', name)
+        if self.netlink:
+            err = self.netlink.set_link_up(name) if exists else self.netlink.add_link(name, 'ifb')
+        elif exists:
+            err = self._link_batch([f"link set {name} up"])
+        else:
+            err = self._link_batch([f"link add name {name} type ifb", f"link set {name} up"])
+        if err:
+            print(f"   ❌ Could not set up {name}: {err}", file=sys.stderr)
+            if not os.path.isdir(f'/sys/class/net/{name}'):
+                self.journal.discard('ifb', name)
+            return False
+        if not exists:
+            self._installed[name] = ()
+            print(f"   🔀 Created {name} for ingress impairment")
+        return True
+
+    def _remove_ifb(self, name: str):
+        """Delete the IFB device (its qdiscs go with it)"""
+        if not os.path.isdir(f'/sys/class/net/{name}'):
+            self.journal.discard('ifb', name)
+            return
+        err = self.netlink.del_link(name) if self.netlink else self._link_batch([f"link del {name}"])
+        if err:
+            print(f"   ⚠️  Could not remove {name}: {err}", file=sys.stderr)
+        else:
+            self._installed.pop(name, None)
+            self.journal.discard('ifb', name)
+            self.journal.discard('tc', name)
+
+    def _profile_slot(self, level: Dict) -> int:
+        """Stable HTB class slot for a chamber, so its class id never moves"""
+        if level['name'] not in self._profile_slots:
+            self._profile_slots[level['name']] = len(self._profile_slots) + 1
+        return self._profile_slots[level['name']]
+
+    def _htb_class_params(self, dev: str, rate_kbps: int, ceil_kbps: int):
+        """HTB class rate/ceil with burst and quantum sized like the tbf shaper"""
+        frame = _link_mtu(dev) + 14
+        rate_bytes = rate_kbps * 1000 // 8
+        return {'rate_kbps': rate_kbps, 'ceil_kbps': ceil_kbps,
+                'burst': max(2 * frame, ceil_kbps * 1000 // 8 // 250),
+                'quantum': min(max(frame, rate_bytes // 10), 200000)}
+
+    def _compile_profiles(self, dev: str, default_level: Dict, field: str = 'dst'):
+        """One HTB tree carrying a class + netem leaf per chamber in use.
+
+        Class 1:1 is everything else (default_level), each chamber assigned
+        to targets gets class 1:<0x10 + slot> and flower/u32 filters steer
+        the targets into it. Slots are stable, so moving a target between
+        chambers that are already in the tree only replaces its filter.
+        """
+        link_kbps = _link_speed_kbps(dev)
+        ops = [TcOp('add', 'qdisc', dev, handle='1:', kind='htb', params={'default': 1})]
+
+        levels = {(1, '1:1'): default_level}
+        for level in self.profile_map.values():
+            slot = 0x10 + self._profile_slot(level)
+            levels[(slot, f"1:{slot:x}")] = level
+
+        for (slot, classid), level in sorted(levels.items()):
+            rate = level['bandwidth_kbps'] if level['bandwidth_kbps'] else link_kbps
+            ops.append(TcOp('add', 'class', dev, parent='1:', handle=classid, kind='htb',
+                            params=self._htb_class_params(dev, rate, rate)))
+            netem = self._netem_params(level, dev, rate)
+            if netem:
+                ops.append(TcOp('add', 'qdisc', dev, parent=classid, handle=f"{0x100 + slot:x}:",
+                                kind='netem', params=netem))
+
+        class_map = {network: f"1:{0x10 + self._profile_slot(level):x}"
+                     for network, level in self.profile_map.items()}
+        return ops + self._classifier_ops(dev, '1:', class_map, field)
+
+    def assign_profile(self, specs, level: Dict):
+        """Run level on the given targets ('profiles' scope); Peace releases them"""
+        try:
+            targets = _parse_targets(specs)
+        except (OSError, ValueError) as e:
+            print(f"❌ Invalid target: {e}")
+            return False
+        for network in targets:
+            if level == ChaosChamber.PEACE:
+                self.profile_map.pop(network, None)
+            else:
+                self.profile_map[network] = ChamberProfile.of(level)
+        self.scope = 'profiles'
+        verb = 'released from profiles' if level == ChaosChamber.PEACE else f"→ {level['name']}"
+        print(f"🧩 {len(targets)} target block(s) {verb}")
+
+        # Everything else keeps running the current chamber
+        return self.apply_ruckus(self.current_chamber)
+
+    def _filter_handle(self, network):
+        """Stable filter handle for a target, so it can be replaced or deleted on its own"""
+        if network not in self._filter_handles:
+            self._filter_handles[network] = len(self._filter_handles) + 1
+        return str(self._filter_handles[network])
+
+    def _classifier_ops(self, dev: str, parent: str, class_map: Dict, field: str = 'dst'):
+        """Filters steering each target network to its class in constant time.
+
+        flower keeps one hash table per mask, so every prefix length gets its
+        own prio (longest first, stable as the target set changes). Without
+        cls_flower the fallback is a 256-bucket u32 hash on the last octet -
+        wide CIDRs stay linear.
+        """
+        ops = []
+        if self.classifier != 'u32':
+            for network, classid in class_map.items():
+                ops.append(TcOp('add', 'filter', dev, parent=parent, handle=self._filter_handle(network),
+                                kind='flower', params={'prio': 33 - network.prefixlen,
+                                                       field: str(network), 'classid': classid}))
+            return ops
+
+        hashed = {network: classid for network, classid in class_map.items() if network.prefixlen >= 24}
+        if hashed:
+            ops.append(TcOp('add', 'filter', dev, parent=parent, handle='2:', kind='u32',
+                            params={'prio': 1, 'divisor': 256}))
+            ops.append(TcOp('add', 'filter', dev, parent=parent, kind='u32',
+                            params={'prio': 1, 'field': field, 'link': '2:'}))
+            for network, classid in sorted(hashed.items()):
+                first = int(network.network_address) & 0xff
+                for bucket in range(first, first + network.num_addresses):
+                    ops.append(TcOp('add', 'filter', dev, parent=parent, kind='u32',
+                                    params={'prio': 1, 'ht': f"2:{bucket:x}:", field: str(network),
+                                            'classid': classid}))
+        for network, classid in sorted(class_map.items()):
+            if network.prefixlen < 24:
+                ops.append(TcOp('add', 'filter', dev, parent=parent, kind='u32',
+                                params={'prio': 2, field: str(network), 'classid': classid}))
+        return ops
+
+    def _shaper_params(self, dev: str, rate_kbps: int, jitter_ms: float = 0):
+        """tbf parameters with burst and queue limit sized from the configured rate"""
+        frame = _link_mtu(dev) + 14
+        rate_bytes = rate_kbps * 1000 // 8
+        # The bucket must refill a whole timer tick (HZ=250 on stock Ubuntu/L4T
+        # kernels) or tbf undershoots the configured rate
+        burst = max(2 * frame, rate_bytes // 250)
+        # ~100ms of link buffer on top of the burst, plus the bytes netem's
+        # jitter can release at once, never less than a few frames
+        limit = max(burst + int(rate_bytes * (100 + jitter_ms) / 1000), 4 * frame)
+        return {'rate_kbps': rate_kbps, 'burst': burst, 'limit': limit}
+
+    def _probe_root_qdisc(self, dev: str):
+        """Find out whether dev has a non-default root qdisc we need to delete first"""
+        if self.netlink:
+            try:
+                handle = self.netlink.root_handle(dev)
+            except OSError:
+                handle = self.tc_cli.root_handle(dev) if self.tc_cli else '0:'
+        else:
+            handle = self.tc_cli.root_handle(dev)
+        # Default roots (pfifo_fast, mq, noqueue, ...) carry handle 0: and can't be deleted
+        self._installed[dev] = None if handle != '0:' else ()
+
+    def _removal_ops(self, ops):
+        """Ops deleting the root and clsact hooks a plan installs (everything hangs off them)"""
+        return [op.as_verb('del') for op in ops if op.obj == 'qdisc' and op.parent in ('root', 'clsact')]
+
+    def _teardown_ops(self, dev: str):
+        """Ops that remove whatever we (or a previous run) left on dev"""
+        if dev not in self._installed:
+            self._probe_root_qdisc(dev)
+        installed = self._installed[dev]
+        if installed is None:
+            return [TcOp('del', 'qdisc', dev)]
+        return self._removal_ops(installed)
+
+    def _push(self, ops, force: bool = False):
+        """Send ops through rtnetlink when it can express them, else through `tc -batch`"""
+        if self.netlink:
+            try:
+                return self.netlink.commit(ops, force)
+            except BackendUnsupported as e:
+                if not self.tc_cli:
+                    return False, f"rtnetlink backend cannot express {e} and tc is not installed", 0
+        return self.tc_cli.commit(ops, force)
+
+    def _diff_plan(self, installed, ops):
+        """In-place transition from installed to ops, or None if the tree shape differs.
+
+        When both plans share the same root, qdiscs and classes whose
+        parameters moved only need a `change` - queued packets survive and
+        there is no unimpaired window between chambers. HTB classes and the
+        leaf qdiscs hanging off them come and go one by one, as do filters
+        with stable handles, so retargeting touches only what changed.
+        Returns (forward, backward) op pairs; the backward op undoes the
+        forward one.
+        """
+        if installed is None:
+            return None
+        if not installed and not ops:
+            return []
+        old_nodes = [op for op in installed if op.obj != 'filter']
+        new_nodes = [op for op in ops if op.obj != 'filter']
+        # The root and clsact hooks pin the tree - those must match exactly
+        old_tops = [op.shape() for op in old_nodes if op.parent in ('root', 'clsact')]
+        new_tops = [op.shape() for op in new_nodes if op.parent in ('root', 'clsact')]
+        if not old_tops or old_tops != new_tops:
+            return None
+
+        # A qdisc may only appear or vanish under a class - anywhere else the
+        # kernel grafts noop in its place and the chamber becomes a black hole
+        classids = {op.handle for op in old_nodes + new_nodes if op.obj == 'class'}
+
+        def detachable(op):
+            return op.handle and (op.obj == 'class' or op.parent in classids)
+
+        old_by_shape = {op.shape(): op for op in old_nodes}
+        new_by_shape = {op.shape(): op for op in new_nodes}
+        if len(old_by_shape) != len(old_nodes) or len(new_by_shape) != len(new_nodes):
+            return None
+        removed = [op for key, op in old_by_shape.items() if key not in new_by_shape]
+        added = [op for key, op in new_by_shape.items() if key not in old_by_shape]
+        if not all(detachable(op) for op in removed + added):
+            return None
+        if {(op.obj, op.handle) for op in removed} & {(op.obj, op.handle) for op in added}:
+            return None     # same handle, different kind or parent
+
+        node_adds = [(op.as_verb('add'), op.as_verb('del')) for op in added]
+        changes = []
+        for key, new in new_by_shape.items():
+            old = old_by_shape.get(key)
+            if old is not None and old.params != new.params:
+                changes.append((new.as_verb('change'), old.as_verb('change')))
+
+        filter_dels, filter_adds, filter_replaces = [], [], []
+        old_filters = {op.shape(): op for op in installed if op.obj == 'filter'}
+        new_filters = {op.shape(): op for op in ops if op.obj == 'filter'}
+        for key in old_filters.keys() - new_filters.keys():
+            old = old_filters[key]
+            if not old.handle:
+                return None
+            filter_dels.append((old.as_verb('del'), old.as_verb('add')))
+        for key, new in new_filters.items():
+            old = old_filters.get(key)
+            if old is None:
+                if not new.handle:
+                    return None
+                filter_adds.append((new.as_verb('add'), new.as_verb('del')))
+            elif old.params != new.params:
+                filter_replaces.append((new.as_verb('replace'), old.as_verb('replace')))
+
+        # Filters go before the classes they point at, leaves before their classes
+        node_dels = ([(op.as_verb('del'), op.as_verb('add')) for op in reversed(removed) if op.obj == 'qdisc']
+                     + [(op.as_verb('del'), op.as_verb('add')) for op in reversed(removed) if op.obj == 'class'])
+        return node_adds + changes + filter_dels + filter_adds + filter_replaces + node_dels
+
+    def _commit_plan(self, dev: str, ops):
+        """Move dev's qdisc tree to ops - in place when possible - rolling back on any error"""
+        teardown = self._teardown_ops(dev)
+        previous = self._installed[dev]
+        ops = list(ops)
+
+        pairs = self._diff_plan(previous, ops)
+        batch = [forward for forward, _ in pairs] if pairs is not None else teardown + ops
+
+        # Write-ahead: both trees' hooks are journaled until we know which one survived
+        self._journal_hooks(dev, list(previous or ()) + ops)
+        start = time.monotonic()
+        ok, err, n_ok = self._push(batch)
+        elapsed_ms = (time.monotonic() - start) * 1000
+
+        if ok:
+            self._installed[dev] = tuple(ops)
+            self._journal_hooks(dev, ops)
+            if pairs is None:
+                print(f"   ⚡ Rebuilt {dev} with {len(batch)} ops in {elapsed_ms:.1f}ms")
+            elif pairs and not self.quiet:
+                print(f"   ⚡ Updated {len(batch)} qdisc/class/filter(s) in place on {dev} in {elapsed_ms:.1f}ms")
+            return True
+
+        print(f"   ❌ Commit failed on {dev}: {err}", file=sys.stderr)
+
+        if pairs is not None:
+            # Same tree, some ops already landed - undo exactly those, newest first
+            applied = pairs if n_ok is None else pairs[:n_ok]
+            rollback = [backward for _, backward in reversed(applied)]
+        elif n_ok is not None and n_ok < len(teardown):
+            # The teardown itself failed, so the old tree was never touched.
+            # Our idea of the root qdisc was wrong - probe again next time.
+            del self._installed[dev]
+            return False
+        else:
+            # Whatever prefix got applied is garbage now - wipe it and reinstate the old tree
+            landed = ops if n_ok is None else ops[:max(n_ok - len(teardown), 0)]
+            rollback = self._removal_ops(landed) + list(previous or ())
+
+        rolled_back, rb_err, _ = self._push(rollback, force=True)
+        if rolled_back:
+            self._installed[dev] = tuple(previous or ())
+            self._journal_hooks(dev, previous or ())
+            print(f"   ↩️  Rolled back {dev} to the previous chamber")
+        else:
+            print(f"   ⚠️  Rollback on {dev} incomplete: {rb_err}", file=sys.stderr)
+            del self._installed[dev]
+        return False
+
+    def _journal_hooks(self, dev: str, ops):
+        """Journal the root/clsact qdiscs of ops on dev - the handful of objects its tree hangs off"""
+        hooks = [[op.parent, op.handle, op.kind] for op in self._removal_ops(ops)]
+        hooks = [hook for i, hook in enumerate(hooks) if hook not in hooks[:i]]
+        if hooks:
+            self.journal.add('tc', dev, hooks)
+        else:
+            self.journal.discard('tc', dev)
+
+    def _transition(self, dev: str, ops):
+        """(batch, in_place) committing ops on dev would send, judged from what is installed now"""
+        if not os.path.isdir(f'/sys/class/net/{dev}'):
+            return list(ops), False     # an IFB that doesn't exist yet
+        teardown = self._teardown_ops(dev)
+        pairs = self._diff_plan(self._installed[dev], list(ops))
+        if pairs is not None:
+            return [forward for forward, _ in pairs], True
+        return teardown + list(ops), False
+
+    def show_plan(self, level: Dict):
+        """--plan: print the compiled plan for level and its estimated apply cost, changing nothing"""
+        level = ChamberProfile.of(level)
+        backend = 'rtnetlink' if self.netlink else 'tc -batch'
+        targeted = self.scope == 'targeted' and self.targets
+        print(f"\n📐 Plan: {level['name']}")
+        print(f"   Scope: {self.scope}" + (f", {len(self.targets)} target block(s), {self.classifier} classifier"
+                                            if targeted else ''))
+        slowest_ms = 0.0
+        for dev in self._devices():
+            directions = [(dev, self.plan(level, dev), [])]
+            if self.ingress:
+                ifb = self._ifb_name(dev)
+                downlink = self.plan(self.downlink_chamber or level, ifb, ingress=True)
+                if downlink.ops:
+                    directions = [(ifb, downlink, []), (dev, directions[0][1], self._ingress_ops(dev, ifb))]
+            dev_ms = 0.0
+            for device, plan, hooks in directions:
+                ops = list(plan.ops) + hooks
+                counts = {obj: sum(1 for op in ops if op.obj == obj) for obj in ('qdisc', 'class', 'filter')}
+                print(f"\n   🖧 {device}: {len(ops)} op(s) - {counts['qdisc']} qdisc(s), {counts['class']} class(es), "
+                      f"{counts['filter']} filter(s), compiled in {plan.compile_ms:.2f}ms")
+                for op in ops[:40]:
+                    print(f"      tc {op.to_tc()}")
+                if len(ops) > 40:
+                    print(f"      ... {len(ops) - 40} more")
+                batch, in_place = self._transition(device, ops)
+                commit_ms = CompiledPlan.commit_ms(backend, len(batch))
+                dev_ms += commit_ms
+                if in_place:
+                    how = 'changed in place'
+                else:
+                    how = 'replacing the current tree' if len(batch) > len(ops) else 'installed fresh'
+                print(f"      ⚡ {len(batch)} op(s) to commit, {how} - about {commit_ms:.2f}ms via {backend}")
+                packets, cost, _ = plan.queue_cost
+                if packets:
+                    print(f"      📦 netem queues hold up to {packets} packets ({cost / 1024 / 1024:.1f} MB)")
+            slowest_ms = max(slowest_ms, dev_ms)
+
+        if level['packet_loss_pct'] == 100:
+            if targeted:
+                rules = self._drop_rules(self.targets)
+            else:
+                rules = ["INPUT -p tcp --dport 22 -j ACCEPT", "OUTPUT -p tcp --sport 22 -j ACCEPT"]
+                for mgmt_ip in self.management_whitelist:
+                    rules += [f"INPUT -s {mgmt_ip} -j ACCEPT", f"OUTPUT -d {mgmt_ip} -j ACCEPT"]
+            print(f"\n   🧱 iptables (one iptables-restore transaction): {len(rules)} rule(s)")
+            for rule in rules[:10]:
+                print(f"      {rule}")
+            if len(rules) > 10:
+                print(f"      ... {len(rules) - 10} more")
+        print(f"\n   ⏱️  Estimated apply: about {slowest_ms:.2f}ms "
+              f"(interfaces commit in parallel, excluding iptables)")
+
+    def _commit_directions(self, level: Dict, dev: str):
+        """Commit dev's downlink (IFB) side first, then the uplink with its redirect hook"""
+        uplink = self._compile_plan(level, dev)
+        ifb = self._ifb_name(dev)
+        if not self.ingress:
+            if ifb in self._installed:
+                # Ingress was switched off - unhook it before the IFB goes away
+                if not self._commit_plan(dev, uplink):
+                    return False
+                self._remove_ifb(ifb)
+                return True
+            return self._commit_plan(dev, uplink)
+
+        downlink = self._compile_plan(self.downlink_chamber or level, dev=ifb, ingress=True)
+        if not downlink:
+            return self._commit_plan(dev, uplink)
+        if not self._ensure_ifb(ifb):
+            return False
+        previous = self._installed.get(ifb)
+        if not self._commit_plan(ifb, downlink):
+            return False
+        if self._commit_plan(dev, uplink + self._ingress_ops(dev, ifb)):
+            return True
+        # Keep both directions on the same chamber
+        self._commit_plan(ifb, previous or ())
+        return False
+
+    def _clear_device(self, dev: str):
+        """Remove everything we installed on dev, including its IFB"""
+        ok = self._commit_plan(dev, [])
+        self._remove_ifb(self._ifb_name(dev))
+        return ok
+
+    def _report_devices(self, results, elapsed_ms: float):
+        """Per-interface outcome of a set-wide commit"""
+        for dev, (ok, dev_ms) in results.items():
+            if ok:
+                print(f"   ✅ {dev}: switched in {dev_ms:.1f}ms")
+            elif ok is None:
+                print(f"   ⏱️  {dev}: missed the {self.apply_deadline:.0f}s deadline")
+            else:
+                print(f"   ❌ {dev}: failed")
+        switched = sum(1 for ok, _ in results.values() if ok)
+        print(f"   ⚡ {switched}/{len(results)} interfaces switched in {elapsed_ms:.1f}ms")
+
+    def compile_level(self, level: Dict):
+        """Compile level for every interface up front: {dev: [(device, ops), ...]} in commit order.
+
+        The IFB devices ingress needs are created here, so committing the
+        result later is nothing but qdisc/filter ops.
+        """
+        compiled = {}
+        for dev in self._devices():
+            uplink = self._compile_plan(level, dev)
+            steps = []
+            if self.ingress:
+                ifb = self._ifb_name(dev)
+                downlink = self._compile_plan(self.downlink_chamber or level, dev=ifb, ingress=True)
+                if downlink and self._ensure_ifb(ifb):
+                    steps.append((ifb, downlink))
+                    uplink = uplink + self._ingress_ops(dev, ifb)
+            steps.append((dev, uplink))
+            compiled[dev] = steps
+        return compiled
+
+    def _commit_compiled_device(self, compiled, dev: str):
+        return all(self._commit_plan(device, ops) for device, ops in compiled[dev])
+
+    def commit_compiled(self, compiled):
+        """Commit the output of compile_level on every interface at once (False once the deadman fired)"""
+        with self._lock:
+            if self.halted:
+                return False
+            results = self._run_per_device(self._commit_compiled_device, list(compiled), compiled)
+            self._managed.update(dev for dev, (ok, _) in results.items() if ok)
+        return all(ok for ok, _ in results.values())
+
+    SWEEP_FIELDS = ('latency_ms', 'jitter_ms', 'packet_loss_pct', 'bandwidth_kbps')
+
+    def _sweep_level(self, base: Dict, values: Dict):
+        """base with the swept fields replaced (integral rate, ms to the microsecond)"""
+        fields = {field: int(value) if field == 'bandwidth_kbps' else round(value, 3)
+                  for field, value in values.items()}
+        return ChamberProfile.of(base).replace(
+            name="🌊 Sweep: " + ', '.join(f"{field} {value}" for field, value in fields.items()), **fields)
+
+    def sweep(self, base: Dict, ranges: Dict, waveform: str = 'sine', hz: float = 10.0,
+              period: float = 10.0, duration: float = 0.0):
+        """Continuously modulate chamber fields between (min, max) ranges.
+
+        sine and square move every field in phase over `period` seconds;
+        random-walk drifts each field independently, roughly crossing its
+        range once per period. Every update is an in-place `change` of the
+        existing qdiscs - no rebuild, no fork with the rtnetlink backend -
+        so the ranges must not make netem or tbf appear or disappear.
+        Runs for `duration` seconds (0 = until Ctrl+C or the deadman trips).
+        """
+        for field, (low, high) in ranges.items():
+            if field not in self.SWEEP_FIELDS:
+                raise ValueError(f"cannot sweep '{field}' (use {', '.join(self.SWEEP_FIELDS)})")
+            if low > high:
+                raise ValueError(f"{field}: min {low} is above max {high}")
+        if ranges.get('packet_loss_pct', (0, 0))[1] >= 100:
+            raise ValueError("packet_loss_pct must stay below 100 (use Shaolin Shadow for an outage)")
+        if not 0 < hz <= 100 or period <= 0:
+            raise ValueError("rate must be in (0, 100] Hz and the period positive")
+
+        # Both extremes must compile to the same tree, or updates would rebuild it
+        low_level = self._sweep_level(base, {f: r[0] for f, r in ranges.items()})
+        high_level = self._sweep_level(base, {f: r[1] for f, r in ranges.items()})
+        for dev in self._devices():
+            shapes = [[op.shape() for op in self._compile_plan(level, dev) if op.obj != 'filter']
+                      for level in (low_level, high_level)]
+            if shapes[0] != shapes[1]:
+                raise ValueError("the ranges change the qdisc tree (a rate or delay reaching 0?) - "
+                                 "keep latency_ms/bandwidth_kbps above 0 or out of the sweep")
+
+        if not self.netlink:
+            print("⚠️  No rtnetlink backend - every update forks tc, expect well under 100 Hz")
+
+        walk = {field: (low + high) / 2 for field, (low, high) in ranges.items()}
+
+        def values_at(t: float):
+            if waveform == 'random-walk':
+                for field, (low, high) in ranges.items():
+                    step = random.gauss(0, (high - low) / math.sqrt(hz * period))
+                    value = walk[field] + step
+                    # Reflect off the bounds so the walk never sticks to an edge
+                    if value > high:
+                        value = 2 * high - value
+                    if value < low:
+                        value = 2 * low - value
+                    walk[field] = min(max(value, low), high)
+                return dict(walk)
+            if waveform == 'square':
+                phase = 1.0 if (t % period) < period / 2 else 0.0
+            else:
+                phase = (1 + math.sin(2 * math.pi * t / period)) / 2
+            return {field: low + (high - low) * phase for field, (low, high) in ranges.items()}
+
+        print(f"\n🌊 Sweeping {', '.join(ranges)} ({waveform}, period {period:g}s) at {hz:g} Hz"
+              f"{'' if duration else ' - Ctrl+C to stop'}")
+        if not self.apply_ruckus(self._sweep_level(base, values_at(0.0))):
+            return False
+
+        interval = 1.0 / hz
+        apply_times = []
+        missed = 0
+        failures = 0
+        start = time.monotonic()
+        tick = 0
+        report_at = start + 1.0
+        window_start, window_updates = start, 0
+        # A timed sweep keeps the session alive until it ends; an open-ended one is an
+        # unattended session like any other, so the deadman still trips and stops it
+        armed = self.deadman.running
+        self.quiet = True
+        try:
+            while not duration or tick * interval < duration:
+                if armed and not self.deadman.running:
+                    break
+                tick += 1
+                due = start + tick * interval
+                now = time.monotonic()
+                if now < due:
+                    time.sleep(due - now)
+                elif now - due > interval:
+                    # More than a whole tick behind - drop the stale updates, keep the phase
+                    skipped = int((now - due) / interval)
+                    missed += skipped
+                    tick += skipped
+                    due = start + tick * interval
+
+                level = self._sweep_level(base, values_at(due - start))
+                applied_at = time.monotonic()
+                if self.commit_compiled(self.compile_level(level)):
+                    self.current_chamber = level
+                else:
+                    failures += 1
+                apply_times.append((time.monotonic() - applied_at) * 1000)
+                window_updates += 1
+
+                now = time.monotonic()
+                if now >= report_at:
+                    achieved = window_updates / (now - window_start)
+                    print(f"\r   📡 {achieved:6.1f}/{hz:g} Hz, last update {apply_times[-1]:.3f}ms  ",
+                          end='', flush=True)
+                    window_start, window_updates = now, 0
+                    report_at = now + 1.0
+                    if duration:
+                        self.deadman.reset()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.quiet = False
+
+        elapsed = time.monotonic() - start
+        if apply_times:
+            ordered = sorted(apply_times)
+            p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+            print(f"\n📈 {len(apply_times)} updates in {elapsed:.1f}s: {len(apply_times) / elapsed:.1f} Hz "
+                  f"achieved of {hz:g} Hz requested, {missed} ticks dropped, {failures} failed")
+            print(f"   ⏱️  Update cost: mean {sum(ordered) / len(ordered):.3f}ms, "
+                  f"p99 {p99:.3f}ms, max {ordered[-1]:.3f}ms")
+        return failures == 0
+
+    def _commit_level(self, level: Dict):
+        """Compile and commit level on every interface in the set.
+
+        Retries with hashed u32 if the kernel lacks cls_flower. If any
+        interface fails, the ones that did switch go back to the previous
+        chamber so the whole set stays on one chamber.
+        """
+        devices = self._devices()
+        start = time.monotonic()
+        results = self._run_per_device(self._commit_directions, devices, level)
+        failed = [dev for dev, (ok, _) in results.items() if ok is False]
+        classified = (self.scope == 'targeted' and self.targets) or (self.scope == 'profiles' and self.profile_map)
+        if failed and self.classifier == 'auto' and classified:
+            print("   🔁 Retrying with hashed u32 classifier (cls_flower unavailable?)")
+            self.classifier = 'u32'
+            results.update(self._run_per_device(self._commit_directions, failed, level))
+            if any(not results[dev][0] for dev in failed):
+                self.classifier = 'auto'
+        elapsed_ms = (time.monotonic() - start) * 1000
+
+        if len(devices) > 1:
+            self._report_devices(results, elapsed_ms)
+        self._applied_devices = devices
+        self._managed.update(dev for dev, (ok, _) in results.items() if ok)
+        if all(ok for ok, _ in results.values()):
+            return True
+
+        switched = [dev for dev, (ok, _) in results.items() if ok]
+        if switched:
+            print(f"   ↩️  Returning {', '.join(switched)} to {self.current_chamber['name']}")
+            self._run_per_device(self._commit_directions, switched, self.current_chamber)
+        return False
+
+    def _iptables_batch(self, lines, table: str = 'filter'):
+        """Apply rule lines (-A/-I/-D ...) to one table in one iptables-restore transaction"""
+        if not lines:
+            return True
+        script = f'*{table}\n' + '\n'.join(lines) + '\nCOMMIT\n'
+        try:
+            result = subprocess.run(["iptables-restore", "--noflush"], input=script,
+                                    capture_output=True, text=True)
+        except OSError as e:
+            print(f"   ❌ iptables-restore failed: {e}", file=sys.stderr)
+            return False
+        if result.returncode != 0:
+            print(f"   ❌ iptables-restore failed: {result.stderr.strip()}", file=sys.stderr)
+        return result.returncode == 0
+
+    def _install_rules(self, rules, drop=(), insert: bool = False, table: str = 'filter') -> bool:
+        """Install rules ("CHAIN match... -j TARGET") we don't own yet and delete the owned ones in drop.
+
+        One transaction. New rules are journaled before iptables sees them,
+        dropped ones are forgotten only once they are gone - so a rule we own
+        is never missing from the journal, and one we don't is never in it.
+        """
+        owned = self.journal.entries[table]
+        rules = [rule for rule in dict.fromkeys(rules) if rule not in owned]
+        drop = [rule for rule in drop if rule in owned]
+        self.journal.add_all(table, rules)
+        verb = '-I' if insert else '-A'
+        if self._iptables_batch([f"-D {rule}" for rule in drop] + [f"{verb} {rule}" for rule in rules], table):
+            self.journal.discard_all(table, drop)
+            return True
+        self.journal.discard_all(table, rules)
+        return False
+
+    def _remove_rules(self, rules, table: str = 'filter') -> bool:
+        """Delete rules we own in one transaction, rule by rule if some were already removed by hand"""
+        rules = [rule for rule in rules if rule in self.journal.entries[table]]
+        if not rules or self._install_rules([], drop=rules, table=table):
+            return True
+        # iptables-restore rejects the whole batch over one missing rule - retry the rest singly
+        gone = []
+        for rule in rules:
+            try:
+                result = subprocess.run(["iptables", "-t", table, "-D", *rule.split()],
+                                        capture_output=True, text=True)
+            except OSError:
+                continue
+            if result.returncode == 0 or 'exist' in result.stderr:
+                gone.append(rule)
+        self.journal.discard_all(table, gone)
+        return len(gone) == len(rules)
+
+    @staticmethod
+    def _drop_rules(targets):
+        """Rules blocking targets in both directions"""
+        return [rule for target in targets
+                for rule in (f"INPUT -s {target} -j DROP", f"OUTPUT -d {target} -j DROP")]
+
+    def _drop_targets(self):
+        """Block every target in both directions (targeted Shaolin Shadow)"""
+        stale = [target for target in self._target_drops if target not in self.targets]
+        if self._install_rules(self._drop_rules(self.targets), drop=self._drop_rules(stale)):
+            self._target_drops = list(self.targets)
+
+    def _undrop_targets(self):
+        """Remove the DROP rules installed by _drop_targets"""
+        if self._remove_rules(self._drop_rules(self._target_drops)):
+            self._target_drops = []
+
+    def apply_ruckus(self, level: Dict):
+        """Apply network disruption using Linux tc (traffic control)"""
+        print(f"\n🔧 Applying: {level['name']}")
+
+        targeted = self.scope == 'targeted' and self.targets
+        scope_msg = "entire network" if self.scope == 'network' else "this device"
+
+        if level['packet_loss_pct'] == 100:
+            # Complete outage - CRITICAL: Protect SSH access!
+            if targeted:
+                # Targeted outage using iptables - the whole target set in one transaction
+                self._drop_targets()
+            else:
+                # SAFETY: Always exempt SSH traffic (port 22)
+                # --- SSH Protection Logic ---
+                # Order of operations is CRITICAL: exemptions go in before the outage
+                if self.ssh_protection_enabled:
+                    exemptions = ["INPUT -p tcp --dport 22 -j ACCEPT", "OUTPUT -p tcp --sport 22 -j ACCEPT"]
+                    # Exempt management IPs
+                    for mgmt_ip in self.management_whitelist:
+                        exemptions += [f"INPUT -s {mgmt_ip} -j ACCEPT", f"OUTPUT -d {mgmt_ip} -j ACCEPT"]
+                    if not self._install_rules(exemptions, insert=True):
+                        print(f"   ❌ Failed to install the SSH/management exemptions", file=sys.stderr)
+
+                    print(f"   🛡️  SSH (port 22) protected from chaos")
+                    if self.ssh_client_ip:
+                        print(f"   🛡️  Management IP {self.ssh_client_ip} whitelisted")
+
+        if not (targeted and level['packet_loss_pct'] == 100):
+            # Leaving a targeted outage - clear its iptables rules too
+            self._undrop_targets()
+
+        # The whole qdisc/filter tree goes in as one batch - no half-configured window
+        with self._lock:
+            self.halted = False     # an explicit apply re-opens what an emergency stop closed
+            committed = self._commit_level(level)
+        if not committed:
+            print(f"   ❌ Failed to apply {level['name']}")
+            return False
+
+        if level['packet_loss_pct'] == 100:
+            if targeted:
+                print(f"   ☠️  Complete outage for {len(self.targets)} target block(s)")
+            else:
+                print(f"   ☠️  Complete network outage on {', '.join(self._applied_devices)} ({scope_msg})")
+                print(f"   ⚠️  SSH access maintained via iptables exemption")
+
+        elif level == ChaosChamber.PEACE and self.scope == 'profiles' and self.profile_map:
+            print(f"   ☯️  Default traffic at peace, {len(self.profile_map)} target block(s) still in their chambers")
+
+        elif level == ChaosChamber.PEACE:
+            print(f"   ✅ All disruptions cleared on {', '.join(self._applied_devices)}")
+            print(f"   ☯️  Network has returned to peace")
+
+        else:
+            has_netem = level['latency_ms'] > 0 or level['packet_loss_pct'] > 0
+            if has_netem:
+                if targeted:
+                    classifier = 'hashed u32' if self.classifier == 'u32' else 'flower'
+                    print(f"   ✅ Applied to traffic targeting {len(self.targets)} address block(s) ({classifier})")
+                elif self.scope == 'profiles':
+                    print(f"   ✅ Applied to all traffic outside the per-target profiles on {', '.join(self._applied_devices)}")
+                else:
+                    print(f"   ✅ Applied on interface: {', '.join(self._applied_devices)} ({scope_msg})")
+                    queues = self._queue_split(self.interface)
+                    if queues > 1:
+                        print(f"   🧵 Spread across {queues} TX queues under mq")
+                if level['latency_ms'] > 0:
+                    print(f"   ⏱️  Latency: {level['latency_ms']}ms ± {level['jitter_ms']}ms")
+                if level['packet_loss_pct'] > 0:
+                    print(f"   📉 Packet Loss: {level['packet_loss_pct']}%")
+
+            if level['bandwidth_kbps'] and level['bandwidth_kbps'] > 0:
+                queues = self._queue_split(self.interface)
+                shaper = self._shaper_params(self.interface, max(level['bandwidth_kbps'] // queues, 8),
+                                             level['jitter_ms'])
+                print(f"   🚦 Bandwidth limited to {level['bandwidth_kbps']} Kbps ({level['bandwidth_kbps']/1000:.1f} Mbps)")
+                if queues > 1:
+                    print(f"      {shaper['rate_kbps']} Kbps per TX queue, burst {shaper['burst']} bytes, "
+                          f"queue limit {shaper['limit']} bytes each")
+                else:
+                    print(f"      burst {shaper['burst']} bytes, queue limit {shaper['limit']} bytes")
+
+        costs = [self._queue_costs.get(dev, (0, 0, 0)) for dev in self._applied_devices]
+        packets, cost, qdiscs = (sum(column) for column in zip(*costs))
+        if packets and level != ChaosChamber.PEACE:
+            spread = f" over {qdiscs} queues" if qdiscs > 1 else ""
+            print(f"   📦 netem queue sized to the BDP: {packets} packets{spread}, "
+                  f"up to {cost / 1024 / 1024:.1f} MB of buffered packets")
+
+        downlink = self.downlink_chamber or level
+        if self.ingress and downlink != ChaosChamber.PEACE:
+            ifbs = ', '.join(self._ifb_name(dev) for dev in self._applied_devices)
+            print(f"   ⬇️  Downloads impaired via {ifbs}: {downlink['name']}")
+
+        self.current_chamber = level
+        self.is_active = (level != ChaosChamber.PEACE or bool(self.scope == 'profiles' and self.profile_map)
+                          or (self.ingress and downlink != ChaosChamber.PEACE))
+        self.deadman.reset()
+        if self.is_active:
+            self.deadman.arm_failsafe(self._failsafe_command())
+        else:
+            self.deadman.disarm_failsafe()
+        return True
+
+    def _failsafe_command(self):
+        """The --restore invocation the failsafe expiry runs if we die with chaos applied"""
+        devices = sorted(self._managed | set(self._applied_devices))
+        command = [sys.executable, os.path.abspath(__file__), '--restore', '--interface', ','.join(devices)]
+        if self.socket_path:
+            command += ['--socket', self.socket_path]
+        else:
+            # No daemon of ours - a running one must not answer for this session
+            command += ['--no-daemon', '--journal', self.journal.path]
+        return command
+
+    def clear_ruckus(self):
+        """Clear all network disruptions"""
+        print("\n🧹 Clearing all network disruptions...")
+        with self._lock:
+            devices = self._devices()
+            devices += sorted(self._managed - set(devices))
+            self._run_per_device(self._clear_device, devices)
+            self._managed.clear()
+
+            # Exactly the DROPs and SSH/management exemptions we installed (plus
+            # whatever a crashed session journaled), in one transaction
+            self._unwind_journal()
+
+        print(f"   ✅ Network restored to normal on {', '.join(devices)}")
+        print(f"   ☯️  Peace has been restored to the chambers")
+
+        self.deadman.disarm_failsafe()
+        self.is_active = False
+        self.current_chamber = ChaosChamber.PEACE
+
+    def _unwind_journal(self, gateway: bool = False):
+        """Remove whatever is still journaled - qdisc hooks, IFBs and rules, one batch each.
+
+        After a normal clear that is just our iptables rules; after a crash it
+        is everything the dead session left behind. gateway also reverts the
+        NAT rule and sysctls set_scope('network') changed.
+        """
+        entries = self.journal.entries
+        for dev, hooks in list(entries['tc'].items()):
+            if os.path.isdir(f'/sys/class/net/{dev}'):
+                ops = [TcOp('del', 'qdisc', dev, parent=parent, handle=handle, kind=kind)
+                       for parent, handle, kind in hooks]
+                self._push(ops, force=True)
+            self._installed.pop(dev, None)
+            self.journal.discard('tc', dev)
+        for name in list(entries['ifb']):
+            self._remove_ifb(name)
+        self._remove_rules(list(entries['filter']))
+        self._target_drops = []
+        if not gateway:
+            return
+        self._remove_rules(list(entries['nat']), table='nat')
+        for key, value in list(entries['sysctl'].items()):
+            result = subprocess.run(["sysctl", "-w", f"{key}={value}"], capture_output=True, text=True)
+            if result.returncode == 0:
+                self.journal.discard('sysctl', key)
+            else:
+                print(f"   ⚠️  Could not restore {key}={value}: {result.stderr.strip()}", file=sys.stderr)
+        self.gateway_configured = False
+
+    def restore_journal(self) -> bool:
+        """Undo everything journaled, gateway changes included; False if the journal was empty"""
+        if not len(self.journal):
+            return False
+        print(f"📓 Removing {len(self.journal)} journaled object(s) listed in {self.journal.path}")
+        with self._lock:
+            self._managed.clear()
+            self._unwind_journal(gateway=True)
+        self.is_active = False
+        self.current_chamber = ChaosChamber.PEACE
+        if len(self.journal):
+            print(f"   ⚠️  {len(self.journal)} object(s) could not be removed - still journaled", file=sys.stderr)
+            return False
+        print("   ✅ Journal empty - nothing of ours is left in the kernel")
+        return True
+
+    def _emergency_stop(self):
+        """Emergency stop triggered by deadman's switch"""
+        print("\n🚨 EMERGENCY STOP - Clearing all ruckus!")
+        with self._lock:
+            self.halted = True
+            self.clear_ruckus()
+            self.is_active = False
+
+    def learn_delay(self, path: str, base: Dict, target: Optional[str] = None):
+        """Chamber that replays the delay distribution measured in path on top of base.
+
+        path is a monitor-the-ruckus.py --record trace (latency_ms of one
+        target) or a plain list of delays in ms. The compiled table is cached,
+        so learning the same samples again costs one small file read.
+        """
+        samples = _read_delay_samples(path, target)
+        started = time.perf_counter()
+        dist = compile_delay_dist(samples)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        print(f"\n📐 Delay distribution {dist['name']} from {dist['samples']} samples "
+              f"({'cache hit' if dist['cached'] else 'compiled'} in {elapsed_ms:.1f}ms)")
+        print(f"   mean {dist['mean_ms']}ms, sigma {dist['sigma_ms']}ms, "
+              f"p50 {dist['p50_ms']}ms, p99 {dist['p99_ms']}ms, max {dist['max_ms']}ms")
+        return ChaosChamber.with_delay_dist(base, dist)
+
+    def get_status(self):
+        """Get current status"""
+        status = f"\n{'='*60}\n"
+        status += f"🥷 BRING DA RUCKUS - Status\n"
+        status += f"{'='*60}\n"
+        status += f"Current Chamber: {self.current_chamber['name']}\n"
+        status += f"Active: {'🟢 YES' if self.is_active else '🔴 NO'}\n"
+        if self.interface_specs:
+            status += f"Interfaces: {', '.join(self._resolve_interfaces(self.interface_specs))}\n"
+        else:
+            status += f"Interface: {self.interface or 'Auto-detect'}\n"
+
+        scope_names = {
+            'local': '🖥️  Local Device Only',
+            'network': '🌐 Entire Network (Gateway Mode)',
+            'targeted': '🎯 Targeted IP',
+            'profiles': '🧩 Per-Target Profiles'
+        }
+        status += f"Scope: {scope_names.get(self.scope, self.scope)}\n"
+
+        if self.targets and self.scope == 'targeted':
+            preview = ', '.join(str(t) for t in self.targets[:3]) + (' ...' if len(self.targets) > 3 else '')
+            status += f"Targets: {len(self.targets)} block(s) - {preview}\n"
+        if self.profile_map and self.scope == 'profiles':
+            status += "Profiles:\n"
+            for network, level in sorted(self.profile_map.items()):
+                status += f"   {str(network):<18} → {level['name']}\n"
+        if self.ingress:
+            downlink = self.downlink_chamber['name'] if self.downlink_chamber else 'same as uplink'
+            status += f"Ingress: via IFB ({downlink})\n"
+        status += (f"Compiled plans: {len(self._plans)} cached "
+                   f"({self.plan_hits} reused, {self.plan_misses} compiled)\n")
+        status += f"Deadman Timeout: {self.deadman.timeout_minutes} minutes\n"
+
+        if self.is_active:
+            elapsed = (datetime.now() - self.deadman.last_activity).total_seconds() / 60
+            status += f"Time since last activity: {elapsed:.1f} minutes\n"
+
+        status += f"{'='*60}\n"
+        return status
+
+    def qdisc_counters(self, dev: str):
+        """Per-qdisc counters on dev - rtnetlink dump, or `tc -s -j` without it"""
+        if self.netlink:
+            try:
+                return self.netlink.qdisc_stats(dev)
+            except OSError:
+                pass
+        if not self.tc_cli:
+            return []
+        result = subprocess.run(["tc", "-s", "-j", "qdisc", "show", "dev", dev], capture_output=True, text=True)
+        try:
+            qdiscs = json.loads(result.stdout or '[]')
+        except ValueError:
+            return []
+        fields = ('kind', 'handle', 'bytes', 'packets', 'qlen', 'backlog', 'drops', 'requeues', 'overlimits')
+        return [dict({field: qdisc.get(field) for field in fields},
+                     parent='root' if qdisc.get('root') else qdisc.get('parent'))
+                for qdisc in qdiscs]
+
+    def show_tc_status(self):
+        """Show current tc configuration"""
+        for dev in self._devices():
+            print(f"\n📋 Current tc configuration on {dev}:")
+            print("="*60)
+            result = subprocess.run(
+                f"tc qdisc show dev {dev}",
+                shell=True, capture_output=True, text=True
+            )
+            print(result.stdout if result.stdout else "   No qdisc configured (normal operation)")
+            if self.scope == 'profiles':
+                result = subprocess.run(
+                    f"tc class show dev {dev}",
+                    shell=True, capture_output=True, text=True
+                )
+                if result.stdout:
+                    print(result.stdout)
+            print("="*60)
+
+
+def _sleep_until(target: float, deadman: Optional['DeadmanSwitch'] = None, keepalive: bool = True) -> bool:
+    """Sleep to a monotonic deadline, spinning the last ~2ms for precision.
+
+    With keepalive the wait counts as activity for the deadman (the runner
+    has a known end); without it the sleep gives up, returning False, as
+    soon as the deadman trips.
+    """
+    armed = deadman is not None and deadman.running
+    while True:
+        remaining = target - time.monotonic()
+        if remaining <= 0:
+            return True
+        if remaining > 1 and deadman:
+            if keepalive:
+                deadman.reset()  # a runner is driving - not an abandoned session
+            elif armed and not deadman.running:
+                return False
+        time.sleep(min(remaining - 0.002, 1) if remaining > 0.002 else 0)
+
+
+class ScenarioRunner:
+    """Plays a JSON timeline of chambers on a monotonic schedule.
+
+    A scenario file looks like:
+
+        {"name": "soak", "steps": [
+            {"chamber": "peace", "duration": 60},
+            {"ramp": {"latency_ms": [0, 300]}, "duration": 120, "interval": 5},
+            {"chamber": "shaolin", "duration": 10},
+            {"chamber": "peace", "duration": 30}]}
+
+    A step is a named chamber, optionally with latency_ms / jitter_ms /
+    packet_loss_pct / bandwidth_kbps overrides, or a ramp that interpolates
+    those fields from start to end in sub-steps every `interval` seconds.
+    Every step is compiled before the clock starts; each fire is logged
+    against its planned offset from the start, so drift never accumulates.
+    """
+
+    FIELDS = ('latency_ms', 'jitter_ms', 'packet_loss_pct', 'bandwidth_kbps')
+
+    def __init__(self, ruckus: NetworkRuckus, path: str, log_path: Optional[str] = None):
+        self.ruckus = ruckus
+        with open(path) as f:
+            self.scenario = json.load(f)
+        self.name = self.scenario.get('name', os.path.basename(path))
+        self.log_path = log_path
+        self.timeline = self._expand(self.scenario.get('steps', []))
+
+    def _level(self, step: Dict, index: int):
+        """Chamber dict for a step: the named chamber (Peace if none) plus overrides"""
+        base = ChaosChamber.PEACE
+        if 'chamber' in step:
+            base = ChaosChamber.by_name(step['chamber'])
+            if base is None:
+                raise ValueError(f"step {index}: unknown chamber '{step['chamber']}'")
+        overrides = {field: step[field] for field in self.FIELDS if field in step}
+        if not overrides:
+            return base
+        return base.replace(name=f"🎬 Step {index}: " + ', '.join(f"{k} {v}" for k, v in overrides.items()),
+                            **overrides)
+
+    def _expand(self, steps):
+        """Flatten steps into [(offset_s, level, label, skippable)]; ramps become sub-steps"""
+        timeline = []
+        offset = 0.0
+        for index, step in enumerate(steps, 1):
+            duration = float(step.get('duration', 0))
+            if 'ramp' not in step:
+                level = self._level(step, index)
+                timeline.append((offset, level, level['name'], False))
+                offset += duration
+                continue
+
+            interval = float(step.get('interval', 1))
+            if duration <= 0 or interval <= 0:
+                raise ValueError(f"step {index}: a ramp needs a positive duration and interval")
+            count = max(int(duration / interval), 1)
+            for n in range(count):
+                fraction = n / (count - 1) if count > 1 else 1.0
+                fields = {}
+                for field, (start, end) in step['ramp'].items():
+                    if field not in self.FIELDS:
+                        raise ValueError(f"step {index}: cannot ramp '{field}'")
+                    value = start + (end - start) * fraction
+                    fields[field] = round(value, 3) if isinstance(start, float) or isinstance(end, float) else int(value)
+                level = self._level(dict(step, **fields), index)
+                # Only the last sub-step of a ramp has to land - late ones in between are superseded
+                timeline.append((offset + n * interval, level, f"{level['name']} ({n + 1}/{count})", n < count - 1))
+            offset += duration
+        self.total_s = offset
+        return timeline
+
+    def run(self):
+        """Precompile the timeline, play it, then clear everything"""
+        ruckus = self.ruckus
+        print(f"\n🎬 Scenario '{self.name}': {len(self.timeline)} steps over {self.total_s:.0f}s")
+        print("   🧮 Precompiling kernel ops for every step...")
+        compiled = []
+        previous_outage = False
+        for offset, level, label, skippable in self.timeline:
+            outage = level['packet_loss_pct'] == 100
+            # Outages (and the step leaving one) also touch iptables - those take the full apply path
+            compiled.append(None if outage or previous_outage else ruckus.compile_level(level))
+            previous_outage = outage
+
+        offsets = [offset for offset, *_ in self.timeline]
+        next_offsets = offsets[1:] + [self.total_s]
+
+        log = open(self.log_path, 'a') if self.log_path else None
+        drifts = []
+        try:
+            start = time.monotonic()
+            for (offset, level, label, skippable), plan, next_offset in zip(self.timeline, compiled, next_offsets):
+                planned = start + offset
+                _sleep_until(planned, ruckus.deadman)
+                fired = time.monotonic()
+                drift_ms = (fired - planned) * 1000
+                record = {'scenario': self.name, 'label': label, 'planned_s': round(offset, 3),
+                          'actual_s': round(fired - start, 6), 'drift_ms': round(drift_ms, 3)}
+
+                if skippable and fired - start >= next_offset:
+                    record['skipped'] = True
+                    print(f"   ⏭️  [{offset:8.1f}s] {label} skipped, {drift_ms:.1f}ms late")
+                else:
+                    if plan is None:
+                        ok = ruckus.apply_ruckus(level)
+                    else:
+                        ok = ruckus.commit_compiled(plan)
+                        if ok:
+                            ruckus.current_chamber = level
+                            ruckus.is_active = level != ChaosChamber.PEACE
+                        elif not ruckus.halted:
+                            ok = ruckus.apply_ruckus(level)  # recompiles, with the classifier fallback
+                    record['apply_ms'] = round((time.monotonic() - fired) * 1000, 3)
+                    record['ok'] = ok
+                    drifts.append(drift_ms)
+                    ruckus.deadman.reset()
+                    print(f"   {'✅' if ok else '❌'} [{offset:8.1f}s] {label}  "
+                          f"drift {drift_ms:+.2f}ms, applied in {record['apply_ms']:.2f}ms")
+                if log:
+                    log.write(json.dumps(record, ensure_ascii=False) + '\n')
+                    log.flush()
+
+            _sleep_until(start + self.total_s, ruckus.deadman)
+        except KeyboardInterrupt:
+            print("\n   ⚠️  Scenario interrupted")
+        finally:
+            if log:
+                log.close()
+            ruckus.clear_ruckus()
+
+        if drifts:
+            print(f"\n📈 Fired {len(drifts)} steps: drift mean {sum(drifts) / len(drifts):.2f}ms, "
+                  f"max {max(drifts):.2f}ms")
+        if self.log_path:
+            print(f"📝 Timeline log: {self.log_path}")
+
+
+class TraceReplay:
+    """Replays a monitor-the-ruckus.py --record trace as a time-varying chamber.
+
+    The trace is JSON lines, one sample per target per tick:
+
+        {"t": 12.345, "target": "Camera", "latency_ms": 84.2, "jitter_ms": 11.5, "packet_loss_pct": 4}
+
+    Samples stream straight from disk (one line in memory at a time) and
+    each one becomes an in-place netem update at t / speed. Unreachable
+    samples (no latency, 100% loss) black-hole the link until the next one.
+    """
+
+    def __init__(self, ruckus: NetworkRuckus, path: str, base: Dict, speed: float = 1.0,
+                 loop: bool = False, target: Optional[str] = None):
+        if speed <= 0:
+            raise ValueError("speed must be positive")
+        self.ruckus = ruckus
+        self.path = path
+        self.base = base
+        self.speed = speed
+        self.loop = loop
+        self.target = target
+        with open(path) as f:
+            first = self._next_sample(f)
+        if first is None:
+            raise ValueError(f"no samples{' for ' + target if target else ''} in {path}")
+        if self.target is None:
+            # Traces usually hold several targets - replay the first one seen
+            self.target = first.get('target')
+
+    def _next_sample(self, f):
+        """Next sample for our target from the open trace (None at EOF)"""
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            sample = json.loads(line)
+            if self.target is None or sample.get('target') == self.target:
+                return sample
+        return None
+
+    def _level(self, sample: Dict, previous: Dict):
+        latency_ms = round(sample.get('latency_ms', previous.get('latency_ms', 0)), 3)
+        jitter_ms = round(sample.get('jitter_ms', previous.get('jitter_ms', 0)), 3)
+        packet_loss_pct = min(sample.get('packet_loss_pct', 0), 100)
+        return ChamberProfile.of(self.base).replace(
+            latency_ms=latency_ms, jitter_ms=jitter_ms, packet_loss_pct=packet_loss_pct,
+            name=f"📼 Replay {self.target}: {latency_ms}ms ± {jitter_ms}ms, {packet_loss_pct}% loss"
+        )
+
+    def run(self):
+        """Stream the trace onto the interface set, then clear everything"""
+        ruckus = self.ruckus
+        print(f"\n📼 Replaying {self.path} (target {self.target}) at {self.speed:g}x"
+              f"{', looping' if self.loop else ''} - Ctrl+C to stop")
+
+        updates = 0
+        drift_total_ms = drift_max_ms = 0.0
+        level = self.base
+        previous_outage = False
+        # A finite trace keeps the session alive until it ends; a looping one never ends,
+        # so it leaves the deadman alone and stops when it trips
+        armed = self.loop and ruckus.deadman.running
+        start = time.monotonic()
+        offset = 0.0  # trace time already played by previous loops
+        ruckus.quiet = True
+        try:
+            with open(self.path) as f:
+                last_t, pass_samples = 0.0, 0
+                while True:
+                    if armed and not ruckus.deadman.running:
+                        break
+                    sample = self._next_sample(f)
+                    if sample is None:
+                        if not self.loop or not pass_samples:
+                            break
+                        # Leave one average sample interval, then start over
+                        offset += last_t + last_t / pass_samples
+                        last_t, pass_samples = 0.0, 0
+                        f.seek(0)
+                        continue
+                    last_t = float(sample['t'])
+                    pass_samples += 1
+                    due = start + (offset + last_t) / self.speed
+                    if not _sleep_until(due, ruckus.deadman, keepalive=not self.loop):
+                        break
+                    drift_ms = (time.monotonic() - due) * 1000
+                    drift_total_ms += drift_ms
+                    drift_max_ms = max(drift_max_ms, drift_ms)
+
+                    level = self._level(sample, level)
+                    outage = level['packet_loss_pct'] == 100
+                    if ruckus.halted:
+                        break
+                    if outage or previous_outage:
+                        # Unreachable samples (and the one after) also touch iptables - full apply path
+                        ruckus.apply_ruckus(level)
+                    elif ruckus.commit_compiled(ruckus.compile_level(level)):
+                        ruckus.current_chamber = level
+                        ruckus.is_active = True
+                    previous_outage = outage
+                    updates += 1
+                    print(f"\r   ▶️  t={offset + last_t:9.1f}s  {level['latency_ms']:7.1f}ms "
+                          f"± {level['jitter_ms']:5.1f}ms  {level['packet_loss_pct']:5.1f}% loss  ",
+                          end='', flush=True)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            ruckus.quiet = False
+            ruckus.clear_ruckus()
 
-    def apply_ruckus(self, level: Dict):
-        """Apply network disruption using Linux tc (traffic control)"""
-        print(f"\n🔧 Applying: {level['name']}")
+        if updates:
+            print(f"📈 {updates} samples replayed, drift mean {drift_total_ms / updates:.2f}ms, "
+                  f"max {drift_max_ms:.2f}ms")
 
-        if not self.interface:
-            self.interface = self.detect_interface()
 
-        # Clear existing rules first
-        subprocess.run(f"tc qdisc del dev {self.interface} root",
-                      shell=True, stderr=subprocess.DEVNULL)
-        subprocess.run(f"tc filter del dev {self.interface}",
-                      shell=True, stderr=subprocess.DEVNULL)
+def _parse_sweep(specs):
+    """Turn ['latency_ms=50:300,packet_loss_pct=0:5', ...] into {field: (min, max)}"""
+    ranges = {}
+    for spec in specs:
+        for token in spec.split(','):
+            if not token.strip():
+                continue
+            field, _, bounds = token.partition('=')
+            low, _, high = bounds.partition(':')
+            try:
+                ranges[field.strip()] = (float(low), float(high))
+            except ValueError:
+                raise ValueError(f"'{token.strip()}' is not FIELD=MIN:MAX")
+    if not ranges:
+        raise ValueError("nothing to sweep")
+    return ranges
 
-        if level['packet_loss_pct'] == 100:
-            # Complete outage - CRITICAL: Protect SSH access!
-            if self.scope == 'targeted' and self.target_ip:
-                # Targeted outage using iptables
-                subprocess.run(f"iptables -A INPUT -s {self.target_ip} -j DROP", shell=True, check=True)
-                subprocess.run(f"iptables -A OUTPUT -d {self.target_ip} -j DROP", shell=True, check=True)
-                print(f"   ☠️  Complete outage for {self.target_ip}")
-            else:
-                # SAFETY: Always exempt SSH traffic (port 22)
-                # --- SSH Protection Logic ---
-                # Order of operations is CRITICAL:
-                    res = subprocess.run(
-                        f"iptables -I INPUT -p tcp --dport 22 -j ACCEPT",
-                        shell=True, capture_output=True
-                    )
-                    if res.returncode != 0:
-                        print(f"   ❌ Failed to protect SSH INPUT rule: {res.stderr.decode().strip()}", file=sys.stderr)
-                    res = subprocess.run(
-                        f"iptables -I OUTPUT -p tcp --sport 22 -j ACCEPT",
-                        shell=True, capture_output=True
-                    )
-                    if res.returncode != 0:
-                        print(f"   ❌ Failed to protect SSH OUTPUT rule: {res.stderr.decode().strip()}", file=sys.stderr)
 
-                    # Exempt management IPs
-                    for mgmt_ip in self.management_whitelist:
-                        res = subprocess.run(
-                            f"iptables -I INPUT -s {mgmt_ip} -j ACCEPT",
-                            shell=True, capture_output=True
-                        )
-                        if res.returncode != 0:
-                            print(f"   ❌ Failed to whitelist management INPUT for {mgmt_ip}: {res.stderr.decode().strip()}", file=sys.stderr)
-                        res = subprocess.run(
-                            f"iptables -I OUTPUT -d {mgmt_ip} -j ACCEPT",
-                            shell=True, capture_output=True
-                        )
-                        if res.returncode != 0:
-                            print(f"   ❌ Failed to whitelist management OUTPUT for {mgmt_ip}: {res.stderr.decode().strip()}", file=sys.stderr)
+def _runtime_dir() -> str:
+    """Where the daemon socket, state file and journal live (systemd's RuntimeDirectory= under the unit)"""
+    return os.environ.get('RUNTIME_DIRECTORY', '').split(':')[0] or '/run/bring-da-ruckus'
 
-                    print(f"   🛡️  SSH (port 22) protected from chaos")
-                    if self.ssh_client_ip:
-                        print(f"   🛡️  Management IP {self.ssh_client_ip} whitelisted")
 
-                cmd = f"tc qdisc add dev {self.interface} root netem loss 100%"
-                subprocess.run(cmd, shell=True, check=True)
-                scope_msg = "entire network" if self.scope == 'network' else "this device"
-                print(f"   ☠️  Complete network outage on {self.interface} ({scope_msg})")
-                print(f"   ⚠️  SSH access maintained via iptables exemption")
+def _session_journal() -> str:
+    """Journal of interactive/CLI sessions - kept apart from the daemon's so neither restores the other"""
+    return os.path.join(_runtime_dir(), 'session-journal.json')
 
-        elif level == ChaosChamber.PEACE:
-            # Clear iptables rules too
-            if self.target_ip:
-                subprocess.run(f"iptables -D INPUT -s {self.target_ip} -j DROP",
-                             shell=True, stderr=subprocess.DEVNULL)
-                subprocess.run(f"iptables -D OUTPUT -d {self.target_ip} -j DROP",
-                             shell=True, stderr=subprocess.DEVNULL)
-            print(f"   ✅ All disruptions cleared on {self.interface}")
-            print(f"   ☯️  Network has returned to peace")
 
-        else:
-            # Build tc netem command for latency, jitter, and packet loss
-            params = []
+def _daemon_request(request: Dict, socket_path: str, timeout: float = 15.0) -> Dict:
+    """Send one command to a running daemon and wait for its reply (OSError if none is listening)"""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+        sock.sendall((json.dumps(request) + '\n').encode())
+        data = b''
+        while not data.endswith(b'\n'):
+            chunk = sock.recv(65536)
+            if not chunk:
+                break
+            data += chunk
+    if not data:
+        raise ConnectionError("daemon closed the connection without replying")
+    return json.loads(data)
 
-            if level['latency_ms'] > 0:
-                params.append(f"delay {level['latency_ms']}ms")
-                if level['jitter_ms'] > 0:
-                    params.append(f"{level['jitter_ms']}ms")
 
-            if level['packet_loss_pct'] > 0:
-                params.append(f"loss {level['packet_loss_pct']}%")
+# Root qdiscs chambers install - what --restore --force may take for ours without a journal
+OWN_ROOT_KINDS = ('netem', 'prio', 'mq', 'htb')
 
-            # Apply netem for latency/loss/jitter
-            if params:
-                try:
-                    if self.scope == 'targeted' and self.target_ip:
-                        # Use tc with filters for targeted disruption
-                        # Create root qdisc with prio
-                        subprocess.run(f"tc qdisc add dev {self.interface} root handle 1: prio",
-                                     shell=True, check=True)
-                        # Add netem to band 1
-                        cmd = f"tc qdisc add dev {self.interface} parent 1:1 handle 10: netem {' '.join(params)}"
-                        subprocess.run(cmd, shell=True, check=True)
-                        # Filter traffic to target IP
-                        subprocess.run(
-                            f"tc filter add dev {self.interface} protocol ip parent 1:0 prio 1 u32 match ip dst {self.target_ip} flowid 1:1",
-                            shell=True, check=True
-                        )
-                        print(f"   ✅ Applied to traffic targeting: {self.target_ip}")
-                    else:
-                        # Standard application for local or network-wide
-                        cmd = f"tc qdisc add dev {self.interface} root netem {' '.join(params)}"
-                        subprocess.run(cmd, shell=True, check=True)
-                        scope_msg = "entire network" if self.scope == 'network' else "this device"
-                        print(f"   ✅ Applied on interface: {self.interface} ({scope_msg})")
-
-                    if level['latency_ms'] > 0:
-                        print(f"   ⏱️  Latency: {level['latency_ms']}ms ± {level['jitter_ms']}ms")
-                    if level['packet_loss_pct'] > 0:
-                        print(f"   📉 Packet Loss: {level['packet_loss_pct']}%")
-                except subprocess.CalledProcessError as e:
-                    print(f"   ❌ Failed to apply netem rules: {e}")
-                    return False
 
-            # For bandwidth limiting, we need to use tbf (token bucket filter)
-            # Note: Can't easily combine netem and tbf, so bandwidth is separate
-            if level['bandwidth_kbps'] and level['bandwidth_kbps'] > 0:
-                # If we already applied netem, we need to nest tbf under it
-                if params:
-                    # Add tbf as child qdisc (more complex, skip for now)
-                    print(f"   ⚠️  Bandwidth limiting not combined with other rules")
-                else:
-                    # No netem, can use tbf directly
-                    bw_cmd = f"tc qdisc add dev {self.interface} root tbf rate {level['bandwidth_kbps']}kbit burst 32kbit latency 400ms"
-                    try:
-                        subprocess.run(bw_cmd, shell=True, check=True)
-                        print(f"   🚦 Bandwidth limited to {level['bandwidth_kbps']} Kbps ({level['bandwidth_kbps']/1000:.1f} Mbps)")
-                    except subprocess.CalledProcessError as e:
-                        print(f"   ⚠️  Could not apply bandwidth limit: {e}")
+def restore(socket_path: Optional[str] = None, interfaces: Optional[str] = None, force: bool = False,
+            journal_path: Optional[str] = None, daemon: bool = True) -> bool:
+    """--restore: have the daemon clear everything, or remove what the journal lists if it is gone.
 
-        self.current_chamber = level
-        self.is_active = (level != ChaosChamber.PEACE)
-        self.deadman.reset()
+    daemon=False (--no-daemon) skips the socket and goes straight to the
+    interactive sessions' journal, so a dead session's failsafe never
+    clears a daemon that is still running.
+
+    With neither, nothing of ours is installed and nothing is touched. force
+    is the last resort for a journal that could not be written: it deletes
+    root qdiscs shaped like ours (handle 1:, a kind chambers use) and our
+    IFBs on the given interfaces (or the auto-detected one).
+    """
+    socket_path = socket_path or os.path.join(_runtime_dir(), 'ruckus.sock')
+    if daemon:
+        try:
+            reply = _daemon_request({'cmd': 'clear'}, socket_path)
+            print('\n'.join(reply.get('output', [])))
+            return bool(reply.get('ok'))
+        except (OSError, ValueError):
+            pass
+
+    ruckus = NetworkRuckus(journal_path=journal_path or (None if daemon else _session_journal()))
+    if len(ruckus.journal):
+        # A dead daemon or session left objects behind - remove exactly those
+        state_path = os.path.join(os.path.dirname(socket_path), 'state.json')
+        if daemon and os.path.exists(state_path):
+            os.unlink(state_path)
+        return ruckus.restore_journal()
+    if daemon and os.environ.get('SERVICE_RESULT') == 'success':
+        # ExecStopPost= after a clean stop: the daemon already cleared and emptied its journal
+        print("✅ Daemon stopped cleanly - nothing to restore")
         return True
+    if not force:
+        # A daemon that died before its first apply journals nothing - the host's own qdiscs stay
+        print(f"✅ No daemon and nothing in {ruckus.journal.path} - nothing of ours is installed")
+        return True
+    if interfaces:
+        ruckus.interface_specs = interfaces.replace(',', ' ').split()
+    for dev in ruckus._devices():
+        shown = subprocess.run(["tc", "qdisc", "show", "dev", dev, "root"], capture_output=True, text=True)
+        match = re.search(r'qdisc (\S+) 1: root', shown.stdout)
+        if match and match.group(1) in OWN_ROOT_KINDS:
+            subprocess.run(["tc", "qdisc", "del", "dev", dev, "root"], capture_output=True)
+            print(f"   🧹 {dev}: removed the {match.group(1)} 1: root")
+        else:
+            print(f"   ⏭️  {dev}: root qdisc is not one of ours - left alone")
+        ruckus._remove_ifb(ruckus._ifb_name(dev))
+    return True
 
-    def clear_ruckus(self):
-        """Clear all network disruptions"""
-        print("\n🧹 Clearing all network disruptions...")
-        if not self.interface:
-            self.interface = self.detect_interface()
 
-        subprocess.run(f"tc qdisc del dev {self.interface} root",
-                      shell=True, stderr=subprocess.DEVNULL)
-        subprocess.run(f"tc filter del dev {self.interface}",
-                      shell=True, stderr=subprocess.DEVNULL)
-
-        # Clear any iptables DROP rules if we had a target
-        if self.target_ip:
-            subprocess.run(f"iptables -D INPUT -s {self.target_ip} -j DROP",
-                         shell=True, stderr=subprocess.DEVNULL)
-            subprocess.run(f"iptables -D OUTPUT -d {self.target_ip} -j DROP",
-                         shell=True, stderr=subprocess.DEVNULL)
-
-        # Clear SSH protection iptables rules
-        if self.ssh_protection_enabled:
-            subprocess.run(
-                "iptables -D INPUT -p tcp --dport 22 -j ACCEPT",
-                shell=True, stderr=subprocess.DEVNULL
-            )
-            subprocess.run(
-                "iptables -D OUTPUT -p tcp --sport 22 -j ACCEPT",
-                shell=True, stderr=subprocess.DEVNULL
-            )
+class RuckusDaemon:
+    """Long-lived owner of the kernel state, driven by line-JSON commands on a Unix socket.
 
-            # Clear management IP whitelist
-            for mgmt_ip in self.management_whitelist:
-                subprocess.run(
-                    f"iptables -D INPUT -s {mgmt_ip} -j ACCEPT",
-                    shell=True, stderr=subprocess.DEVNULL
-                )
-                subprocess.run(
-                    f"iptables -D OUTPUT -d {mgmt_ip} -j ACCEPT",
-                    shell=True, stderr=subprocess.DEVNULL
-                )
+    One JSON object per line in, one per line out:
 
-        print(f"   ✅ Network restored to normal on {self.interface}")
-        print(f"   ☯️  Peace has been restored to the chambers")
+        {"cmd": "apply", "chamber": "ninth", "latency_ms": 80}
+        {"cmd": "target", "targets": ["10.0.0.5", "10.0.1.0/24"]}
+        {"cmd": "scope", "scope": "local"}
+        {"cmd": "clear"}
+        {"cmd": "status"}
 
-        self.is_active = False
-        self.current_chamber = ChaosChamber.PEACE
+    Replies carry ok, the time the command took, the daemon state and what
+    the command printed. With an api address the same commands are served
+    as HTTP/JSON (POST /apply, /clear, /scope, /target; GET /status) plus
+    a server-sent event stream of state transitions and qdisc counters on
+    GET /events. Every mutating command, from any client, goes through one
+    queue and runs to completion before the next starts, so concurrent
+    clients never interleave half-applied rule sets. Every kernel object is
+    journaled before it is created, so --restore can still clean up if the
+    daemon dies; the state file is a status snapshot for humans.
+    """
 
-    def _emergency_stop(self):
-        """Emergency stop triggered by deadman's switch"""
-        print("\n🚨 EMERGENCY STOP - Clearing all ruckus!")
-        self.clear_ruckus()
-        self.is_active = False
+    OVERRIDES = ('latency_ms', 'jitter_ms', 'packet_loss_pct', 'bandwidth_kbps')
+    MUTATING = ('apply', 'clear', 'target', 'scope')
+    ROUTES = {
+        ('POST', '/apply'): 'apply',
+        ('POST', '/clear'): 'clear',
+        ('POST', '/scope'): 'scope',
+        ('POST', '/target'): 'target',
+        ('GET', '/status'): 'status',
+    }
+    MAX_BODY = 1024 * 1024
 
-    def get_status(self):
-        """Get current status"""
-        status = f"\n{'='*60}\n"
-        status += f"🥷 BRING DA RUCKUS - Status\n"
-        status += f"{'='*60}\n"
-        status += f"Current Chamber: {self.current_chamber['name']}\n"
-        status += f"Active: {'🟢 YES' if self.is_active else '🔴 NO'}\n"
-        status += f"Interface: {self.interface or 'Auto-detect'}\n"
+    def __init__(self, ruckus: NetworkRuckus, socket_path: Optional[str] = None,
+                 api: Optional[tuple] = None, counter_interval: float = 1.0):
+        self.ruckus = ruckus
+        self.socket_path = socket_path or os.path.join(_runtime_dir(), 'ruckus.sock')
+        self.state_path = os.path.join(os.path.dirname(self.socket_path), 'state.json')
+        self.api = api                      # (host, port) for the HTTP API, None = socket only
+        self.counter_interval = counter_interval
+        self.started = time.time()
+        self.commands = 0
+        self.queue = None                   # (request, future) pairs for the command worker
+        self.subscribers = set()            # one asyncio.Queue of events per /events client
+        self._counter_task = None
 
-        scope_names = {
-            'local': '🖥️  Local Device Only',
-            'network': '🌐 Entire Network (Gateway Mode)',
-            'targeted': '🎯 Targeted IP'
+    def state(self) -> Dict:
+        """Snapshot of what the daemon has installed"""
+        ruckus = self.ruckus
+        return {
+            'pid': os.getpid(),
+            'chamber': dict(ruckus.current_chamber),
+            'active': ruckus.is_active,
+            'scope': ruckus.scope,
+            'targets': [str(t) for t in ruckus.targets],
+            'devices': sorted(ruckus._managed | set(ruckus._applied_devices)),
+            'target_drops': [str(t) for t in ruckus._target_drops],
+            'commands': self.commands,
+            'uptime_s': round(time.time() - self.started, 1),
         }
-        status += f"Scope: {scope_names.get(self.scope, self.scope)}\n"
 
-        if self.target_ip and self.scope == 'targeted':
-            status += f"Target IP: {self.target_ip}\n"
-        status += f"Deadman Timeout: {self.deadman.timeout_minutes} minutes\n"
+    def _level(self, request: Dict):
+        """Chamber named by an apply request, with any field overrides"""
+        level = ChaosChamber.by_name(str(request.get('chamber', '')))
+        if level is None:
+            raise ValueError(f"unknown chamber '{request.get('chamber')}'")
+        overrides = {field: request[field] for field in self.OVERRIDES if field in request}
+        if overrides:
+            level = level.replace(name=f"{level['name']} + {', '.join(f'{k}={v}' for k, v in overrides.items())}",
+                                  **overrides)
+        if level['packet_loss_pct'] == 100 and not request.get('force'):
+            # The socket has no confirmation prompt - outages must be asked for explicitly
+            raise ValueError('100% packet loss needs "force": true')
+        return level
 
-        if self.is_active:
-            elapsed = (datetime.now() - self.deadman.last_activity).total_seconds() / 60
-            status += f"Time since last activity: {elapsed:.1f} minutes\n"
+    def execute(self, request: Dict) -> Dict:
+        """Run one command against the kernel state and build its reply"""
+        cmd = request.get('cmd')
+        ruckus = self.ruckus
+        output = io.StringIO()
+        error = None
+        start = time.perf_counter()
+        try:
+            with contextlib.redirect_stdout(output):
+                if cmd == 'apply':
+                    ok = ruckus.apply_ruckus(self._level(request))
+                elif cmd == 'clear':
+                    ruckus.clear_ruckus()
+                    ok = True
+                elif cmd == 'target':
+                    targets = request.get('targets') or []
+                    if targets:
+                        ok = ruckus.set_targets(targets)
+                    else:
+                        ruckus.targets = []
+                        print("🌐 Targeting all traffic")
+                        ok = True
+                elif cmd == 'scope':
+                    # No one is at a terminal - turning the host into a gateway must be asked for
+                    ok = ruckus.set_scope(str(request.get('scope', '')),
+                                          enable_forwarding=bool(request.get('enable_forwarding')))
+                elif cmd == 'status':
+                    ok = True
+                else:
+                    raise ValueError(f"unknown command '{cmd}'")
+        except (ValueError, TypeError, KeyError, OSError) as e:
+            ok, error = False, str(e)
+        elapsed_ms = (time.perf_counter() - start) * 1000
 
-        status += f"{'='*60}\n"
-        return status
+        if cmd in self.MUTATING:
+            self.commands += 1
+            if ruckus.deadman.running:
+                ruckus.deadman.reset()
+            elif ruckus.is_active and ruckus.deadman.loop:
+                ruckus.deadman.start(ruckus.deadman.loop)  # re-arm after an expiry
+            self.write_state()
+        reply = {'ok': bool(ok), 'cmd': cmd, 'elapsed_ms': round(elapsed_ms, 3), 'state': self.state(),
+                 'output': [line for line in output.getvalue().splitlines() if line.strip()]}
+        if error:
+            reply['error'] = error
+        return reply
 
-    def show_tc_status(self):
-        """Show current tc configuration"""
-        if not self.interface:
-            self.interface = self.detect_interface()
+    async def submit(self, request: Dict) -> Dict:
+        """Run a command in turn: status answers at once, everything else queues for the worker"""
+        if request.get('cmd') not in self.MUTATING:
+            return self.execute(request)
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((request, future))
+        return await future
 
-        print(f"\n📋 Current tc configuration on {self.interface}:")
-        print("="*60)
-        result = subprocess.run(
-            f"tc qdisc show dev {self.interface}",
-            shell=True, capture_output=True, text=True
-        )
-        print(result.stdout if result.stdout else "   No qdisc configured (normal operation)")
-        print("="*60)
+    async def _worker(self):
+        """The only place mutating commands run - strictly one after another"""
+        while True:
+            request, future = await self.queue.get()
+            try:
+                reply = self.execute(request)
+            except Exception as e:
+                # One broken command must not take the queue (and every later client) down with it
+                reply = {'ok': False, 'cmd': request.get('cmd'), 'elapsed_ms': 0.0, 'state': self.state(),
+                         'output': [], 'error': f"{type(e).__name__}: {e}"}
+            if not future.cancelled():
+                future.set_result(reply)
+            self._publish('state', {key: reply[key] for key in ('cmd', 'ok', 'elapsed_ms', 'state')})
+
+    def _publish(self, event: str, data: Dict):
+        """Hand an event to every /events subscriber (a slow one loses its oldest events)"""
+        for events in list(self.subscribers):
+            if events.full():
+                events.get_nowait()
+            events.put_nowait((event, data))
+
+    def _counter_devices(self):
+        """Devices whose qdisc counters the event stream reports"""
+        ruckus = self.ruckus
+        devices = sorted(ruckus._managed | set(ruckus._applied_devices)) or [ruckus.interface]
+        if ruckus.ingress:
+            devices += [ruckus._ifb_name(dev) for dev in devices]
+        return [dev for dev in devices if dev and os.path.isdir(f'/sys/class/net/{dev}')]
+
+    async def _sample_counters(self):
+        """Publish qdisc counters every counter_interval while anyone is listening"""
+        while self.subscribers:
+            counters = {dev: self.ruckus.qdisc_counters(dev) for dev in self._counter_devices()}
+            self._publish('counters', {'t': round(time.time(), 3), 'devices': counters})
+            await asyncio.sleep(self.counter_interval)
+
+    async def _events(self, writer):
+        """Stream server-sent events to one client until it goes away"""
+        writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\n"
+                     b"Cache-Control: no-cache\r\nConnection: close\r\n\r\n")
+        events = asyncio.Queue(maxsize=256)
+        events.put_nowait(('state', {'cmd': None, 'ok': True, 'elapsed_ms': 0, 'state': self.state()}))
+        self.subscribers.add(events)
+        if self._counter_task is None or self._counter_task.done():
+            self._counter_task = asyncio.ensure_future(self._sample_counters())
+        try:
+            while True:
+                try:
+                    event, data = await asyncio.wait_for(events.get(), timeout=15)
+                except asyncio.TimeoutError:
+                    writer.write(b": keepalive\n\n")  # also how we notice a client that left
+                else:
+                    payload = json.dumps(data, ensure_ascii=False, default=str)
+                    writer.write(f"event: {event}\ndata: {payload}\n\n".encode())
+                await writer.drain()
+        finally:
+            self.subscribers.discard(events)
+
+    async def _http_reply(self, writer, status: int, payload: Dict, keep_alive: bool):
+        body = (json.dumps(payload, ensure_ascii=False, default=str) + '\n').encode()
+        head = (f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode() + body)
+        await writer.drain()
+
+    async def _http_client(self, reader, writer):
+        """Serve one HTTP/1.1 connection (keep-alive, or a single /events stream)"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                try:
+                    method, path, version = request_line.decode('latin-1').split()
+                except ValueError:
+                    await self._http_reply(writer, 400, {'ok': False, 'error': 'bad request line'}, False)
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length > self.MAX_BODY:
+                    await self._http_reply(writer, 413, {'ok': False, 'error': 'body too large'}, False)
+                    break
+                body = await reader.readexactly(length)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                path = path.split('?', 1)[0].rstrip('/') or '/'
+
+                if method == 'GET' and path == '/events':
+                    await self._events(writer)
+                    break
+                cmd = self.ROUTES.get((method, path))
+                if cmd is None:
+                    status, reply = 404, {'ok': False, 'error': f"no route for {method} {path}"}
+                else:
+                    try:
+                        request = json.loads(body) if body.strip() else {}
+                        if not isinstance(request, dict):
+                            raise ValueError("expected a JSON object")
+                    except ValueError as e:
+                        status, reply = 400, {'ok': False, 'error': f"bad request: {e}"}
+                    else:
+                        request['cmd'] = cmd
+                        reply = await self.submit(request)
+                        status = 200 if reply['ok'] else 400 if 'error' in reply else 500
+                await self._http_reply(writer, status, reply, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    def write_state(self):
+        """Record what is installed (atomically) for --restore"""
+        _write_atomic(self.state_path, json.dumps(self.state(), ensure_ascii=False, default=str) + '\n')
+
+    async def _client(self, reader, writer):
+        """Serve one connection: a reply for every request line until EOF"""
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    # Past the stream limit the rest of the line can't be resynced - answer, then hang up
+                    writer.write((json.dumps({'ok': False, 'error': 'request too long'}) + '\n').encode())
+                    await writer.drain()
+                    break
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("expected a JSON object")
+                except ValueError as e:
+                    reply = {'ok': False, 'error': f"bad request: {e}"}
+                else:
+                    reply = await self.submit(request)
+                writer.write((json.dumps(reply, ensure_ascii=False, default=str) + '\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, initial: Optional[Dict] = None):
+        """Listen on the socket until SIGTERM/SIGINT, starting from the initial chamber if given"""
+        os.makedirs(os.path.dirname(self.socket_path), exist_ok=True)
+        if os.path.exists(self.socket_path):
+            try:
+                _daemon_request({'cmd': 'status'}, self.socket_path, timeout=1.0)
+                raise RuntimeError(f"a daemon is already listening on {self.socket_path}")
+            except (OSError, ValueError):
+                os.unlink(self.socket_path)  # left behind by a daemon that died
+        # Whatever a dead daemon left installed goes first
+        self.ruckus.restore_journal()
+        if initial:
+            self.ruckus.apply_ruckus(initial)
+
+        self.queue = asyncio.Queue()
+        worker = asyncio.ensure_future(self._worker())
+        servers = [await asyncio.start_unix_server(self._client, path=self.socket_path)]
+        os.chmod(self.socket_path, 0o600)
+        if self.api:
+            servers.append(await asyncio.start_server(self._http_client, *self.api))
+        self.write_state()
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        # The deadman timer and the watchdog keepalives share the command loop:
+        # if a command wedges it, the pings stop and systemd steps in
+        self.ruckus.deadman.callback = self._deadman_fired
+        self.ruckus.deadman.start(loop)
+        print(f"🥷 Daemon listening on {self.socket_path} (pid {os.getpid()})")
+        if self.api:
+            print(f"🌐 HTTP API on http://{self.api[0]}:{self.api[1]} (events: GET /events)")
+        _sd_notify(f"READY=1\nSTATUS=Listening on {self.socket_path}")
+        await stop.wait()
+        _sd_notify("STOPPING=1")
+        print("\n👋 Daemon stopping")
+        # Disarm while the loop still runs - asyncio.run() closes it on the way out
+        self.ruckus.deadman.stop()
+        await asyncio.sleep(0)
+        for server in servers:
+            server.close()
+        worker.cancel()
+
+    def _deadman_fired(self):
+        """Deadman expiry on the loop - clear like any command and tell the subscribers"""
+        self.ruckus._emergency_stop()
+        self.write_state()
+        self._publish('state', {'cmd': 'deadman', 'ok': True, 'elapsed_ms': 0, 'state': self.state()})
+
+    def run(self, initial: Optional[Dict] = None):
+        """Serve until stopped, then leave the network clean"""
+        try:
+            asyncio.run(self.serve(initial))
+        finally:
+            self.ruckus.deadman.stop()
+            self.ruckus.clear_ruckus()
+            self.ruckus.restore_journal()
+            for path in (self.socket_path, self.state_path):
+                if os.path.exists(path):
+                    os.unlink(path)
+
+
+def _ctl_request(words) -> Dict:
+    """Turn --ctl words (apply ninth latency_ms=80 / target 10.0.0.5 / clear ...) into a request"""
+    if words[0].startswith('{'):
+        return json.loads(' '.join(words))
+    request = {'cmd': words[0]}
+    rest = words[1:]
+    if words[0] == 'apply':
+        if not rest:
+            raise ValueError("apply needs a chamber name")
+        request['chamber'] = rest[0]
+        for word in rest[1:]:
+            if word == 'force':
+                request['force'] = True
+                continue
+            field, _, value = word.partition('=')
+            request[field] = float(value) if '.' in value else int(value)
+    elif words[0] == 'target':
+        request['targets'] = rest
+    elif words[0] == 'scope':
+        request['scope'] = rest[0] if rest else ''
+        if 'enable-forwarding' in rest[1:]:
+            request['enable_forwarding'] = True
+    return request
 
 
 def show_menu():
@@ -593,6 +3649,11 @@ def show_menu():
     print("=" * 80)
     print("\n📍 SCOPE:")
     print("  o - Set scope: Local / Network / Targeted IP")
+    print("  p - Put targets in their own chamber (per-target profiles)")
+    print("  n - Toggle ingress (download) impairment via IFB")
+    print("  r - Run a scenario file (timeline of chambers)")
+    print("  w - Sweep latency/jitter/loss/rate on a waveform")
+    print("  l - Learn a delay distribution from measured RTTs")
     print("\n🔱 Select Your Chamber:")
     for i, chamber in enumerate(ChaosChamber.all_chambers(), 1):
         print(f"  {i}. {chamber['name']}")
@@ -623,6 +3684,7 @@ def interactive_mode(ruckus: NetworkRuckus):
             if choice == 'q':
                 print("\n👋 Exiting and cleaning up...")
                 ruckus.clear_ruckus()
+                ruckus.restore_journal()
                 ruckus.deadman.stop()
                 break
 
@@ -632,6 +3694,9 @@ def interactive_mode(ruckus: NetworkRuckus):
             elif choice == 'c':
                 ruckus.clear_ruckus()
 
+            elif not choice:
+                print(f"⏰ Deadman's switch reset ({ruckus.deadman.timeout_minutes} minutes)")
+
             elif choice == 'd':
                 ruckus.show_tc_status()
 
@@ -639,7 +3704,7 @@ def interactive_mode(ruckus: NetworkRuckus):
                 print("\n📍 Select scope:")
                 print("   [1] Local device only (default)")
                 print("   [2] Entire network (requires gateway mode)")
-                print("   [3] Targeted IP address")
+                print("   [3] Targeted IPs / CIDRs")
                 scope_choice = input("Enter choice: ").strip()
 
                 if scope_choice == '1':
@@ -647,25 +3712,79 @@ def interactive_mode(ruckus: NetworkRuckus):
                 elif scope_choice == '2':
                     ruckus.set_scope('network')
                 elif scope_choice == '3':
-                    ip = input("Enter target IP address: ").strip()
-                    if ip:
-                        ruckus.set_target(ip)
+                    spec = input("Enter target IPs/CIDRs (comma separated) or a file of them: ").strip()
+                    if spec:
+                        ruckus.set_targets(spec)
                     else:
                         print("❌ Invalid IP")
 
             elif choice == 't':
-                ip = input("Enter target IP address: ").strip()
-                if ip:
-                    ruckus.set_target(ip)
+                spec = input("Enter target IPs/CIDRs (comma separated) or a file of them: ").strip()
+                if spec:
+                    ruckus.set_targets(spec)
                 else:
-                    ruckus.target_ip = None
+                    ruckus.targets = []
                     print("🌐 Targeting all traffic")
 
+            elif choice == 'p':
+                spec = input("Enter target IPs/CIDRs (comma separated) or a file of them: ").strip()
+                chambers = ChaosChamber.all_chambers()
+                chamber_choice = input(f"Chamber for these targets [1-{len(chambers)}]: ").strip()
+                if not spec or not chamber_choice.isdigit() or not 1 <= int(chamber_choice) <= len(chambers):
+                    print("❌ Invalid profile")
+                elif chambers[int(chamber_choice) - 1]['packet_loss_pct'] == 100:
+                    # A per-target outage goes through the targeted scope and its iptables DROP rules
+                    print("❌ Use the targeted scope for a Shaolin Shadow outage")
+                else:
+                    ruckus.assign_profile(spec, chambers[int(chamber_choice) - 1])
+
+            elif choice == 'n':
+                if ruckus.ingress:
+                    ruckus.ingress = False
+                    print("⬆️  Ingress impairment off - uplink only")
+                else:
+                    chambers = ChaosChamber.all_chambers()
+                    chamber_choice = input(f"Downlink chamber [1-{len(chambers)}, Enter = same as uplink]: ").strip()
+                    if chamber_choice.isdigit() and 1 <= int(chamber_choice) <= len(chambers):
+                        ruckus.downlink_chamber = chambers[int(chamber_choice) - 1]
+                    else:
+                        ruckus.downlink_chamber = None
+                    ruckus.ingress = True
+                    print("⬇️  Ingress impairment on")
+                ruckus.apply_ruckus(ruckus.current_chamber)
+
+            elif choice == 'r':
+                path = input("Scenario file: ").strip()
+                try:
+                    ScenarioRunner(ruckus, path).run()
+                except (OSError, ValueError, KeyError, TypeError) as e:
+                    print(f"❌ Invalid scenario: {e}")
+
+            elif choice == 'w':
+                spec = input("Fields to sweep (e.g. latency_ms=50:300,packet_loss_pct=0:5): ").strip()
+                waveform = input("Waveform [sine/square/random-walk] (sine): ").strip() or 'sine'
+                hz = input("Updates per second, up to 100 (10): ").strip() or '10'
+                period = input("Period in seconds (10): ").strip() or '10'
+                try:
+                    ranges = _parse_sweep([spec])
+                    if waveform not in ('sine', 'square', 'random-walk'):
+                        raise ValueError(f"unknown waveform '{waveform}'")
+                    ruckus.sweep(ruckus.current_chamber, ranges, waveform, float(hz), float(period))
+                except ValueError as e:
+                    print(f"❌ Invalid sweep: {e}")
+
+            elif choice == 'l':
+                path = input("RTT samples (monitor --record trace or list of ms): ").strip()
+                target = input("Trace target (Enter = all samples): ").strip() or None
+                try:
+                    ruckus.apply_ruckus(ruckus.learn_delay(path, ruckus.current_chamber, target))
+                except (OSError, ValueError) as e:
+                    print(f"❌ Invalid samples: {e}")
+
             elif choice == 'i':
-                interface = input("Enter network interface name: ").strip()
+                interface = input("Enter interface name(s), globs (eth*) or 'all': ").strip()
                 if interface:
-                    ruckus.interface = interface
-                    print(f"🔧 Interface set to: {interface}")
+                    ruckus.set_interfaces(interface)
 
             elif choice.isdigit():
                 chamber_idx = int(choice) - 1
@@ -689,7 +3808,7 @@ def interactive_mode(ruckus: NetworkRuckus):
                         print(f"SSH Protection: {'🛡️  ENABLED' if ruckus.ssh_protection_enabled else '❌ DISABLED'}")
                         if ruckus.ssh_client_ip:
                             print(f"Your IP: {ruckus.ssh_client_ip} (will be whitelisted)")
-                        confirm = input("Type 'YES I AM SURE' to continue (leading/trailing spaces are ignored): ").strip()
+                        else:
                             print("⚠️  Could not detect your SSH IP - protection may fail!")
                         print()
                         print("Are you ABSOLUTELY SURE you want to proceed?")
@@ -717,6 +3836,7 @@ def interactive_mode(ruckus: NetworkRuckus):
     except KeyboardInterrupt:
         print("\n\n⚠️  Interrupted! Cleaning up...")
         ruckus.clear_ruckus()
+        ruckus.restore_journal()
         ruckus.deadman.stop()
 
 
@@ -730,11 +3850,17 @@ Examples:
   sudo python3 bring-da-ruckus.py --level ninth           # Start with Chamber 9
   sudo python3 bring-da-ruckus.py --level thirtysixth --timeout 15  # Chamber 36
   sudo python3 bring-da-ruckus.py --interface eth0 --timeout 15     # Custom settings
+  sudo python3 bring-da-ruckus.py --interface 'eth*,bond0' --level ninth
+  sudo python3 bring-da-ruckus.py --profile ninth=10.0.0.5 --profile eighteenth=10.0.1.0/24
+  sudo python3 bring-da-ruckus.py --daemon --interface eth0       # Socket-driven daemon
+  sudo python3 bring-da-ruckus.py --ctl apply ninth latency_ms=80 # ...flip its chamber
+  sudo python3 bring-da-ruckus.py --level first --delay-dist camera-trace.jsonl --dist-target Camera
+  python3 bring-da-ruckus.py --chambers chambers.json --level camera-wifi --target 10.0.0.0/24 --plan
 
 Requirements:
   - Ubuntu Server (or any Linux with tc/iproute2)
   - sudo/root privileges
-  - tc (traffic control) command available
+  - tc (traffic control) command available (optional with --backend netlink)
 
 🥷 Wu-Tang is for the children. Test responsibly. Bring da ruckus. 🥷
         """
@@ -742,13 +3868,28 @@ Requirements:
 
     parser.add_argument(
         '-i', '--interface',
-        help='Network interface to apply chaos to (auto-detect if not specified)'
+        help="Interface(s) to apply chaos to: names, globs (eth*), comma separated, or 'all' "
+             "UP links (auto-detect if not specified)"
     )
 
     parser.add_argument(
         '-l', '--level',
-        choices=['peace', 'first', 'ninth', 'eighteenth', 'thirtysixth', 'shaolin'],
-        help='Initial chaos chamber (peace, first, ninth, eighteenth, thirtysixth, shaolin)'
+        help='Initial chaos chamber (peace, first, ninth, eighteenth, thirtysixth, shaolin, '
+             'or one from --chambers)'
+    )
+
+    parser.add_argument(
+        '--chambers',
+        metavar='FILE',
+        help='JSON file of extra chambers, or field changes to the built-in ones: '
+             '{"chambers": {"name": {"latency_ms": 80, ...}}}'
+    )
+
+    parser.add_argument(
+        '--plan',
+        action='store_true',
+        help='Print the compiled plan for --level (and targets/profiles/interfaces) with its '
+             'estimated apply cost, then exit without changing anything'
     )
 
     parser.add_argument(
@@ -758,48 +3899,336 @@ Requirements:
         help='Deadman switch timeout in minutes (default: 30)'
     )
 
+    parser.add_argument(
+        '--backend',
+        choices=['auto', 'netlink', 'tc'],
+        default='auto',
+        help='Kernel backend: native rtnetlink, the tc CLI, or auto (rtnetlink with tc fallback)'
+    )
+
     parser.add_argument(
         '--target',
-        help='Target specific IP address (not yet implemented)'
+        nargs='+',
+        metavar='TARGET',
+        help='Target IPs, CIDRs, comma separated lists or files of them (one per line)'
+    )
+
+    parser.add_argument(
+        '--classifier',
+        choices=['auto', 'flower', 'u32'],
+        default='auto',
+        help='Target classifier: flower, hashed u32, or auto (flower with u32 fallback)'
+    )
+
+    parser.add_argument(
+        '--multiqueue',
+        action='store_true',
+        help='Keep mq as root and impair every TX queue separately (scales across cores on multi-queue NICs)'
+    )
+
+    parser.add_argument(
+        '--ingress',
+        action='store_true',
+        help='Also impair downloads by redirecting ingress traffic to an auto-managed IFB device'
+    )
+
+    parser.add_argument(
+        '--downlink-level',
+        help='Chamber for the download direction (implies --ingress; default: same as --level; not shaolin)'
+    )
+
+    parser.add_argument(
+        '--scenario',
+        metavar='FILE',
+        help='Play a JSON timeline of chambers, then clean up and exit'
+    )
+
+    parser.add_argument(
+        '--scenario-log',
+        metavar='FILE',
+        help='Append every scenario step (planned vs actual time, drift) to FILE as JSON lines'
+    )
+
+    parser.add_argument(
+        '--sweep',
+        action='append',
+        metavar='FIELD=MIN:MAX',
+        help='Continuously modulate latency_ms, jitter_ms, packet_loss_pct or bandwidth_kbps '
+             'on top of --level (repeatable or comma separated), then clean up and exit'
+    )
+
+    parser.add_argument(
+        '--waveform',
+        choices=['sine', 'square', 'random-walk'],
+        default='sine',
+        help='Sweep waveform (default: sine)'
+    )
+
+    parser.add_argument(
+        '--sweep-hz',
+        type=float,
+        default=10.0,
+        help='Sweep updates per second, up to 100 (default: 10)'
+    )
+
+    parser.add_argument(
+        '--sweep-period',
+        type=float,
+        default=10.0,
+        help='Sweep waveform period in seconds (default: 10)'
+    )
+
+    parser.add_argument(
+        '--sweep-duration',
+        type=float,
+        default=0.0,
+        help='Stop the sweep after this many seconds (default: until Ctrl+C or the deadman trips)'
+    )
+
+    parser.add_argument(
+        '--replay',
+        metavar='FILE',
+        help='Replay a monitor-the-ruckus.py --record trace as time-varying latency/jitter/loss'
+    )
+
+    parser.add_argument(
+        '--replay-speed',
+        type=float,
+        default=1.0,
+        help='Replay speed-up factor (default: 1.0, e.g. 8 plays an 8-hour trace in an hour)'
+    )
+
+    parser.add_argument(
+        '--replay-loop',
+        action='store_true',
+        help='Start the trace over when it ends'
+    )
+
+    parser.add_argument(
+        '--replay-target',
+        metavar='NAME',
+        help='Which recorded target to replay (default: the first one in the trace)'
+    )
+
+    parser.add_argument(
+        '--delay-dist',
+        metavar='FILE',
+        help='Shape delay like the RTTs measured in FILE (monitor --record trace or a list of ms) '
+             'instead of symmetric jitter; compiled tables are cached'
+    )
+
+    parser.add_argument(
+        '--dist-target',
+        metavar='NAME',
+        help='Only learn from this target\'s samples in a --delay-dist trace'
+    )
+
+    parser.add_argument(
+        '--daemon',
+        action='store_true',
+        help='Run as a daemon taking line-JSON commands on a Unix socket (what the systemd unit starts)'
+    )
+
+    parser.add_argument(
+        '--restore',
+        action='store_true',
+        help='Clear everything: via the daemon if one is running, else exactly what the state journal lists'
+    )
+
+    parser.add_argument(
+        '--no-daemon',
+        action='store_true',
+        help="With --restore, skip the daemon and restore the interactive sessions' journal"
+    )
+
+    parser.add_argument(
+        '--journal',
+        metavar='PATH',
+        help='State journal (default: journal.json for the daemon, session-journal.json otherwise, '
+             'under $RUNTIME_DIRECTORY or /run/bring-da-ruckus)'
+    )
+
+    parser.add_argument(
+        '--force',
+        action='store_true',
+        help='With --restore and an empty journal, still delete root qdiscs shaped like ours (1: netem/prio/mq/htb)'
+    )
+
+    parser.add_argument(
+        '--socket',
+        metavar='PATH',
+        help='Daemon socket (default: $RUNTIME_DIRECTORY/ruckus.sock or /run/bring-da-ruckus/ruckus.sock)'
+    )
+
+    parser.add_argument(
+        '--api',
+        metavar='[HOST:]PORT',
+        help='With --daemon, also serve the HTTP/JSON API and /events stream (host default: 127.0.0.1)'
+    )
+
+    parser.add_argument(
+        '--ctl',
+        nargs='+',
+        metavar='WORD',
+        help="Send one command to the daemon: apply CHAMBER [field=value ...] [force], "
+             "target [IP ...], scope SCOPE, clear, status - or a raw JSON request"
+    )
+
+    parser.add_argument(
+        '--profile',
+        action='append',
+        metavar='CHAMBER=TARGETS',
+        help='Run TARGETS (IPs, CIDRs, comma lists or files) in their own chamber, e.g. ninth=10.0.0.0/24 (repeatable)'
     )
 
     args = parser.parse_args()
 
-    # Check for sudo/root privileges (required for tc command)
-    if os.geteuid() != 0:
+    if args.ctl:
+        socket_path = args.socket or os.path.join(_runtime_dir(), 'ruckus.sock')
+        try:
+            reply = _daemon_request(_ctl_request(args.ctl), socket_path)
+        except (OSError, ValueError) as e:
+            print(f"❌ Daemon request failed ({socket_path}): {e}")
+            sys.exit(1)
+        for line in reply.get('output', []):
+            print(line)
+        if reply.get('cmd') == 'status':
+            print(json.dumps(reply['state'], indent=2, ensure_ascii=False))
+        if reply.get('ok'):
+            print(f"✅ {reply.get('cmd')} done in {reply.get('elapsed_ms')}ms")
+        else:
+            print(f"❌ {reply.get('cmd')} failed: {reply.get('error', 'see output above')}")
+        sys.exit(0 if reply.get('ok') else 1)
+
+    if args.chambers:
+        try:
+            loaded = ChaosChamber.load(args.chambers)
+        except (OSError, ValueError) as e:
+            print(f"❌ Invalid chambers file: {e}")
+            sys.exit(1)
+        print(f"🔱 Loaded {len(loaded)} chamber(s) from {args.chambers}: {', '.join(loaded)}")
+    for option, name in (('--level', args.level), ('--downlink-level', args.downlink_level)):
+        if name and ChaosChamber.by_name(name) is None:
+            parser.error(f"{option}: unknown chamber '{name}' (choose from {', '.join(ChaosChamber.REGISTRY)})")
+    if args.downlink_level and ChaosChamber.by_name(args.downlink_level)['packet_loss_pct'] == 100:
+        parser.error("--downlink-level: an outage chamber can't be used for downloads alone")
+
+    # Check for sudo/root privileges (required for tc command) - a dry run only reads
+    if os.geteuid() != 0 and not args.plan:
         print("❌ ERROR: This tool requires sudo/root privileges")
         print("   Traffic control (tc) commands need root access")
         print("   Please run with: sudo python3 bring-da-ruckus.py")
         sys.exit(1)
 
-    # Check if tc is available
-    try:
-        subprocess.run(["tc", "-Version"], capture_output=True, check=True)
-    except (subprocess.CalledProcessError, FileNotFoundError):
-        print("❌ ERROR: tc (traffic control) command not found")
-        print("   Please install iproute2: sudo apt-get install iproute2")
-        sys.exit(1)
+    # Check if tc is available - only mandatory when rtnetlink is off the table
+    if not shutil.which("tc"):
+        if args.backend == 'tc':
+            print("❌ ERROR: tc (traffic control) command not found")
+            print("   Please install iproute2: sudo apt-get install iproute2")
+            sys.exit(1)
+        print("⚠️  tc not found - using the native rtnetlink backend only")
+
+    if args.restore:
+        sys.exit(0 if restore(args.socket, args.interface, args.force, args.journal, not args.no_daemon) else 1)
 
     # Create ruckus instance
     ruckus = NetworkRuckus(
-        interface=args.interface,
-        deadman_timeout=args.timeout
+        interface=None,
+        deadman_timeout=args.timeout,
+        backend=args.backend,
+        journal_path=args.journal or (None if args.daemon else _session_journal())
     )
 
-    if args.target:
-        ruckus.set_target(args.target)
+    if args.interface and not ruckus.set_interfaces(args.interface):
+        sys.exit(1)
+    ruckus.classifier = args.classifier
+    ruckus.multiqueue = args.multiqueue
+    if args.target and not ruckus.set_targets(args.target):
+        sys.exit(1)
+
+    # Per-target profiles all land in one tree, built once below
+    for profile in args.profile or []:
+        name, _, spec = profile.partition('=')
+        level = ChaosChamber.by_name(name)
+        if level is None or not spec or level['packet_loss_pct'] == 100:
+            print(f"❌ Invalid profile '{profile}' (use CHAMBER=TARGETS, any chamber but shaolin)")
+            sys.exit(1)
+        try:
+            for network in _parse_targets([spec]):
+                ruckus.profile_map[network] = level
+        except (OSError, ValueError) as e:
+            print(f"❌ Invalid target in profile '{profile}': {e}")
+            sys.exit(1)
+    if ruckus.profile_map:
+        ruckus.scope = 'profiles'
+
+    if args.ingress or args.downlink_level:
+        ruckus.ingress = True
+        ruckus.downlink_chamber = ChaosChamber.by_name(args.downlink_level) if args.downlink_level else None
+
+    initial = ChaosChamber.by_name(args.level or 'peace')
+    if args.delay_dist:
+        try:
+            initial = ruckus.learn_delay(args.delay_dist, initial, args.dist_target)
+        except (OSError, ValueError) as e:
+            print(f"❌ Invalid delay samples: {e}")
+            sys.exit(1)
+
+    if args.plan:
+        ruckus.show_plan(initial)
+        return
+
+    if args.daemon:
+        starting = args.level or ruckus.profile_map or args.downlink_level or args.delay_dist
+        api = None
+        if args.api:
+            host, _, port = args.api.rpartition(':')
+            api = (host.strip('[]') or '127.0.0.1', int(port))
+        ruckus.socket_path = args.socket
+        try:
+            RuckusDaemon(ruckus, args.socket, api).run(initial if starting else None)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        return
 
     # Apply initial chamber if specified
-    if args.level:
-        chamber_map = {
-            'peace': ChaosChamber.PEACE,
-            'first': ChaosChamber.FIRST,
-            'ninth': ChaosChamber.NINTH,
-            'eighteenth': ChaosChamber.EIGHTEENTH,
-            'thirtysixth': ChaosChamber.THIRTYSIXTH,
-            'shaolin': ChaosChamber.SHAOLIN
-        }
-        ruckus.apply_ruckus(chamber_map[args.level])
+    if args.level or ruckus.profile_map or args.downlink_level or args.delay_dist:
+        ruckus.apply_ruckus(initial)
+
+    if args.replay:
+        try:
+            replay = TraceReplay(ruckus, args.replay, initial,
+                                 args.replay_speed, args.replay_loop, args.replay_target)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"❌ Invalid trace: {e}")
+            sys.exit(1)
+        ruckus.deadman.start()
+        replay.run()
+        ruckus.deadman.stop()
+        return
+
+    if args.sweep:
+        ruckus.deadman.start()
+        try:
+            ruckus.sweep(initial, _parse_sweep(args.sweep), args.waveform,
+                         args.sweep_hz, args.sweep_period, args.sweep_duration)
+        except ValueError as e:
+            print(f"❌ Invalid sweep: {e}")
+        ruckus.clear_ruckus()
+        ruckus.deadman.stop()
+        return
+
+    if args.scenario:
+        try:
+            runner = ScenarioRunner(ruckus, args.scenario, args.scenario_log)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"❌ Invalid scenario: {e}")
+            sys.exit(1)
+        ruckus.deadman.start()
+        runner.run()
+        ruckus.deadman.stop()
+        return
 
     # Start interactive mode
     interactive_mode(ruckus)
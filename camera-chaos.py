@@ -2,8 +2,12 @@
 """
 Bring Da Ruckus - Camera Specific Edition
 Apply chaos ONLY to traffic from specific camera IP (simulates bad LAN/WiFi repeater)
+Uses nftables (a camera_input chain and camera_targets set in the shared
+bring_da_ruckus table) when nft is available, iptables otherwise
 """
 
+import argparse
+import shutil
 import subprocess
 import sys
 import os
@@ -17,9 +21,49 @@ def validate_ip(ip):
     parts = ip.split('.')
     return all(0 <= int(part) <= 255 for part in parts)
 
-def apply_camera_chaos(camera_ip, loss_percent):
-    """Apply packet loss only to traffic from camera"""
+NFT_TABLE = "inet bring_da_ruckus"
+
+def detect_backend():
+    """'nft' where nftables is usable (no iptables-nft translation per call), else 'iptables'"""
+    if shutil.which("nft"):
+        try:
+            if subprocess.run(["nft", "list", "tables"], capture_output=True).returncode == 0:
+                return "nft"
+        except OSError:
+            pass
+    return "iptables"
+
+def nft_camera_ruleset(camera_ips, loss_percent):
+    """nft -f lines replacing our chain and target set; loss_percent None removes them"""
+    lines = [f"add table {NFT_TABLE}",
+             f"add set {NFT_TABLE} camera_targets {{ type ipv4_addr ; }}",
+             f"flush set {NFT_TABLE} camera_targets",
+             f"add chain {NFT_TABLE} camera_input {{ type filter hook input priority 0 ; policy accept ; }}",
+             f"flush chain {NFT_TABLE} camera_input"]
+    if loss_percent is None:
+        # Chain before set - the set can only go once no rule references it
+        return lines + [f"delete chain {NFT_TABLE} camera_input", f"delete set {NFT_TABLE} camera_targets"]
+    # One set lookup per packet however many cameras are targeted
+    return lines + [
+        f"add element {NFT_TABLE} camera_targets {{ {', '.join(camera_ips)} }}",
+        f"add rule {NFT_TABLE} camera_input ip saddr @camera_targets "
+        f"numgen random mod 10000 < {round(loss_percent * 100)} drop",
+    ]
+
+def nft_commit(lines):
+    """Apply lines in one atomic nft -f transaction"""
+    subprocess.run(["nft", "-f", "-"], input="\n".join(lines) + "\n", text=True, check=True)
+
+def apply_camera_chaos(camera_ips, loss_percent, backend="iptables"):
+    """Apply packet loss only to traffic from the cameras"""
+    if backend == "nft":
+        # Replaces whatever chamber was active in the same transaction - no clear first
+        nft_commit(nft_camera_ruleset(camera_ips, loss_percent))
+        print_applied(camera_ips, loss_percent)
+        return
+
     chain = "CAMERA_CHAOS"
+    clear_camera_chaos(camera_ips, backend, quiet=True)  # Clear old first
 
     # Create chain
     subprocess.run(f"iptables -N {chain}", shell=True, stderr=subprocess.DEVNULL)
@@ -28,27 +72,43 @@ def apply_camera_chaos(camera_ip, loss_percent):
     # Drop packets from camera with probability
     probability = loss_percent / 100.0
     subprocess.run(
-        f"iptables -A {chain} -s {camera_ip} -m statistic --mode random --probability {probability} -j DROP",
+        f"iptables -A {chain} -s {','.join(camera_ips)} -m statistic --mode random --probability {probability} -j DROP",
         shell=True, check=True
     )
 
     # Apply to INPUT (packets coming from camera to Jetson)
     subprocess.run(f"iptables -I INPUT -j {chain}", shell=True, check=True)
+    print_applied(camera_ips, loss_percent)
 
-    print(f"\n✅ Applying {loss_percent}% packet loss to traffic FROM {camera_ip}")
+def print_applied(camera_ips, loss_percent):
+    """Report which camera link now has chaos"""
+    print(f"\n✅ Applying {loss_percent}% packet loss to traffic FROM {', '.join(camera_ips)}")
     print(f"   📹 Camera → Jetson link now has chaos")
     print(f"   🌐 Jetson → Server link is NORMAL")
 
-def clear_camera_chaos(camera_ip):
+def clear_camera_chaos(camera_ips, backend="iptables", quiet=False):
     """Clear all camera chaos rules"""
-    chain = "CAMERA_CHAOS"
-    subprocess.run(f"iptables -D INPUT -j {chain}", shell=True, stderr=subprocess.DEVNULL)
-    subprocess.run(f"iptables -F {chain}", shell=True, stderr=subprocess.DEVNULL)
-    subprocess.run(f"iptables -X {chain}", shell=True, stderr=subprocess.DEVNULL)
-    print(f"\n✅ Cleared all chaos for {camera_ip}")
-
-def show_status():
-    """Show current iptables rules"""
+    if backend == "nft":
+        try:
+            nft_commit(nft_camera_ruleset(camera_ips, None))
+        except subprocess.CalledProcessError:
+            print("\n⚠️  nft could not remove the camera chain - try: sudo nft delete table inet bring_da_ruckus")
+            return
+    else:
+        chain = "CAMERA_CHAOS"
+        subprocess.run(f"iptables -D INPUT -j {chain}", shell=True, stderr=subprocess.DEVNULL)
+        subprocess.run(f"iptables -F {chain}", shell=True, stderr=subprocess.DEVNULL)
+        subprocess.run(f"iptables -X {chain}", shell=True, stderr=subprocess.DEVNULL)
+    if not quiet:
+        print(f"\n✅ Cleared all chaos for {', '.join(camera_ips)}")
+
+def show_status(backend="iptables"):
+    """Show current camera chaos rules"""
+    if backend == "nft":
+        print("\n📊 Current nftables rules for camera:")
+        subprocess.run(f"nft list chain {NFT_TABLE} camera_input 2>/dev/null && "
+                       f"nft list set {NFT_TABLE} camera_targets 2>/dev/null || echo 'No chaos active'", shell=True)
+        return
     print("\n📊 Current iptables rules for camera:")
     subprocess.run(f"iptables -L CAMERA_CHAOS -n -v 2>/dev/null || echo 'No chaos active'", shell=True)
 
@@ -67,10 +127,11 @@ def show_menu():
     print("║  [s] Show Status      [c] Clear All      [q] Quit             ║")
     print("╚════════════════════════════════════════════════════════════════╝")
 
-def interactive_mode(camera_ip):
+def interactive_mode(camera_ips, backend="iptables"):
     """Run interactive mode"""
     print("\n🎬 Interactive mode - Camera Chaos")
-    print(f"🎯 Target: {camera_ip}")
+    print(f"🎯 Target: {', '.join(camera_ips)}")
+    print(f"⚙️  Backend: {'nftables' if backend == 'nft' else 'iptables'}")
     print(f"📹 Affecting: Camera → Jetson only")
     print(f"🌐 Normal: Jetson → Server (your stream upload is fine)")
 
@@ -89,29 +150,34 @@ def interactive_mode(camera_ip):
 
             if choice == 'q':
                 print("\n👋 Exiting and cleaning up...")
-                clear_camera_chaos(camera_ip)
+                clear_camera_chaos(camera_ips, backend)
                 break
 
             elif choice == 's':
-                show_status()
+                show_status(backend)
 
             elif choice == 'c':
-                clear_camera_chaos(camera_ip)
+                clear_camera_chaos(camera_ips, backend)
 
             elif choice in chambers:
                 name, loss = chambers[choice]
                 print(f"\n🥋 Applying: {name}")
-                clear_camera_chaos(camera_ip)  # Clear old first
-                apply_camera_chaos(camera_ip, loss)
+                apply_camera_chaos(camera_ips, loss, backend)
 
             else:
                 print("❌ Invalid choice")
 
     except KeyboardInterrupt:
         print("\n\n⚠️  Interrupted! Cleaning up...")
-        clear_camera_chaos(camera_ip)
+        clear_camera_chaos(camera_ips, backend)
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Camera Chaos - packet loss for traffic from specific cameras")
+    parser.add_argument("camera_ip", nargs="*", help="Camera IP address(es) - prompted for if omitted")
+    parser.add_argument("--backend", choices=["auto", "nft", "iptables"], default="auto",
+                        help="Firewall backend (default: nft when available, else iptables)")
+    args = parser.parse_args()
+
     # Check for root
     if os.geteuid() != 0:
         print("❌ This tool requires root privileges")
@@ -128,20 +194,23 @@ if __name__ == "__main__":
     print("████████████████████████████████████████████████████████████████")
     print()
 
-    # Get camera IP
-    if len(sys.argv) > 1:
-        camera_ip = sys.argv[1]
+    # Get camera IP(s)
+    if args.camera_ip:
+        camera_ips = args.camera_ip
     else:
-        camera_ip = input("📹 Enter camera IP address: ").strip()
-        if not camera_ip:
+        camera_ips = input("📹 Enter camera IP address(es), comma separated: ").replace(",", " ").split()
+        if not camera_ips:
             print("❌ No IP address provided")
             sys.exit(1)
-    
-    # Validate IP address
-    if not validate_ip(camera_ip):
-        print(f"❌ Invalid IP address: {camera_ip}")
-        print("   Please enter a valid IPv4 address (e.g., 192.168.1.100)")
-        sys.exit(1)
+
+    # Validate IP addresses
+    for camera_ip in camera_ips:
+        if not validate_ip(camera_ip):
+            print(f"❌ Invalid IP address: {camera_ip}")
+            print("   Please enter a valid IPv4 address (e.g., 192.168.1.100)")
+            sys.exit(1)
+
+    backend = detect_backend() if args.backend == "auto" else args.backend
 
     # Wu-Tang quote
     print()
@@ -150,4 +219,4 @@ if __name__ == "__main__":
     input("Press ENTER to continue...")
 
     # Start interactive mode
-    interactive_mode(camera_ip)
\ No newline at end of file
+    interactive_mode(camera_ips, backend)
@@ -0,0 +1,539 @@
+#!/usr/bin/env python3
+"""
+Delay The Ruckus - NFQUEUE Impairment Engine
+Latency, jitter and bandwidth limiting in userspace for kernels without netem
+(Jetson, embedded devices, minimal kernels) - what the iptables edition can't do
+
+Packets on the interface go through NFQUEUE into this process, wait in a timer heap
+and are released by a delay/jitter/rate model on the monotonic clock. Verdicts go
+back in batches. The rules use --queue-bypass and the queues fail open, so if the
+engine dies or falls behind, traffic flows undelayed instead of being blackholed.
+
+Pair it with bring-da-ruckus-iptables.py for packet loss.
+"""
+
+import argparse
+import bisect
+import heapq
+import os
+import random
+import re
+import select
+import signal
+import socket
+import struct
+import subprocess
+import sys
+import time
+from typing import Optional
+
+# nfnetlink_queue (linux/netfilter/nfnetlink_queue.h) - spoken directly, stdlib only
+NETLINK_NETFILTER = 12
+SOL_NETLINK = 270
+NETLINK_NO_ENOBUFS = 5
+SO_RCVBUFFORCE = 33
+NLMSG_ERROR = 2
+NLM_F_REQUEST = 1
+NLM_F_ACK = 4
+NFNL_SUBSYS_QUEUE = 3
+NFQNL_MSG_PACKET = 0
+NFQNL_MSG_VERDICT = 1
+NFQNL_MSG_CONFIG = 2
+NFQNL_MSG_VERDICT_BATCH = 3
+NFQNL_CFG_CMD_BIND = 1
+NFQNL_CFG_CMD_UNBIND = 2
+NFQNL_COPY_PACKET = 2
+NFQA_CFG_CMD = 1
+NFQA_CFG_PARAMS = 2
+NFQA_CFG_QUEUE_MAXLEN = 3
+NFQA_CFG_MASK = 4
+NFQA_CFG_FLAGS = 5
+NFQA_CFG_F_FAIL_OPEN = 1    # queue full: accept instead of drop
+NFQA_CFG_F_GSO = 4          # take GSO packets whole - no segmenting for our sake
+NFQA_PACKET_HDR = 1
+NFQA_VERDICT_HDR = 2
+NFQA_PAYLOAD = 10
+NFQA_CAP_LEN = 16
+NF_ACCEPT = 1
+
+RULE_TAG = "bring-da-ruckus:delay"
+CHAIN_IN = "DELAY_DA_RUCKUS_IN"
+CHAIN_OUT = "DELAY_DA_RUCKUS_OUT"
+
+
+def _attr(kind: int, payload: bytes) -> bytes:
+    """One netlink attribute, padded to 4 bytes"""
+    length = 4 + len(payload)
+    return struct.pack('=HH', length, kind) + payload + b'\0' * (-length % 4)
+
+
+class NfQueue:
+    """Minimal nfnetlink_queue client on a raw netlink socket"""
+
+    VERDICTS_PER_SEND = 1024    # 32 bytes each - one datagram stays well under the socket buffer
+
+    def __init__(self, queue_nums, maxlen: int = 2048, copy_range: int = 64):
+        self.queue_nums = list(queue_nums)
+        self.seq = 0
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, NETLINK_NETFILTER)
+        try:
+            self.sock.setsockopt(socket.SOL_SOCKET, SO_RCVBUFFORCE, 8 << 20)
+        except OSError:
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 8 << 20)
+        # An overrun loses notifications, not packets - they stay queued and a batch verdict frees them
+        self.sock.setsockopt(SOL_NETLINK, NETLINK_NO_ENOBUFS, 1)
+        self.sock.bind((0, 0))
+        self.buf = bytearray(1 << 18)
+        flags = struct.pack('!I', NFQA_CFG_F_FAIL_OPEN | NFQA_CFG_F_GSO)
+        for queue_num in self.queue_nums:
+            self._config(queue_num, _attr(NFQA_CFG_CMD, struct.pack('!BxH', NFQNL_CFG_CMD_BIND, socket.AF_INET)))
+            # Only the first bytes of each packet - its real length comes in NFQA_CAP_LEN
+            self._config(queue_num,
+                         _attr(NFQA_CFG_PARAMS, struct.pack('!IB', copy_range, NFQNL_COPY_PACKET))
+                         + _attr(NFQA_CFG_QUEUE_MAXLEN, struct.pack('!I', maxlen))
+                         + _attr(NFQA_CFG_MASK, flags) + _attr(NFQA_CFG_FLAGS, flags))
+
+    def _message(self, msg_type: int, queue_num: int, attrs: bytes, flags: int = NLM_F_REQUEST) -> bytes:
+        self.seq += 1
+        body = struct.pack('=BBH', socket.AF_UNSPEC, 0, socket.htons(queue_num)) + attrs
+        return struct.pack('=IHHII', 16 + len(body), (NFNL_SUBSYS_QUEUE << 8) | msg_type,
+                           flags, self.seq, 0) + body
+
+    def _config(self, queue_num: int, attrs: bytes):
+        """Send a config message and wait for its ack"""
+        self.sock.send(self._message(NFQNL_MSG_CONFIG, queue_num, attrs, NLM_F_REQUEST | NLM_F_ACK))
+        reply = self.sock.recv(65536)
+        if struct.unpack_from('=H', reply, 4)[0] == NLMSG_ERROR:
+            error = struct.unpack_from('=i', reply, 16)[0]
+            if error:
+                raise OSError(-error, f"NFQUEUE {queue_num}: {os.strerror(-error)}")
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def receive(self):
+        """Drain the socket without blocking: [(queue num, packet id, length)]"""
+        packets = []
+        buf, unpack_from = self.buf, struct.unpack_from
+        while True:
+            try:
+                n = self.sock.recv_into(buf, len(buf), socket.MSG_DONTWAIT)
+            except (BlockingIOError, InterruptedError):
+                return packets
+            offset = 0
+            while offset + 20 <= n:
+                length, kind = unpack_from('=IH', buf, offset)
+                if length < 16:
+                    break
+                if kind == (NFNL_SUBSYS_QUEUE << 8) | NFQNL_MSG_PACKET:
+                    queue_num = unpack_from('!H', buf, offset + 18)[0]
+                    pos, end = offset + 20, offset + length
+                    packet_id = cap_len = None
+                    payload_len = 0
+                    while pos + 4 <= end:
+                        attr_len, attr_type = unpack_from('=HH', buf, pos)
+                        if attr_len < 4:
+                            break
+                        attr_type &= 0x3fff
+                        if attr_type == NFQA_PACKET_HDR:
+                            packet_id = unpack_from('!I', buf, pos + 4)[0]
+                        elif attr_type == NFQA_CAP_LEN:
+                            cap_len = unpack_from('!I', buf, pos + 4)[0]
+                        elif attr_type == NFQA_PAYLOAD:
+                            payload_len = attr_len - 4
+                        pos += (attr_len + 3) & ~3
+                    if packet_id is not None:
+                        packets.append((queue_num, packet_id, cap_len or payload_len))
+                offset += (length + 3) & ~3
+
+    def accept(self, verdicts):
+        """Send (queue num, packet id, batch) accept verdicts, many per datagram
+
+        A batch verdict accepts every packet of that queue up to and including the id.
+        """
+        messages = [self._message(NFQNL_MSG_VERDICT_BATCH if batch else NFQNL_MSG_VERDICT, queue_num,
+                                  _attr(NFQA_VERDICT_HDR, struct.pack('!II', NF_ACCEPT, packet_id)))
+                    for queue_num, packet_id, batch in verdicts]
+        for i in range(0, len(messages), self.VERDICTS_PER_SEND):
+            self.sock.send(b''.join(messages[i:i + self.VERDICTS_PER_SEND]))
+
+    def close(self):
+        for queue_num in self.queue_nums:
+            try:
+                self._config(queue_num, _attr(NFQA_CFG_CMD, struct.pack('!BxH', NFQNL_CFG_CMD_UNBIND, socket.AF_INET)))
+            except OSError:
+                pass
+        self.sock.close()
+
+
+class ImpairmentModel:
+    """When each packet of one direction leaves: delay and jitter, then serialised at the rate"""
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, rate_kbps: float = 0,
+                 reorder: bool = False, seed: Optional[int] = None):
+        self.latency = latency_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.rate_bps = rate_kbps * 1000.0
+        self.reorder = reorder
+        self.random = random.Random(seed)
+        self.link_free = 0.0        # when the emulated link finishes its last packet
+        self.last_release = 0.0
+
+    def release_time(self, arrival: float, size: int) -> float:
+        """Monotonic time the packet that arrived at arrival should be let go"""
+        release = arrival + self.latency
+        if self.jitter:
+            # Normal around the latency like netem, never before the packet arrived
+            release = max(arrival, release + self.random.gauss(0, self.jitter))
+        if self.rate_bps:
+            self.link_free = max(self.link_free, release) + size * 8 / self.rate_bps
+            release = self.link_free
+        if not self.reorder:
+            # Keep arrival order - which also lets one batch verdict release a whole run
+            release = max(release, self.last_release)
+            self.last_release = release
+        return release
+
+    def describe(self) -> str:
+        rate = f"{self.rate_bps / 1000:g} kbps" if self.rate_bps else "unlimited"
+        return f"latency {self.latency * 1000:g}ms, jitter {self.jitter * 1000:g}ms, rate {rate}"
+
+
+class DelayEngine:
+    """Timer heap between NFQUEUE and the verdicts, on the monotonic clock"""
+
+    # Lateness histogram bucket edges in seconds: quarter-octave steps from 1µs to ~16s
+    LATENESS_EDGES = [1e-6 * 2 ** (i / 4) for i in range(97)]
+
+    def __init__(self, nfq: NfQueue, models: dict):
+        self.nfq = nfq
+        self.models = models        # queue num -> ImpairmentModel
+        self.heap = []              # (release time, queue num, packet id)
+        self.running = False
+        self.received = 0
+        self.released = 0
+        self.batches = 0
+        # Release lateness (when the verdict went out minus when it was due) as a fixed
+        # histogram plus running totals, so a status line costs the same at any packet count
+        self.lateness = [0] * (len(self.LATENESS_EDGES) + 1)
+        self.lateness_count = 0
+        self.lateness_total = 0.0
+        self.max_lateness = 0.0
+
+    def run(self, until: float, status_every: float = 0, on_status=None):
+        """Serve packets until the monotonic deadline, or until stop()"""
+        self.running = True
+        heap, models, monotonic = self.heap, self.models, time.monotonic
+        next_status = monotonic() + status_every if status_every else None
+        while self.running:
+            now = monotonic()
+            if now >= until:
+                break
+            wait = min(heap[0][0] - now if heap else 0.5, until - now, 0.5)
+            try:
+                ready, _, _ = select.select([self.nfq], [], [], max(wait, 0))
+            except InterruptedError:
+                continue
+            if ready:
+                now = monotonic()
+                for queue_num, packet_id, size in self.nfq.receive():
+                    heapq.heappush(heap, (models[queue_num].release_time(now, size), queue_num, packet_id))
+                    self.received += 1
+            self._release(monotonic())
+            if next_status and monotonic() >= next_status:
+                next_status += status_every
+                on_status(self)
+
+    def _release(self, now: float, everything: bool = False):
+        """Verdict every packet due by now - in-order queues as a single batch verdict each"""
+        heap = self.heap
+        due = []
+        while heap and (everything or heap[0][0] <= now):
+            due.append(heapq.heappop(heap))
+        if not due:
+            return
+        verdicts, last = [], {}
+        for release, queue_num, packet_id in due:
+            if self.models[queue_num].reorder:
+                verdicts.append((queue_num, packet_id, False))
+            else:
+                last[queue_num] = packet_id
+        verdicts += [(queue_num, packet_id, True) for queue_num, packet_id in last.items()]
+        self.nfq.accept(verdicts)
+        sent = time.monotonic()
+        if not everything:
+            histogram, edges = self.lateness, self.LATENESS_EDGES
+            for release, _, _ in due:
+                histogram[bisect.bisect_left(edges, sent - release)] += 1
+                self.lateness_total += sent - release
+            self.lateness_count += len(due)
+            self.max_lateness = max(self.max_lateness, sent - due[0][0])
+        self.released += len(due)
+        self.batches += 1
+
+    def stop(self):
+        self.running = False
+
+    def drain(self):
+        """Let every held packet go now - on the way out nothing stays queued"""
+        self._release(time.monotonic(), everything=True)
+
+    def _lateness_quantile(self, q: float) -> float:
+        """Upper edge of the histogram bucket holding quantile q (capped at the max seen)"""
+        rank, seen = q * self.lateness_count, 0
+        for bucket, count in enumerate(self.lateness):
+            seen += count
+            if seen >= rank and count:
+                if bucket < len(self.LATENESS_EDGES):
+                    return min(self.LATENESS_EDGES[bucket], self.max_lateness)
+                break
+        return self.max_lateness
+
+    def lateness_summary(self) -> str:
+        if not self.lateness_count:
+            return "no packets released yet"
+        return (f"mean {self.lateness_total / self.lateness_count * 1e6:.0f}µs  "
+                f"p50 {self._lateness_quantile(0.5) * 1e6:.0f}µs  "
+                f"p99 {self._lateness_quantile(0.99) * 1e6:.0f}µs  max {self.max_lateness * 1e3:.2f}ms")
+
+
+def iptables_restore(lines):
+    """Commit filter-table lines in one iptables-restore --noflush transaction"""
+    script = '*filter\n' + '\n'.join(lines) + '\nCOMMIT\n'
+    try:
+        result = subprocess.run(["iptables-restore", "--noflush"], input=script, capture_output=True, text=True)
+    except OSError as e:
+        raise RuntimeError(str(e))
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f"iptables-restore exit status {result.returncode}")
+
+
+def owned_rules():
+    """(-D lines for every rule of ours iptables-save reports, our chains that exist)"""
+    try:
+        result = subprocess.run(["iptables-save", "-t", "filter"], capture_output=True, text=True)
+    except OSError as e:
+        raise RuntimeError(str(e))
+    deletes, chains = [], []
+    for line in result.stdout.splitlines():
+        if line.startswith(f":{CHAIN_IN} ") or line.startswith(f":{CHAIN_OUT} "):
+            chains.append(line[1:].split()[0])
+        elif line.startswith('-A ') and (RULE_TAG in line or re.search(rf" -j ({CHAIN_IN}|{CHAIN_OUT})$", line)) \
+                and not line.startswith((f"-A {CHAIN_IN} ", f"-A {CHAIN_OUT} ")):
+            deletes.append('-D ' + line[3:])
+    return deletes, chains
+
+
+def install_rules(interface: str, queue_in: int, queue_out: int, exempt_ips):
+    """Steer the interface through our queues in one transaction, sweeping leftovers of a crashed run"""
+    deletes, _ = owned_rules()
+    lines = [f":{CHAIN_IN} - [0:0]", f":{CHAIN_OUT} - [0:0]"] + deletes
+    for chain, queue_num in ((CHAIN_IN, queue_in), (CHAIN_OUT, queue_out)):
+        # SSH and the operator's IP never wait in our heap - a wedged engine can't lock anyone out
+        lines += [f"-A {chain} -p tcp --dport 22 -j RETURN", f"-A {chain} -p tcp --sport 22 -j RETURN"]
+        for ip in exempt_ips:
+            lines += [f"-A {chain} -s {ip} -j RETURN", f"-A {chain} -d {ip} -j RETURN"]
+        # --queue-bypass: with no engine bound, packets are accepted rather than dropped
+        lines.append(f"-A {chain} -j NFQUEUE --queue-num {queue_num} --queue-bypass")
+    tag = f"-m comment --comment {RULE_TAG}"
+    lines += [f"-I INPUT -i {interface} {tag} -j {CHAIN_IN}",
+              f"-I FORWARD -i {interface} {tag} -j {CHAIN_IN}",
+              f"-I OUTPUT -o {interface} {tag} -j {CHAIN_OUT}",
+              f"-I FORWARD -o {interface} {tag} -j {CHAIN_OUT}"]
+    iptables_restore(lines)
+
+
+def remove_rules():
+    """Delete every rule and chain of ours in one transaction"""
+    deletes, chains = owned_rules()
+    lines = deletes + [f"-F {chain}" for chain in chains] + [f"-X {chain}" for chain in chains]
+    if lines:
+        iptables_restore(lines)
+
+
+def detect_interface():
+    """Auto-detect the primary network interface"""
+    try:
+        result = subprocess.run(["ip", "route", "show", "default"], capture_output=True, text=True, check=True)
+        return result.stdout.split()[4]
+    except (OSError, IndexError, subprocess.CalledProcessError):
+        return "eth0"
+
+
+def detect_ssh_client_ip():
+    """IP of the SSH client, exempted from the delay"""
+    ssh_client = os.environ.get('SSH_CLIENT', '').split()
+    return ssh_client[0] if ssh_client else None
+
+
+def queue_counters(queue_num: int):
+    """(queue drops, netlink drops) for queue_num from /proc/net/netfilter/nfnetlink_queue"""
+    try:
+        with open('/proc/net/netfilter/nfnetlink_queue') as f:
+            for line in f:
+                fields = line.split()
+                if fields and int(fields[0]) == queue_num:
+                    return int(fields[5]), int(fields[6])
+    except (OSError, ValueError, IndexError):
+        pass
+    return 0, 0
+
+
+# Loopback UDP flood for --bench: blocks on its socket buffer while the engine holds
+# packets, so it offers exactly as much as the engine can take
+BENCH_SENDER = """
+import socket, sys, time
+port, end = int(sys.argv[1]), time.monotonic() + float(sys.argv[2])
+sink = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+sink.bind(('127.0.0.1', port))
+sink.setblocking(False)
+out = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+payload = b'ruckus' * 10
+while time.monotonic() < end:
+    for _ in range(64):
+        out.sendto(payload, ('127.0.0.1', port))
+    try:
+        while True:
+            sink.recv(2048)
+    except BlockingIOError:
+        pass
+"""
+
+
+def benchmark(args) -> int:
+    """Flood loopback through the engine: sustained pps and added scheduling error on this board"""
+    model = ImpairmentModel(args.latency, args.jitter, args.rate, args.reorder, seed=1)
+    port = 47474
+    print(f"\n📊 NFQUEUE engine benchmark - {args.bench:g}s of loopback UDP, {model.describe()}")
+    nfq = NfQueue([args.queue_num], maxlen=args.queue_maxlen)
+    rule = (f"OUTPUT -o lo -p udp --dport {port} -m comment --comment {RULE_TAG} "
+            f"-j NFQUEUE --queue-num {args.queue_num} --queue-bypass")
+    engine = DelayEngine(nfq, {args.queue_num: model})
+    sender = None
+    try:
+        iptables_restore([f"-I {rule}"])
+    except RuntimeError:
+        nfq.close()
+        raise
+    try:
+        drops_before = queue_counters(args.queue_num)
+        sender = subprocess.Popen([sys.executable, '-c', BENCH_SENDER, str(port), str(args.bench)])
+        start = time.monotonic()
+        engine.run(until=start + args.bench)
+        elapsed = time.monotonic() - start
+    finally:
+        try:
+            iptables_restore([f"-D {rule}"])
+        except RuntimeError as e:
+            print(f"   ⚠️  Could not remove the benchmark rule: {e}", file=sys.stderr)
+        engine.drain()
+        nfq.close()
+        if sender:
+            sender.wait()
+    queue_drops, netlink_drops = (after - before for after, before
+                                  in zip(queue_counters(args.queue_num), drops_before))
+    print(f"   ⚡ Sustained: {engine.released / elapsed:,.0f} pps "
+          f"({engine.released:,} packets, {engine.released / max(engine.batches, 1):.1f} per verdict batch)")
+    print(f"   ⏱️  Scheduling error: {engine.lateness_summary()}")
+    print(f"   📉 Kernel: {queue_drops} queue overflow(s) (failed open), {netlink_drops} netlink drop(s)")
+    return 0
+
+
+def show_status(engine: DelayEngine):
+    """One status line: throughput, packets held, lateness"""
+    print(f"   📊 {engine.released:,} released, {len(engine.heap)} held, lateness {engine.lateness_summary()}")
+
+
+def main():
+    """Main entry point"""
+    parser = argparse.ArgumentParser(
+        description='Delay The Ruckus - NFQUEUE latency/jitter/rate engine for kernels without netem')
+    parser.add_argument('--interface', '-i', help='Interface to impair (default: the default route\'s)')
+    parser.add_argument('--latency', type=float, default=0, metavar='MS', help='Added one-way delay')
+    parser.add_argument('--jitter', type=float, default=0, metavar='MS', help='Standard deviation of the delay')
+    parser.add_argument('--rate', type=float, default=0, metavar='KBPS',
+                        help='Bandwidth limit per direction (default: unlimited)')
+    parser.add_argument('--reorder', action='store_true',
+                        help='Let jitter reorder packets (verdicts then go one by one instead of in batches)')
+    parser.add_argument('--timeout', type=float, default=5, metavar='MINUTES',
+                        help="Deadman's switch: remove everything after this long (default: 5)")
+    parser.add_argument('--queue-num', type=int, default=4242, metavar='N',
+                        help='NFQUEUE number for received traffic; N+1 carries sent traffic (default: 4242)')
+    parser.add_argument('--queue-maxlen', type=int, default=2048, metavar='PACKETS',
+                        help='Packets held per queue before it fails open (default: 2048)')
+    parser.add_argument('--bench', type=float, nargs='?', const=10, metavar='SECONDS',
+                        help='Benchmark the engine on loopback instead (default: 10 seconds)')
+    args = parser.parse_args()
+
+    if os.geteuid() != 0:
+        print("❌ This tool requires root privileges")
+        print("   Please run with sudo:")
+        print(f"   sudo python3 {sys.argv[0]}")
+        sys.exit(1)
+
+    print("\n🥷 DELAY THE RUCKUS - NFQUEUE Impairment Engine")
+    print("   ⏳ Every packet waits its turn, like a student at the Shaolin gate\n")
+
+    try:
+        if args.bench is not None:
+            sys.exit(benchmark(args))
+    except OSError as e:
+        print(f"❌ NFQUEUE unavailable ({e}) - is nfnetlink_queue / xt_NFQUEUE in this kernel?")
+        sys.exit(1)
+    except RuntimeError as e:
+        print(f"❌ Could not install the benchmark rule: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if not (args.latency or args.jitter or args.rate):
+        parser.error("nothing to do - give --latency, --jitter and/or --rate (or --bench)")
+
+    interface = args.interface or detect_interface()
+    ssh_client_ip = detect_ssh_client_ip()
+    queue_in, queue_out = args.queue_num, args.queue_num + 1
+    # One model per direction - each is its own emulated link
+    models = {queue_in: ImpairmentModel(args.latency, args.jitter, args.rate, args.reorder),
+              queue_out: ImpairmentModel(args.latency, args.jitter, args.rate, args.reorder)}
+
+    try:
+        nfq = NfQueue([queue_in, queue_out], maxlen=args.queue_maxlen)
+    except OSError as e:
+        print(f"❌ NFQUEUE unavailable ({e}) - is nfnetlink_queue / xt_NFQUEUE in this kernel?")
+        sys.exit(1)
+    engine = DelayEngine(nfq, models)
+
+    def stop(sig, frame):
+        engine.stop()
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    status = 0
+    try:
+        install_rules(interface, queue_in, queue_out, [ssh_client_ip] if ssh_client_ip else [])
+        print(f"🔧 Interface: {interface} (queues {queue_in} in, {queue_out} out)")
+        print(f"⚙️  Model: {models[queue_in].describe()}")
+        if ssh_client_ip:
+            print(f"🛡️  SSH and {ssh_client_ip} exempt from the delay")
+        else:
+            print(f"🛡️  SSH (port 22) exempt from the delay")
+        print(f"⏰ Deadman's switch: everything removed after {args.timeout:g} minutes (Ctrl+C to stop sooner)")
+        print(f"🪂 Fail-open: if this process dies, traffic bypasses the queues undelayed\n")
+        engine.run(until=time.monotonic() + args.timeout * 60, status_every=5, on_status=show_status)
+    except RuntimeError as e:
+        print(f"❌ Could not install the NFQUEUE rules: {e}", file=sys.stderr)
+        status = 1
+    finally:
+        print("\n🧹 Removing the NFQUEUE rules and releasing held packets...")
+        try:
+            remove_rules()
+        except RuntimeError as e:
+            print(f"   ⚠️  {e} - run emergency-recovery.sh", file=sys.stderr)
+        engine.drain()
+        nfq.close()
+        print(f"   ✅ {engine.released:,} packets delayed, lateness {engine.lateness_summary()}")
+        print("   ☯️  Peace has been restored to the chambers")
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    main()
@@ -13,9 +13,9 @@ echo "⚠️  EMERGENCY RECOVERY - Bring Da Ruckus"
 echo "======================================================================"
 echo ""
 echo "This script will:"
-echo "  1. Clear all tc (traffic control) rules"
-echo "  2. Remove all iptables DROP rules"
-echo "  3. Remove SSH protection iptables rules"
+echo "  1. Remove exactly what bring-da-ruckus journaled (tc, IFBs, iptables, NAT, sysctl)"
+echo "  2. Fall back to removing only bring-da-ruckus's own tc and iptables rules"
+echo "  3. Leave every other firewall rule alone"
 echo "  4. Restore network to normal state"
 echo ""
 echo "Press ENTER to continue or Ctrl+C to abort..."
@@ -35,31 +35,93 @@ fi
 echo "   Found: $INTERFACE"
 echo ""
 
-echo "🧹 Clearing tc rules on $INTERFACE..."
-tc qdisc del dev "$INTERFACE" root 2>/dev/null || echo "   (No tc root rules found)"
-tc filter del dev "$INTERFACE" 2>/dev/null || echo "   (No tc filters found)"
-echo "   ✅ tc rules cleared"
-echo ""
+SCRIPT_DIR=$(cd "$(dirname "$0")" && pwd)
+RUNTIME="${RUNTIME_DIRECTORY:-/run/bring-da-ruckus}"
+
+echo "📓 Restoring from the state journals (daemon, then interactive sessions)..."
+if [ -f "$SCRIPT_DIR/bring-da-ruckus.py" ] && \
+        python3 "$SCRIPT_DIR/bring-da-ruckus.py" --restore --interface "$INTERFACE" && \
+        python3 "$SCRIPT_DIR/bring-da-ruckus.py" --restore --no-daemon --interface "$INTERFACE"; then
+    echo "   ✅ Journaled objects removed"
+    echo ""
+else
+    echo "   ⚠️  Journal restore unavailable - removing bring-da-ruckus rules by hand"
+    echo ""
+
+    echo "🧹 Clearing tc rules on $INTERFACE..."
+    tc qdisc del dev "$INTERFACE" root 2>/dev/null || echo "   (No tc root rules found)"
+    tc qdisc del dev "$INTERFACE" clsact 2>/dev/null || true
+    echo "   ✅ tc rules cleared"
+    echo ""
 
-echo "🧹 Clearing iptables rules..."
-# Flush all chains
-iptables -F 2>/dev/null || echo "   (Could not flush chains)"
+    echo "🧹 Clearing bring-da-ruckus iptables rules..."
+    # Rules the journal lists (targeted DROPs, management exemptions, NAT) - nothing else
+    for JOURNAL in "$RUNTIME/journal.json" "$RUNTIME/session-journal.json"; do
+        [ -f "$JOURNAL" ] || continue
+        python3 -c 'import json, sys
+journal = json.load(open(sys.argv[1]))
+for table in ("filter", "nat"):
+    for rule in journal.get(table, {}):
+        print(table, rule)' "$JOURNAL" 2>/dev/null | while read -r table rule; do
+            iptables -t "$table" -D $rule 2>/dev/null && echo "   Removed: $rule"
+        done
+    done
+
+    # SSH protection rules (older versions could insert them more than once)
+    while iptables -D INPUT -p tcp --dport 22 -j ACCEPT 2>/dev/null; do :; done
+    while iptables -D OUTPUT -p tcp --sport 22 -j ACCEPT 2>/dev/null; do :; done
+
+    echo "   ✅ bring-da-ruckus iptables rules cleared (host firewall untouched)"
+    echo ""
+fi
 
-# Remove SSH protection rules specifically
-iptables -D INPUT -p tcp --dport 22 -j ACCEPT 2>/dev/null || echo "   (No SSH INPUT rule)"
-iptables -D OUTPUT -p tcp --sport 22 -j ACCEPT 2>/dev/null || echo "   (No SSH OUTPUT rule)"
+echo "🧹 Clearing the iptables edition's chain and DROP rules..."
+# Every rule the iptables edition and delay-the-ruckus create carries a bring-da-ruckus:<tag> comment
+iptables-save -t filter | grep -E -- '--comment "?bring-da-ruckus:' | sed 's/^-A /-D /' | \
+    while read -r rule; do
+        eval iptables "$rule" 2>/dev/null && echo "   Removed: $rule"
+    done
+# Untagged rules from older versions
+# iptables edition: the jumps to its chain, the chain, and its interface DROPs
+for rule in "INPUT -i $INTERFACE" "OUTPUT -o $INTERFACE" "FORWARD -i $INTERFACE" "FORWARD -o $INTERFACE"; do
+    iptables -D $rule -j BRING_DA_RUCKUS 2>/dev/null || true
+done
+iptables -F BRING_DA_RUCKUS 2>/dev/null && iptables -X BRING_DA_RUCKUS 2>/dev/null || true
+for chain in INPUT OUTPUT; do
+    iptables -S "$chain" | grep -E "^-A $chain -[io] $INTERFACE( -m time --datestop [^ ]+)? -j DROP$" | \
+        sed 's/^-A /-D /' | while read -r rule; do
+            iptables $rule 2>/dev/null && echo "   Removed: $rule"
+        done
+done
+echo "   ✅ Done (host firewall untouched)"
+echo ""
 
-# List all rules with line numbers and delete DROP rules
-echo "   Checking for remaining DROP rules..."
-iptables -L INPUT -n --line-numbers | grep DROP | awk '{print $1}' | tac | while read line_num; do
-    iptables -D INPUT "$line_num" 2>/dev/null && echo "   Removed INPUT DROP rule #$line_num"
+echo "🧹 Removing delay-the-ruckus NFQUEUE chains..."
+# Their tagged jumps went with the bring-da-ruckus: rules above
+for chain in DELAY_DA_RUCKUS_IN DELAY_DA_RUCKUS_OUT; do
+    iptables -F "$chain" 2>/dev/null && iptables -X "$chain" 2>/dev/null && echo "   Removed: $chain"
 done
+echo ""
 
-iptables -L OUTPUT -n --line-numbers | grep DROP | awk '{print $1}' | tac | while read line_num; do
-    iptables -D OUTPUT "$line_num" 2>/dev/null && echo "   Removed OUTPUT DROP rule #$line_num"
+echo "🧹 Removing the iptables edition's tc loss filters (our prefs, tagged with our cookie)..."
+# prefs 0xC100-0xC181 and the hex of "bring-da-ruckus" - pref-less filters from other tools are left alone
+for direction in ingress egress; do
+    tc filter show dev "$INTERFACE" "$direction" 2>/dev/null | \
+        awk '/^filter/ { for (i = 1; i < NF; i++) if ($i == "pref") pref = $(i + 1) }
+             $1 == "cookie" && $2 == "6272696e672d64612d7275636b7573" && pref >= 49408 && pref < 49538 { print pref }' | \
+        sort -u | while read -r pref; do
+            tc filter del dev "$INTERFACE" "$direction" pref "$pref" 2>/dev/null && echo "   Removed: $direction pref $pref"
+        done
 done
+systemctl stop bring-da-ruckus-iptables-failsafe.timer 2>/dev/null || true
+echo ""
 
-echo "   ✅ iptables rules cleared"
+echo "🧹 Removing the nftables table (iptables edition and camera-chaos nft backend)..."
+if command -v nft >/dev/null 2>&1 && nft delete table inet bring_da_ruckus 2>/dev/null; then
+    echo "   ✅ Table inet bring_da_ruckus deleted"
+else
+    echo "   (No bring_da_ruckus table found)"
+fi
 echo ""
 
 echo "🔍 Current network status:"
@@ -8,6 +8,8 @@ import subprocess
 import sys
 import time
 import statistics
+import argparse
+import json
 from datetime import datetime
 from typing import Optional, Dict, List
 import os
@@ -18,11 +20,17 @@ from collections import deque
 class NetworkMonitor:
     """Enhanced real-time network health monitoring"""
 
-    def __init__(self, interface: Optional[str] = None, targets: Dict[str, str] = None):
+    def __init__(self, interface: Optional[str] = None, targets: Dict[str, str] = None,
+                 record_path: Optional[str] = None):
         self.interface = interface
         self.targets = targets or {}
         self.running = False
 
+        # Trace recording (JSON lines, replayable with bring-da-ruckus.py --replay)
+        self.record_path = record_path
+        self.record_file = None
+        self.record_start = None
+
         # Historical data (last 60 samples = ~1 minute at 1 sec interval)
         self.history_size = 60
         self.bandwidth_history = deque(maxlen=self.history_size)
@@ -149,6 +157,22 @@ class NetworkMonitor:
                 'packet_loss_pct': 100
             }
 
+    def record_sample(self, name: str, ip: str, ping_result: Dict):
+        """Append one target sample to the trace file"""
+        if not self.record_file:
+            return
+        sample = {
+            't': round(time.monotonic() - self.record_start, 3),
+            'ts': datetime.now().isoformat(timespec='milliseconds'),
+            'target': name,
+            'ip': ip,
+            'packet_loss_pct': ping_result['packet_loss_pct'],
+        }
+        if ping_result['success']:
+            sample['latency_ms'] = ping_result['avg_ms']
+            sample['jitter_ms'] = ping_result['jitter_ms']
+        self.record_file.write(json.dumps(sample) + '\n')
+
     def calculate_quality_score(self, latency_ms, packet_loss_pct, jitter_ms):
         """Calculate connection quality score (0-100)"""
         # Start with perfect score
@@ -277,6 +301,7 @@ class NetworkMonitor:
 
                 # Ping target
                 ping_result = self.ping_target(ip, count=5)
+                self.record_sample(name, ip, ping_result)
 
                 if ping_result['success']:
                     latency = ping_result['avg_ms']
@@ -337,6 +362,11 @@ class NetworkMonitor:
         print(f"📡 Interface: {self.interface}")
         print(f"🎯 Targets: {', '.join([f'{name} ({ip})' for name, ip in self.targets.items()])}")
         print(f"⏱️  Update interval: {interval}s")
+        if self.record_path:
+            # Line buffered - a crash loses at most the sample being written
+            self.record_file = open(self.record_path, 'a', buffering=1)
+            self.record_start = time.monotonic()
+            print(f"📝 Recording trace to: {self.record_path}")
         print(f"\nGathering initial data...\n")
 
         time.sleep(2)
@@ -356,11 +386,23 @@ class NetworkMonitor:
             print("\033[?1049l\033[?25h", end='')
             sys.stdout.flush()
             print("\n👋 Monitoring stopped")
+            if self.record_file:
+                self.record_file.close()
+                print(f"📝 Trace saved: {self.record_path}")
             self.running = False
 
 
 def main():
     """Main entry point"""
+    parser = argparse.ArgumentParser(description="Monitor The Ruckus - Enhanced Network Health Monitor")
+    parser.add_argument(
+        '--record',
+        metavar='FILE',
+        help='Record every target sample (latency, jitter, loss) to FILE as JSON lines '
+             'for replay with bring-da-ruckus.py --replay'
+    )
+    args = parser.parse_args()
+
     print("""
 ████████████████████████████████████████████████████████████████████████████████
 ██                                                                            ██
@@ -424,7 +466,7 @@ Features:
         print("\n⚠️  No targets specified. Monitoring local interface only.")
 
     # Create monitor
-    monitor = NetworkMonitor(targets=targets)
+    monitor = NetworkMonitor(targets=targets, record_path=args.record)
 
     # Set custom thresholds
     print("\n⚙️  Alert thresholds (press ENTER for defaults):")